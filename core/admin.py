@@ -2,6 +2,11 @@ from decimal import Decimal
 
 from django.contrib import admin
 from adminsortable2.admin import SortableInlineAdminMixin, SortableAdminBase
+from django.core.exceptions import PermissionDenied
+from django.db.models import OuterRef, Prefetch, Subquery, Sum
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.dateparse import parse_date
 from django.utils.html import format_html
 
 from .models import (
@@ -9,10 +14,18 @@ from .models import (
     Tour, TourDay, TourPhoto, Bullet, TourBullet,
     Day, DayImage, Hotel, AirportTransfer,
     Activity, DayFlight, DayTransfer, DayHotel, DayActivity,
-    Order, Traveler, TourType, ActivityProgress,IntroAudioLibrary, OrderIntroAudio
+    Order, Traveler, TourType, ActivityProgress,IntroAudioLibrary, OrderIntroAudio,
+    IntroAudioSettings, OrderIntroAssignment, duration_label_for,
 )
+from .autocomplete import (
+    AutocompleteAdminMixin, AutocompleteChoicesMixin, AutocompleteInlineMixin,
+    CachedAutocompleteJsonView,
+)
+from .catalog import count_subquery
+from .tourdays import reorder_tour_days, suspend_tourday_signals
 
-from .models import LiveLocation
+from .models import LiveLocation, LocationTrackChunk, MilesLedgerEntry
+from .progress import ProgressRepository
 
 from django.contrib import admin
 from django.contrib.auth import get_user_model
@@ -42,6 +55,11 @@ class UserProfileInline(admin.StackedInline):
         "password_changed_at",
     )
     readonly_fields = ("password_changed_at",)
+
+
+# Inline autocomplete uçları cache'li (core.autocomplete)
+admin.site.autocomplete_view = CachedAutocompleteJsonView.as_view(admin_site=admin.site)
+
 try:
     admin.site.unregister(User)
 except admin.sites.NotRegistered:
@@ -82,6 +100,36 @@ class LiveLocationAdmin(admin.ModelAdmin):
     search_fields = ("session_id", "ip_address", "user_agent")
     list_filter = ("updated_at",)
 
+
+@admin.register(LocationTrackChunk)
+class LocationTrackChunkAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "day", "point_count", "simplified", "started_at", "ended_at")
+    list_filter = ("simplified", ("day", admin.DateFieldListFilter))
+    search_fields = ("order__tracking_code", "order__email")
+    raw_id_fields = ("order",)
+    exclude = ("points",)
+    readonly_fields = ("order", "day", "started_at", "ended_at", "point_count", "simplified", "created_at")
+    ordering = ("-day", "-started_at")
+
+
+@admin.register(MilesLedgerEntry)
+class MilesLedgerEntryAdmin(admin.ModelAdmin):
+    """Defter yalnızca eklenir; düzeltme durum değişikliğiyle yapılır."""
+    list_display = ("id", "order", "profile", "kind", "amount", "activity_progress", "created_at")
+    list_filter = ("kind", ("created_at", admin.DateFieldListFilter))
+    search_fields = ("order__tracking_code", "order__email", "profile__user__email")
+    list_select_related = ("order", "profile__user")
+    raw_id_fields = ("order", "profile", "activity_progress")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # ─────────────────────────────
 # Helpers
 # ─────────────────────────────
@@ -141,9 +189,9 @@ class TourFilterForDay(admin.SimpleListFilter):
 class TravelerInline(admin.TabularInline):
     model = Traveler
     extra = 0
-    fields = ("admin_id", "title", "first_name", "last_name", "dob", "passport_no", "phone")
+    fields = ("admin_id", "index", "title", "first_name", "last_name", "dob", "passport_no", "phone")
     readonly_fields = ("admin_id",)
-    ordering = ("id",)
+    ordering = ("index", "id")
 
     def admin_id(self, obj):
         return obj.pk or "New"
@@ -168,6 +216,9 @@ class ActivityProgressInline(admin.TabularInline):
     autocomplete_fields = ("day_activity",)
     ordering = ("day_activity__day_id", "day_activity__order")
 
+    def get_queryset(self, request):
+        return ProgressRepository.queryset()
+
     def admin_id(self, obj):
         return obj.pk or "New"
     admin_id.short_description = "ID"
@@ -181,7 +232,7 @@ class ActivityProgressInline(admin.TabularInline):
 @admin.register(Traveler)
 class TravelerAdmin(admin.ModelAdmin):
     list_display = (
-        "id", "order", "title", "first_name", "last_name",
+        "id", "order", "index", "title", "first_name", "last_name",
         "dob", "passport_no", "phone", "created_at"
     )
     list_filter = ("title", "order__tour", "created_at")
@@ -212,6 +263,7 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
     list_display_links = ("id", "tour")
+    list_select_related = ("tour", "tour__catalog_entry")
     ordering = ("-created_at",)
     inlines = [
     TravelerInline,
@@ -249,6 +301,7 @@ class OrderAdmin(admin.ModelAdmin):
         "earned_miles_display",
         "total_possible_miles_display",
         "progress_summary_display",
+        "track_replay_link",
     )
 
     fieldsets = (
@@ -285,6 +338,7 @@ class OrderAdmin(admin.ModelAdmin):
                 "tracking_code_expires_at",
                 "tracking_started_at",
                 "tracking_last_seen",
+                "track_replay_link",
             )
         }),
 
@@ -324,6 +378,19 @@ class OrderAdmin(admin.ModelAdmin):
         return "-"
     link_payment_status.short_description = "Link Ödemesi Onaylı mı?"
 
+    def get_queryset(self, request):
+        # Liste sütunları satır başına sorgu açmasın
+        progresses = ActivityProgress.objects.filter(order=OuterRef("pk"))
+        return super().get_queryset(request).annotate(
+            progress_total=count_subquery(progresses, "order"),
+            progress_completed=count_subquery(
+                progresses.filter(status=ActivityProgress.Status.COMPLETED), "order"
+            ),
+            progress_skipped=count_subquery(
+                progresses.filter(status=ActivityProgress.Status.SKIPPED), "order"
+            ),
+        )
+
     def earned_miles_display(self, obj):
         return f"{obj.earned_miles} mil"
     earned_miles_display.short_description = "Kazanılan Mil"
@@ -331,28 +398,69 @@ class OrderAdmin(admin.ModelAdmin):
     def total_possible_miles_display(self, obj):
         if not obj.tour_id:
             return "0 mil"
-        return f"{obj.tour.total_miles_reward} mil"
+        # Katalog özetindeki toplam; özet henüz yoksa tur üzerinden hesaplanır
+        entry = getattr(obj.tour, "catalog_entry", None)
+        total = entry.total_miles if entry else obj.tour.total_miles_reward
+        return f"{total} mil"
     total_possible_miles_display.short_description = "Toplam Kazanılabilir Mil"
 
     def progress_summary_display(self, obj):
-        total = ActivityProgress.objects.filter(order=obj).count()
-        completed = ActivityProgress.objects.filter(
-            order=obj,
-            status=ActivityProgress.Status.COMPLETED
-        ).count()
-        skipped = ActivityProgress.objects.filter(
-            order=obj,
-            status=ActivityProgress.Status.SKIPPED
-        ).count()
+        if hasattr(obj, "progress_total"):
+            total, completed, skipped = obj.progress_total, obj.progress_completed, obj.progress_skipped
+        else:
+            total, completed, skipped = ProgressRepository(obj.pk).summary()
 
         return f"{completed}/{total} tamamlandı, {skipped} atlandı"
     progress_summary_display.short_description = "Aktivite Durumu"
+
+    # --- Konum geçmişi tekrar oynatma ---
+    def get_urls(self):
+        custom = [
+            path(
+                "<int:order_id>/track/",
+                self.admin_site.admin_view(self.track_replay_view),
+                name="core_order_track",
+            ),
+        ]
+        return custom + super().get_urls()
+
+    def track_replay_link(self, obj):
+        if not obj.pk:
+            return "-"
+        return format_html(
+            '<a href="{}">Rotayı göster</a>',
+            reverse("admin:core_order_track", args=[obj.pk]),
+        )
+    track_replay_link.short_description = "Konum Geçmişi"
+
+    def track_replay_view(self, request, order_id):
+        from .track_history import day_path, track_days
+
+        order = self.get_object(request, order_id)
+        if order is None or not self.has_view_permission(request, order):
+            raise PermissionDenied
+
+        days = track_days(order.pk)
+        selected = parse_date(request.GET.get("day") or "") or (days[0] if days else None)
+        points = day_path(order.pk, selected) if selected else []
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "original": order,
+            "title": f"Konum geçmişi — Order #{order.pk}",
+            "days": days,
+            "selected_day": selected,
+            "points": points,
+        }
+        return TemplateResponse(request, "admin/core/order/track_replay.html", context)
 # ─────────────────────────────
 # Tour inlines
 # ─────────────────────────────
-class TourDayInline(admin.TabularInline):
+class TourDayInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = TourDay
     extra = 0
+    autocomplete_fields = ("day",)
     fields = ("admin_id", "day", "order", "title")
     readonly_fields = ("admin_id",)
     ordering = ("order", "id")
@@ -375,7 +483,7 @@ class TourPhotoInline(SortableInlineAdminMixin, admin.TabularInline):
     admin_id.short_description = "ID"
 
 
-class TourBulletInline(SortableInlineAdminMixin, admin.TabularInline):
+class TourBulletInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = TourBullet
     extra = 1
     autocomplete_fields = ("bullet",)
@@ -404,7 +512,7 @@ class DayImageInline(SortableInlineAdminMixin, admin.TabularInline):
     admin_id.short_description = "ID"
 
 
-class DayFlightInline(SortableInlineAdminMixin, admin.TabularInline):
+class DayFlightInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = DayFlight
     extra = 0
     autocomplete_fields = ("flight",)
@@ -424,7 +532,7 @@ class DayFlightInline(SortableInlineAdminMixin, admin.TabularInline):
     flight_price.short_description = "Flight Price"
 
 
-class DayTransferInline(SortableInlineAdminMixin, admin.TabularInline):
+class DayTransferInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = DayTransfer
     extra = 0
     autocomplete_fields = ("transfer",)
@@ -444,7 +552,7 @@ class DayTransferInline(SortableInlineAdminMixin, admin.TabularInline):
     transfer_price.short_description = "Transfer Price"
 
 
-class DayHotelInline(SortableInlineAdminMixin, admin.TabularInline):
+class DayHotelInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = DayHotel
     extra = 0
     autocomplete_fields = ("hotel",)
@@ -464,7 +572,7 @@ class DayHotelInline(SortableInlineAdminMixin, admin.TabularInline):
     hotel_price.short_description = "Hotel Price / Night"
 
 
-class DayActivityInline(SortableInlineAdminMixin, admin.TabularInline):
+class DayActivityInline(AutocompleteInlineMixin, SortableInlineAdminMixin, admin.TabularInline):
     model = DayActivity
     extra = 0
     autocomplete_fields = ("activity",)
@@ -488,9 +596,9 @@ class DayActivityInline(SortableInlineAdminMixin, admin.TabularInline):
 # Tour admin
 # ─────────────────────────────
 @admin.register(Tour)
-class TourAdmin(SortableAdminBase, admin.ModelAdmin):
+class TourAdmin(AutocompleteChoicesMixin, SortableAdminBase, admin.ModelAdmin):
     list_display = (
-        "id", "title", "duration_label", "days_total_for_list",
+        "id", "title", "duration_for_list", "days_total_for_list",
         "commission", "price", "price_currency", "is_published",
         "allow_flights", "allow_hotels", "allow_transfers"
     )
@@ -505,7 +613,8 @@ class TourAdmin(SortableAdminBase, admin.ModelAdmin):
     )
     search_fields = ("id", "title", "overview", "info", "places_covered__name", "tour_types__name")
     prepopulated_fields = {"slug": ("title",)}
-    filter_horizontal = ("places_covered", "tour_types")
+    filter_horizontal = ("tour_types",)
+    autocomplete_fields = ("places_covered", "arrival_flight", "departure_flight")
 
     readonly_fields = ("id", "duration_label", "start_point", "end_point", "days_total_preview",)
     fields = (
@@ -525,7 +634,30 @@ class TourAdmin(SortableAdminBase, admin.ModelAdmin):
     )
     inlines = [TourDayInline, TourPhotoInline, TourBulletInline]
 
+    def get_queryset(self, request):
+        days_total = (
+            TourDay.objects
+            .filter(tour=OuterRef("pk"))
+            .order_by()
+            .values("tour")
+            .annotate(total=Sum("day__price"))
+            .values("total")[:1]
+        )
+        return (
+            super().get_queryset(request)
+            .select_related("catalog_entry")
+            .annotate(days_total=Subquery(days_total))
+        )
+
+    def duration_for_list(self, obj):
+        # Süre katalog özetinden; özet yoksa tur üzerinden hesaplanır
+        entry = getattr(obj, "catalog_entry", None)
+        return duration_label_for(entry.total_days) if entry else obj.duration_label
+    duration_for_list.short_description = "Süre"
+
     def days_total_for_list(self, obj):
+        if hasattr(obj, "days_total"):
+            return Decimal(obj.days_total or 0).quantize(Decimal("0.01"))
         return obj.days_total_amount()
     days_total_for_list.short_description = "Days Total"
 
@@ -543,17 +675,35 @@ class TourAdmin(SortableAdminBase, admin.ModelAdmin):
         super().save_model(request, obj, form, change)
         obj.recompute_price()
 
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not TourDay:
+            return super().save_formset(request, form, formset, change)
+
+        # Sürükle-bırak sıralaması her satırı kaydeder; satır başına
+        # yeniden hesaplama yerine sıra ve başlıklar tek bulk_update ile yazılır
+        with suspend_tourday_signals():
+            instances = formset.save(commit=False)
+            for obj in formset.deleted_objects:
+                obj.delete()
+            changed = [obj for obj, _ in formset.changed_objects]
+            TourDay.objects.bulk_update(changed, ["day", "order", "title"])
+            for obj in formset.new_objects:
+                obj.save()
+            formset.save_m2m()
+        if instances or formset.deleted_objects:
+            reorder_tour_days(form.instance)
+
     def save_related(self, request, form, formsets, change):
+        # Öğe sayıları TourDay değiştiyse reorder_tour_days içinde yenilenir
         super().save_related(request, form, formsets, change)
         form.instance.recompute_price()
-        form.instance.recompute_item_counts(save=True)
 
 
 # ─────────────────────────────
 # Day admin
 # ─────────────────────────────
 @admin.register(Day)
-class DayAdmin(SortableAdminBase, admin.ModelAdmin):
+class DayAdmin(AutocompleteAdminMixin, AutocompleteChoicesMixin, SortableAdminBase, admin.ModelAdmin):
     list_display = ("id", "city", "day_number", "title", "price", "price_currency")
     list_display_links = ("id", "city")
     list_filter = (
@@ -570,9 +720,15 @@ class DayAdmin(SortableAdminBase, admin.ModelAdmin):
         "city__country__name",
         "tourday__tour__title",
     )
+    autocomplete_search_fields = ("title", "city__name")
+    autocomplete_select_related = ("city__country",)
+    autocomplete_fields = ("city",)
     readonly_fields = ("id", "price",)
     inlines = [DayImageInline, DayFlightInline, DayTransferInline, DayHotelInline, DayActivityInline]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("city__country")
+
 
 # ─────────────────────────────
 # Through / Inline Models Admin
@@ -645,7 +801,7 @@ class DayActivityAdmin(admin.ModelAdmin):
 # Basit modeller
 # ─────────────────────────────
 @admin.register(Bullet)
-class BulletAdmin(admin.ModelAdmin):
+class BulletAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ("id", "text", "icon", "is_active", "tags")
     list_display_links = ("id", "text")
     list_filter = ("icon", "is_active", "tags")
@@ -661,11 +817,13 @@ class CountryAdmin(admin.ModelAdmin):
 
 
 @admin.register(City)
-class CityAdmin(admin.ModelAdmin):
+class CityAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ("id", "name", "country")
     list_display_links = ("id", "name")
     list_filter = ("country",)
     search_fields = ("id", "name", "country__name")
+    autocomplete_search_fields = ("name", "country__name")
+    autocomplete_select_related = ("country",)
 
 
 @admin.register(TourType)
@@ -691,7 +849,7 @@ class AirlineAdmin(admin.ModelAdmin):
 
 
 @admin.register(Flight)
-class FlightAdmin(admin.ModelAdmin):
+class FlightAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = (
         "id", "flight_number", "airline", "origin", "destination",
         "departure_time", "arrival_time", "duration_minutes",
@@ -715,18 +873,22 @@ class FlightAdmin(admin.ModelAdmin):
         "origin__name",
         "destination__name",
     )
+    autocomplete_search_fields = ("flight_number", "origin__iata", "destination__iata")
+    autocomplete_select_related = ("origin", "destination")
 
 
 @admin.register(Hotel)
-class HotelAdmin(admin.ModelAdmin):
+class HotelAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ("id", "name", "city", "star", "hotel_type", "price_per_night", "price_currency")
     list_display_links = ("id", "name")
     list_filter = ("city__country", "city", "star", "hotel_type", "price_currency")
     search_fields = ("id", "name", "address", "city__name", "city__country__name")
+    autocomplete_search_fields = ("name", "city__name")
+    autocomplete_select_related = ("city__country",)
 
 
 @admin.register(AirportTransfer)
-class AirportTransferAdmin(admin.ModelAdmin):
+class AirportTransferAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ("id", "city", "direction", "airport", "hotel", "vehicle_type", "price", "price_currency")
     list_display_links = ("id", "city")
     list_filter = (
@@ -746,13 +908,15 @@ class AirportTransferAdmin(admin.ModelAdmin):
         "city__name",
         "vehicle_type",
     )
+    autocomplete_search_fields = ("airport__iata", "hotel__name", "city__name")
+    autocomplete_select_related = ("city__country", "airport", "hotel")
 
 
 # ─────────────────────────────
 # Activity admin
 # ─────────────────────────────
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(AutocompleteAdminMixin, admin.ModelAdmin):
     list_display = (
         "id", "title", "city", "duration_hours", "price", "price_currency",
         "tour_types_list", "connected_days", "connected_tours"
@@ -779,41 +943,52 @@ class ActivityAdmin(admin.ModelAdmin):
         "days__city__name",
         "days__tourday__tour__title",
     )
+    autocomplete_search_fields = ("title", "city__name")
 
     autocomplete_fields = ("city",)
     filter_horizontal = ("tour_types",)
+    list_select_related = ("city__country",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            "tour_types",
+            Prefetch(
+                "dayactivity_set",
+                queryset=DayActivity.objects.select_related("day__city").order_by("id"),
+            ),
+            Prefetch(
+                "dayactivity_set__day__tourday_set",
+                queryset=TourDay.objects.select_related("tour").order_by("tour_id"),
+            ),
+        )
 
     def tour_types_list(self, obj):
-        return ", ".join(obj.tour_types.values_list("name", flat=True))
+        return ", ".join(t.name for t in obj.tour_types.all())
     tour_types_list.short_description = "Tour Types"
 
     def connected_days(self, obj):
-        items = obj.dayactivity_set.select_related("day", "day__city").values_list(
-            "id",
-            "day__id",
-            "day__day_number",
-            "day__title",
-            "day__city__name",
-        ).distinct()
+        items = obj.dayactivity_set.all()
 
         if not items:
             return "-"
 
         return ", ".join([
-            f"DayActivity #{da_id} | Day #{day_id} | {city} / Day {day_number} - {title or city}"
-            for da_id, day_id, day_number, title, city in items
+            f"DayActivity #{da.id} | Day #{da.day_id} | {da.day.city.name} / "
+            f"Day {da.day.day_number} - {da.day.title or da.day.city.name}"
+            for da in items
         ])
     connected_days.short_description = "Connected Days"
 
     def connected_tours(self, obj):
-        tours = Tour.objects.filter(
-            tour_days__day__dayactivity__activity=obj
-        ).distinct()
+        tours = {}
+        for da in obj.dayactivity_set.all():
+            for tour_day in da.day.tourday_set.all():
+                tours.setdefault(tour_day.tour_id, tour_day.tour)
 
-        if not tours.exists():
+        if not tours:
             return "-"
 
-        return ", ".join([f"#{t.id} - {t.title}" for t in tours])
+        return ", ".join([f"#{t.id} - {t.title}" for t in tours.values()])
 
     connected_tours.short_description = "Connected Tours"
 
@@ -872,6 +1047,11 @@ class ActivityProgressAdmin(admin.ModelAdmin):
     )
 
     ordering = ("-updated_at",)
+    list_select_related = (
+        "order__tour",
+        "day_activity__activity",
+        "day_activity__day__city__country",
+    )
 
     fieldsets = (
         ("Progress", {
@@ -997,10 +1177,24 @@ class WhatsAppMessageQueueAdmin(admin.ModelAdmin):
         "order__tracking_code", "order__email",
     )
     readonly_fields = (
-        "chat_id", "waha_response", "error_message",
+        "chat_id", "waha_response", "error_message", "attempts", "next_attempt_at",
         "locked_at", "sent_at", "failed_at", "created_at",
     )
 
+from .models import NotificationOutbox
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "id", "channel", "chat_id", "status", "attempts",
+        "next_attempt_at", "sent_at", "created_at",
+    )
+    list_filter = ("status", "channel", "created_at")
+    search_fields = ("chat_id", "message", "last_error")
+    readonly_fields = ("attempts", "last_error", "sent_at", "created_at")
+    raw_id_fields = ("activity_progress",)
+
 from .models import CustomizedTravelRequest, CustomizedTravelSettings
 
 @admin.register(CustomizedTravelSettings)
@@ -1037,8 +1231,52 @@ class IntroAudioLibraryAdmin(admin.ModelAdmin):
     search_fields = ("name", "title")
 
 
+@admin.register(IntroAudioSettings)
+class IntroAudioSettingsAdmin(admin.ModelAdmin):
+    list_display = ("id", "rotation_policy", "is_active")
+
+
+@admin.register(OrderIntroAssignment)
+class OrderIntroAssignmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "day_activity", "intro", "name", "created_at")
+    search_fields = ("order__id", "order__tracking_code", "name")
+    list_filter = ("name",)
+    list_select_related = ("order", "day_activity", "intro")
+    raw_id_fields = ("order", "day_activity", "intro")
+
+
 @admin.register(OrderIntroAudio)
 class OrderIntroAudioAdmin(admin.ModelAdmin):
     list_display = ("id", "order", "title", "source_name", "generated", "created_at")
     search_fields = ("order__id", "order__email", "source_name", "title")
     list_filter = ("generated", "source_name", "created_at")
+
+
+from .models import AudioRenderJob
+
+
+@admin.register(AudioRenderJob)
+class AudioRenderJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id", "order", "day_activity", "audio_type", "status",
+        "attempts", "requested_at", "finished_at",
+    )
+    list_filter = ("status", "audio_type")
+    search_fields = ("order__id", "order__tracking_code", "output_name")
+    list_select_related = ("order", "day_activity")
+    readonly_fields = (
+        "cache_hash", "output_name", "error", "attempts",
+        "requested_at", "started_at", "finished_at",
+    )
+
+
+from .models import AudioCacheEntry
+
+
+@admin.register(AudioCacheEntry)
+class AudioCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ("file_name", "order", "audio_type", "size_bytes", "hits", "last_accessed_at")
+    list_filter = ("audio_type",)
+    search_fields = ("file_name", "order__id", "order__tracking_code")
+    list_select_related = ("order",)
+    readonly_fields = ("cache_hash", "size_bytes", "hits", "last_accessed_at", "created_at")
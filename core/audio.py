@@ -0,0 +1,722 @@
+"""
+Kişiselleştirilmiş aktivite sesleri (intro + aktivite sesi).
+
+Birleştirme ffmpeg ile yapılır ve istek yolunda çalışmaz:
+
+- Order ödendiğinde ya da yolcuları değiştiğinde turdaki her DayActivity ve
+  ses tipi için AudioRenderJob kaydı açılır.
+- İşler, process başına sınırlı sayıda thread'den oluşan bir havuzda
+  render edilir (aynı anda en fazla AUDIO_RENDER_WORKERS ffmpeg).
+- secure_audio_stream sadece hazır dosyayı sunar; dosya henüz yoksa işi
+  kuyruğa alır ve o an için sade aktivite sesini döndürür.
+
+Havuz web process'inin içinde çalışır, çünkü birleştirilmiş dosyalar web
+servisinin MEDIA_ROOT diskine yazılmalıdır; önbellek temizliği de aynı
+sebeple buradan zamanlanır. render_audio_queue komutu bekleyen işleri aynı
+kodla toplu işler.
+"""
+import hashlib
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import audio_cache
+from .batching import CommitBatch
+from .models import (
+    AudioRenderJob, DayActivity, IntroAudioLibrary, IntroAudioSettings, Order,
+    OrderIntroAssignment, Traveler,
+)
+
+logger = logging.getLogger(__name__)
+
+# URL'deki ses tipi -> Activity alanı
+AUDIO_FIELDS = {
+    "on-the-way": "audio_on_the_way",
+    "at-location": "audio_at_location",
+}
+
+FFMPEG_TIMEOUT = 180
+
+
+def activity_audio_file(activity, audio_type):
+    field_name = AUDIO_FIELDS.get(audio_type)
+    if not field_name:
+        return None
+    return getattr(activity, field_name) or None
+
+
+def normalize_intro_name(name):
+    """
+    'Alican' -> 'alican'
+    'Alican Yalçın' -> 'alican'
+    '  ALICAN  ' -> 'alican'
+    """
+    normalized = (name or "").strip().lower()
+
+    if not normalized:
+        return ""
+
+    return normalized.split()[0]
+
+
+def current_traveler_name(order):
+    """
+    Order'ın güncel ilk traveler adını (normalize) okur.
+
+    Admin panelinden traveler adı değiştirildiğinde,
+    herhangi bir manuel güncelleme olmadan yeni isim kullanılır.
+    """
+    traveler = (
+        order.travelers
+        .exclude(first_name="")
+        .order_by("id")
+        .first()
+    )
+
+    if not traveler:
+        return ""
+
+    return normalize_intro_name(traveler.first_name)
+
+
+def rotation_policy():
+    settings_obj = IntroAudioSettings.objects.filter(is_active=True).first()
+    if settings_obj:
+        return settings_obj.rotation_policy
+    return IntroAudioSettings.RotationPolicy.ROTATE
+
+
+def _choose_intro(order, name, intro_items):
+    """Yeni atama için politikaya göre intro seçer."""
+    policy = rotation_policy()
+    existing = (
+        OrderIntroAssignment.objects
+        .filter(order=order, name=name, intro__in=intro_items)
+        .values_list("intro_id", flat=True)
+    )
+
+    if policy == IntroAudioSettings.RotationPolicy.RANDOM:
+        return random.choice(intro_items)
+
+    if policy == IntroAudioSettings.RotationPolicy.PER_ORDER:
+        pinned = existing.first()
+        for item in intro_items:
+            if item.pk == pinned:
+                return item
+        return intro_items[order.pk % len(intro_items)]
+
+    # ROTATE: order'ın atama sırasına göre sıradaki intro
+    return intro_items[(order.pk + existing.count()) % len(intro_items)]
+
+
+def get_pinned_intro(order, day_activity):
+    """
+    Order x DayActivity için sabitlenmiş intro'yu döndürür; yoksa politikaya
+    göre seçip OrderIntroAssignment'a yazar. Aynı kombinasyon her istekte aynı
+    intro'yu verir, böylece birleştirilmiş ses bir kez render edilir.
+    """
+    name = current_traveler_name(order)
+
+    if not name:
+        return None
+
+    assignment = (
+        OrderIntroAssignment.objects
+        .select_related("intro")
+        .filter(order=order, day_activity=day_activity)
+        .first()
+    )
+    if (
+        assignment
+        and assignment.name == name
+        and assignment.intro
+        and assignment.intro.is_active
+        and assignment.intro.audio
+    ):
+        return assignment.intro
+
+    intro_items = list(
+        IntroAudioLibrary.objects.filter(
+            name__iexact=name,
+            is_active=True,
+        )
+        .exclude(audio="")
+        .order_by("id")
+    )
+
+    if not intro_items:
+        return None
+
+    intro = _choose_intro(order, name, intro_items)
+
+    if assignment:
+        assignment.intro = intro
+        assignment.name = name
+        assignment.save(update_fields=["intro", "name"])
+    else:
+        try:
+            with transaction.atomic():
+                OrderIntroAssignment.objects.create(
+                    order=order, day_activity=day_activity, intro=intro, name=name,
+                )
+        except IntegrityError:
+            # Paralel istek aynı anda atadı; onunkini kullan
+            return get_pinned_intro(order, day_activity)
+
+    return intro
+
+
+def get_local_audio_path(audio_field):
+    """
+    Local FileSystemStorage kullanılan projelerde FileField yolunu döndürür.
+    """
+    if not audio_field:
+        return None
+
+    try:
+        path = audio_field.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+
+    if not path or not os.path.isfile(path):
+        return None
+
+    return path
+
+
+# ------------- PLAN -------------
+
+@dataclass(frozen=True)
+class CombinedAudioPlan:
+    intro_path: str
+    main_path: str
+    cache_hash: str
+    output_path: str
+
+    def is_ready(self):
+        return os.path.isfile(self.output_path) and os.path.getsize(self.output_path) > 0
+
+
+def combined_audio_plan(order, day_activity, audio_type, main_audio_file):
+    """
+    Birleştirilecek dosyaları ve önbellek yolunu hesaplar (ffmpeg çalıştırmaz).
+    Intro yoksa ya da dosyalar yerelde değilse None: aktivite sesi tek başına çalınır.
+    """
+    intro_item = get_pinned_intro(order, day_activity)
+
+    # İsim için kütüphanede intro bulunamazsa eski custom intro desteğini koru.
+    if intro_item and intro_item.audio:
+        intro_audio_file = intro_item.audio
+        intro_identity = f"library-{intro_item.id}"
+
+    elif order.custom_intro_audio:
+        intro_audio_file = order.custom_intro_audio
+        intro_identity = "custom"
+
+    else:
+        return None
+
+    intro_path = get_local_audio_path(intro_audio_file)
+    main_path = get_local_audio_path(main_audio_file)
+
+    if not intro_path or not main_path:
+        return None
+
+    # Intro veya activity dosyası değiştiğinde eski cache kullanılmasın.
+    intro_mtime = int(os.path.getmtime(intro_path))
+    main_mtime = int(os.path.getmtime(main_path))
+
+    cache_source = (
+        f"order={order.id}|"
+        f"intro={intro_identity}|"
+        f"intro_mtime={intro_mtime}|"
+        f"day_activity={day_activity.id}|"
+        f"audio_type={audio_type}|"
+        f"main_mtime={main_mtime}"
+    )
+
+    cache_hash = hashlib.sha256(
+        cache_source.encode("utf-8")
+    ).hexdigest()[:24]
+
+    safe_audio_type = audio_type.replace("/", "-")
+
+    output_filename = (
+        f"order_{order.id}_"
+        f"activity_{day_activity.id}_"
+        f"{safe_audio_type}_"
+        f"{cache_hash}.mp3"
+    )
+
+    return CombinedAudioPlan(
+        intro_path=intro_path,
+        main_path=main_path,
+        cache_hash=cache_hash,
+        output_path=os.path.join(audio_cache.cache_dir(), output_filename),
+    )
+
+
+def render_combined_audio(plan):
+    """ffmpeg ile intro + aktivite sesini plan.output_path'e yazar; hata olursa RuntimeError."""
+    combined_dir = os.path.dirname(plan.output_path)
+    os.makedirs(combined_dir, exist_ok=True)
+
+    file_descriptor, temporary_output_path = tempfile.mkstemp(
+        prefix=audio_cache.TEMP_PREFIX,
+        suffix=".mp3",
+        dir=combined_dir,
+    )
+    os.close(file_descriptor)
+
+    try:
+        command = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-y",
+
+            "-i", plan.intro_path,
+            "-i", plan.main_path,
+
+            "-filter_complex",
+            (
+                "[0:a]"
+                "aresample=44100,"
+                "aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                "asetpts=N/SR/TB"
+                "[intro];"
+
+                "[1:a]"
+                "aresample=44100,"
+                "aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                "asetpts=N/SR/TB"
+                "[activity];"
+
+                "[intro][activity]"
+                "concat=n=2:v=0:a=1"
+                "[combined]"
+            ),
+
+            "-map", "[combined]",
+            "-vn",
+            "-c:a", "libmp3lame",
+            "-b:a", "192k",
+            "-ar", "44100",
+            "-ac", "2",
+
+            temporary_output_path,
+        ]
+
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=FFMPEG_TIMEOUT,
+            check=False,
+        )
+
+        if result.returncode != 0:
+            raise RuntimeError(
+                result.stderr or "FFmpeg audio birleştirme hatası."
+            )
+
+        if (
+            not os.path.isfile(temporary_output_path)
+            or os.path.getsize(temporary_output_path) == 0
+        ):
+            raise RuntimeError(
+                "Birleştirilmiş ses dosyası oluşturulamadı."
+            )
+
+        os.replace(
+            temporary_output_path,
+            plan.output_path,
+        )
+
+    finally:
+        try:
+            if os.path.exists(temporary_output_path):
+                os.remove(temporary_output_path)
+        except OSError:
+            pass
+
+
+# ------------- RENDER HAVUZU -------------
+
+class RenderPool:
+    """
+    Process başına tek havuz; aynı anda en fazla max_workers ffmpeg çalışır.
+
+    İşler sadece bu process'in belleğinde sıradadır. Deploy / worker yeniden
+    başlayınca kaybolan PENDING ve takılı PROCESSING işler havuz ilk
+    kurulduğunda toplanıp yeniden gönderilir; aynı iş birden çok process'e
+    gitse de render_job'daki sahiplenme yalnızca birine render ettirir.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        # Bu process'te sırada olan işler; aynı iş iki kez kuyruğa girmesin
+        self._queued = set()
+
+    def start(self):
+        with self._lock:
+            if self._executor is not None:
+                return self._executor
+            self._executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "AUDIO_RENDER_WORKERS", 2),
+                thread_name_prefix="nomaya-audio",
+            )
+        self._recover()
+        self._schedule_sweep()
+        return self._executor
+
+    def _schedule_sweep(self):
+        interval = audio_cache.sweep_interval()
+        if not interval:
+            return
+        timer = threading.Timer(interval, self._queue_sweep)
+        timer.daemon = True
+        timer.start()
+
+    def _queue_sweep(self):
+        # Silme ffmpeg ile aynı havuzda sıraya girer
+        self._executor.submit(self._sweep)
+        self._schedule_sweep()
+
+    def _sweep(self):
+        try:
+            audio_cache.run_sweep()
+        except Exception:
+            logger.exception("audio cache sweep failed")
+        finally:
+            connection.close()
+
+    def _recover(self):
+        try:
+            recover_stale_jobs()
+            job_ids = list(
+                AudioRenderJob.objects
+                .filter(status=AudioRenderJob.Status.PENDING)
+                .order_by("requested_at", "id")
+                .values_list("id", flat=True)
+            )
+        except Exception:
+            logger.exception("audio render recovery failed")
+            return
+        self.submit(job_ids)
+
+    def _run(self, job_id):
+        try:
+            _run_job_in_thread(job_id)
+        finally:
+            with self._lock:
+                self._queued.discard(job_id)
+
+    def submit(self, job_ids):
+        executor = self.start()
+        with self._lock:
+            job_ids = [job_id for job_id in job_ids if job_id not in self._queued]
+            self._queued.update(job_ids)
+        return [executor.submit(self._run, job_id) for job_id in job_ids]
+
+
+pool = RenderPool()
+
+
+def _run_job_in_thread(job_id):
+    try:
+        render_job(job_id)
+    except Exception:
+        logger.exception("audio render job %s failed", job_id)
+    finally:
+        # Thread'e ait bağlantı açık kalmasın
+        connection.close()
+
+
+def render_job(job_id):
+    """İşi sahiplenir ve render eder. Başka bir thread/process aldıysa False."""
+    claimed = AudioRenderJob.objects.filter(
+        pk=job_id, status=AudioRenderJob.Status.PENDING,
+    ).update(
+        status=AudioRenderJob.Status.PROCESSING,
+        started_at=timezone.now(),
+        attempts=F("attempts") + 1,
+    )
+    if not claimed:
+        return False
+
+    job = AudioRenderJob.objects.select_related(
+        "order", "day_activity", "day_activity__activity",
+    ).get(pk=job_id)
+
+    main_audio_file = activity_audio_file(job.day_activity.activity, job.audio_type)
+    plan = None
+    if main_audio_file:
+        plan = combined_audio_plan(job.order, job.day_activity, job.audio_type, main_audio_file)
+
+    job.error = ""
+    job.cache_hash = plan.cache_hash if plan else ""
+    job.output_name = os.path.basename(plan.output_path) if plan else ""
+    try:
+        if plan and not plan.is_ready():
+            render_combined_audio(plan)
+        job.status = AudioRenderJob.Status.DONE
+    except Exception as exc:
+        logger.warning(
+            "Nomaya audio merge error order=%s, activity=%s, type=%s: %s",
+            job.order_id, job.day_activity_id, job.audio_type, exc,
+        )
+        job.status = AudioRenderJob.Status.FAILED
+        job.error = str(exc)[:2000]
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "cache_hash", "output_name", "error", "finished_at"])
+
+    if job.status == AudioRenderJob.Status.DONE and plan:
+        audio_cache.record_entry(job, plan.output_path)
+        audio_cache.enforce_budget()
+    return True
+
+
+STALE_PROCESSING_AFTER = FFMPEG_TIMEOUT * 2
+
+
+def _stale_processing(max_age_seconds=STALE_PROCESSING_AFTER):
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    return Q(status=AudioRenderJob.Status.PROCESSING, started_at__lt=cutoff)
+
+
+def recover_stale_jobs(max_age_seconds=STALE_PROCESSING_AFTER):
+    """Process ölünce PROCESSING'de kalan işleri yeniden kuyruğa alır."""
+    return AudioRenderJob.objects.filter(
+        _stale_processing(max_age_seconds),
+    ).update(status=AudioRenderJob.Status.PENDING)
+
+
+def _submit_on_commit(job_ids):
+    if job_ids and getattr(settings, "AUDIO_RENDER_IN_PROCESS", True):
+        transaction.on_commit(lambda: pool.submit(job_ids))
+
+
+# ------------- KUYRUĞA ALMA -------------
+
+def _stale_job_filter(order_ids):
+    """
+    Birleştirilmiş sesin önbellek hash'ine yolcu tarafından giren tek girdi
+    ilk yolcunun adıdır (intro onun adıyla sabitlenir). Sabitlenmiş adı güncel
+    adla aynı olan işlerin planı değişmemiştir; diğerleri için Q döner.
+    """
+    names = {}
+    travelers = (
+        Traveler.objects
+        .filter(order_id__in=order_ids)
+        .exclude(first_name="")
+        .order_by("order_id", "id")
+        .values_list("order_id", "first_name")
+    )
+    for order_id, first_name in travelers:
+        names.setdefault(order_id, normalize_intro_name(first_name))
+
+    pinned = {
+        (order_id, da_id): name
+        for order_id, da_id, name in OrderIntroAssignment.objects
+        .filter(order_id__in=order_ids)
+        .values_list("order_id", "day_activity_id", "name")
+    }
+
+    stale = Q(pk__in=[])
+    for order_id in order_ids:
+        name = names.get(order_id, "")
+        pinned_here = {da_id: n for (o, da_id), n in pinned.items() if o == order_id}
+        if name:
+            # Adı değişmiş ya da henüz intro sabitlenmemiş işler
+            unchanged = [da_id for da_id, n in pinned_here.items() if n == name]
+            stale |= Q(order_id=order_id) & ~Q(day_activity_id__in=unchanged)
+        else:
+            # Yolcu adı kalmadı: intro ile render edilmiş işler artık geçersiz
+            stale |= Q(order_id=order_id, day_activity_id__in=list(pinned_here))
+    return stale
+
+
+def enqueue_order_audio(order_ids, only_new=False, force=False):
+    """
+    Ödenmiş order'ların turundaki tüm DayActivity x ses tipi için eksik işleri
+    açar. only_new=True ise daha önce işi olan order'lar atlanır (ödeme anı).
+
+    Mevcut işlerden sadece planı (yolcu adı) değişmiş DONE/FAILED olanlar
+    yeniden kuyruğa alınır; force=True ise hepsi. PROCESSING işlere
+    dokunulmaz, aynı dosya iki kez aynı anda render edilmez.
+    Dönüş: kuyruğa giren iş sayısı.
+    """
+    orders = Order.objects.filter(pk__in=set(order_ids), is_paid=True).exclude(tour__isnull=True)
+    if only_new:
+        orders = orders.exclude(audio_render_jobs__isnull=False)
+    orders = list(orders.values_list("pk", "tour_id"))
+    if not orders:
+        return 0
+    order_pks = [o for o, _ in orders]
+
+    tour_ids = {tour_id for _, tour_id in orders}
+    day_activities = (
+        DayActivity.objects
+        .filter(day__tourday__tour_id__in=tour_ids)
+        .values_list("id", "day__tourday__tour_id", *(f"activity__{f}" for f in AUDIO_FIELDS.values()))
+    )
+    by_tour = {}
+    for da_id, tour_id, *files in day_activities:
+        for audio_type, audio in zip(AUDIO_FIELDS, files):
+            if audio:
+                by_tour.setdefault(tour_id, set()).add((da_id, audio_type))
+
+    existing = set(
+        AudioRenderJob.objects
+        .filter(order_id__in=order_pks)
+        .values_list("order_id", "day_activity_id", "audio_type")
+    )
+    now = timezone.now()
+    jobs = [
+        AudioRenderJob(
+            order_id=order_id,
+            day_activity_id=da_id,
+            audio_type=audio_type,
+            status=AudioRenderJob.Status.PENDING,
+            requested_at=now,
+        )
+        for order_id, tour_id in orders
+        for da_id, audio_type in sorted(by_tour.get(tour_id, ()))
+        if (order_id, da_id, audio_type) not in existing
+    ]
+    # Eşzamanlı bir çağrı aynı işi açtıysa onunki kalır
+    AudioRenderJob.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    reset = 0
+    if existing and not only_new:
+        finished = AudioRenderJob.objects.filter(
+            order_id__in=order_pks,
+            status__in=[AudioRenderJob.Status.DONE, AudioRenderJob.Status.FAILED],
+        )
+        if not force:
+            finished = finished.filter(_stale_job_filter(order_pks))
+        reset = finished.update(status=AudioRenderJob.Status.PENDING, requested_at=now)
+
+    if not jobs and not reset:
+        return 0
+    job_ids = list(
+        AudioRenderJob.objects
+        .filter(order_id__in=order_pks, status=AudioRenderJob.Status.PENDING)
+        .values_list("id", flat=True)
+    )
+    _submit_on_commit(job_ids)
+    return len(jobs) + reset
+
+
+def request_render(order, day_activity, audio_type, cache_hash):
+    """
+    İstek yolunda hazır olmayan ses için işi (gerekirse) kuyruğa alır.
+    Aynı plan daha önce başarısız olduysa tekrar denenmez. PENDING iş
+    (başka bir process'in belleğinde kaybolmuş olabilir) yeniden gönderilir;
+    süresi geçmiş PROCESSING iş sıfırlanır. Süren render'a dokunulmaz.
+    """
+    job, created = AudioRenderJob.objects.get_or_create(
+        order=order,
+        day_activity=day_activity,
+        audio_type=audio_type,
+    )
+    if not created:
+        if job.status == AudioRenderJob.Status.PROCESSING:
+            reset = AudioRenderJob.objects.filter(_stale_processing(), pk=job.pk).update(
+                status=AudioRenderJob.Status.PENDING,
+            )
+            if not reset:
+                return job
+        elif job.status == AudioRenderJob.Status.FAILED and job.cache_hash == cache_hash:
+            return job
+        elif job.status != AudioRenderJob.Status.PENDING:
+            AudioRenderJob.objects.filter(pk=job.pk).update(
+                status=AudioRenderJob.Status.PENDING, requested_at=timezone.now(),
+            )
+    _submit_on_commit([job.pk])
+    return job
+
+
+@dataclass(frozen=True)
+class AudioSource:
+    """
+    Sunulacak ses. path yerel dosyadır; yerel yol yoksa (uzak storage)
+    file_field üzerinden okunur ve etag boş kalır.
+    """
+    path: str = None
+    etag: str = ""
+    file_field: object = None
+    combined: bool = False
+
+
+def file_etag(path):
+    """Yerel dosya için güçlü ETag: yol + mtime + boyut."""
+    stat = os.stat(path)
+    digest = hashlib.sha256(
+        f"{path}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8")
+    ).hexdigest()[:24]
+    return f'"a-{digest}"'
+
+
+def resolve_audio_source(order, day_activity, audio_type, main_audio_file, initial_request=True):
+    """
+    İstek yolu: hazır birleştirilmiş dosyayı döndürür. Hazır değilse render
+    işini kuyruğa alır ve sade aktivite sesini döndürür. ffmpeg burada çalışmaz.
+    initial_request=False (devam eden Range isteği) önbellek erişimi sayılmaz.
+
+    Birleştirilmiş dosyanın ETag'i render önbellek hash'idir; intro ya da
+    aktivite sesi değişince hash, dolayısıyla ETag de değişir.
+    """
+    if getattr(settings, "AUDIO_RENDER_IN_PROCESS", True):
+        # Restart sonrası kalan işler ve önbellek temizliği havuzla başlar
+        pool.start()
+
+    plan = combined_audio_plan(order, day_activity, audio_type, main_audio_file)
+
+    if plan is not None:
+        if plan.is_ready():
+            audio_cache.record_hit(plan.output_path, initial=initial_request)
+            return AudioSource(path=plan.output_path, etag=f'"{plan.cache_hash}"', combined=True)
+        audio_cache.record_miss()
+        request_render(order, day_activity, audio_type, plan.cache_hash)
+
+    main_path = get_local_audio_path(main_audio_file)
+    if main_path:
+        return AudioSource(path=main_path, etag=file_etag(main_path))
+    return AudioSource(file_field=main_audio_file)
+
+
+# ------------- SIGNAL TOPLAYICI -------------
+
+def _enqueue_dirty(paid, changed):
+    if changed:
+        enqueue_order_audio(changed)
+    if paid - changed:
+        enqueue_order_audio(paid - changed, only_new=True)
+
+
+_batch = CommitBatch(_enqueue_dirty, "paid", "changed")
+flush = _batch.flush
+
+
+def mark_orders_paid(order_ids):
+    _batch.add("paid", order_ids)
+
+
+def mark_orders_changed(order_ids):
+    _batch.add("changed", order_ids)
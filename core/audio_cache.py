@@ -0,0 +1,238 @@
+"""
+Birleştirilmiş ses önbelleği (MEDIA_ROOT/orders/combined_audio).
+
+Her render edilen dosya AudioCacheEntry ile indekslenir (boyut, son erişim,
+kaynak hash). Toplam boyut AUDIO_CACHE_MAX_BYTES'ı aşınca en uzun süredir
+dinlenmeyen dosyalar silinir (LRU). sweep_orphans şunları temizler:
+
+- süresi dolmuş / ödenmemiş order'lara ait kayıtlar,
+- intro ya da aktivite sesi değiştiği için yerini yeni hash'e bırakmış dosyalar,
+- dosyası diskte olmayan kayıtlar,
+- indekste olmayan dosyalar ve yarım kalmış geçici ffmpeg çıktıları.
+
+Disk sadece web servisine bağlı olduğu için temizliği cron değil web
+process'indeki render havuzu AUDIO_CACHE_SWEEP_INTERVAL'da bir çalıştırır
+(run_sweep); sweep_audio_cache komutu elle çalıştırmak içindir.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+
+from . import metrics
+from .models import AudioCacheEntry, AudioRenderJob
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = "audio:stats"
+TEMP_PREFIX = "nomaya_combined_"
+TEMP_MAX_AGE = 60 * 60
+# Bütçe aşılınca bu orana kadar boşaltılır; her render'da tekrar silmeyelim
+LOW_WATERMARK = 0.9
+# Son erişim en fazla bu aralıkla yazılır; her dinleme UPDATE atmasın
+TOUCH_INTERVAL = 5 * 60
+SWEEP_LOCK = "audio:sweep"
+
+
+def cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, "orders", "combined_audio")
+
+
+def max_bytes():
+    return getattr(settings, "AUDIO_CACHE_MAX_BYTES", 5 * 1024 ** 3)
+
+
+def _remove_file(file_name):
+    try:
+        os.remove(os.path.join(cache_dir(), file_name))
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logger.warning("audio cache dosyası silinemedi %s: %s", file_name, exc)
+
+
+# ------------- İNDEKS -------------
+
+def record_entry(job, path):
+    file_name = os.path.basename(path)
+    AudioCacheEntry.objects.update_or_create(
+        file_name=file_name,
+        defaults={
+            "order_id": job.order_id,
+            "day_activity_id": job.day_activity_id,
+            "audio_type": job.audio_type,
+            "cache_hash": job.cache_hash,
+            "size_bytes": os.path.getsize(path),
+            "last_accessed_at": timezone.now(),
+        },
+    )
+
+
+def record_hit(path, initial=True):
+    """
+    Dinleme başına bir kez sayılır: oynatıcının sarma / devam Range
+    istekleri (initial=False) sayılmaz. LRU için son erişim en fazla
+    TOUCH_INTERVAL'da bir yazılır; hits de bu yazımları sayar.
+    """
+    if not initial:
+        return
+    metrics.incr(f"{STATS_PREFIX}:hits")
+    now = timezone.now()
+    AudioCacheEntry.objects.filter(
+        file_name=os.path.basename(path),
+        last_accessed_at__lt=now - timedelta(seconds=TOUCH_INTERVAL),
+    ).update(
+        hits=F("hits") + 1,
+        last_accessed_at=now,
+    )
+
+
+def record_miss():
+    metrics.incr(f"{STATS_PREFIX}:misses")
+
+
+# ------------- BÜTÇE / LRU -------------
+
+def enforce_budget(limit=None):
+    """Toplam boyut limiti aşıyorsa LRU sırasıyla siler. Dönüş: (silinen, boşalan bayt)"""
+    limit = limit or max_bytes()
+    total = AudioCacheEntry.objects.aggregate(s=Sum("size_bytes"))["s"] or 0
+    if total <= limit:
+        return 0, 0
+
+    target = int(limit * LOW_WATERMARK)
+    evicted, freed = [], 0
+    entries = (
+        AudioCacheEntry.objects
+        .order_by("last_accessed_at", "id")
+        .values_list("id", "file_name", "size_bytes")
+    )
+    for pk, file_name, size in entries.iterator():
+        if total - freed <= target:
+            break
+        _remove_file(file_name)
+        evicted.append(pk)
+        freed += size
+
+    AudioCacheEntry.objects.filter(pk__in=evicted).delete()
+    logger.info("audio cache LRU: %s dosya, %s bayt silindi", len(evicted), freed)
+    return len(evicted), freed
+
+
+# ------------- YETİM TEMİZLİĞİ -------------
+
+def _delete_entries(qs):
+    rows = list(qs.values_list("id", "file_name"))
+    for _, file_name in rows:
+        _remove_file(file_name)
+    AudioCacheEntry.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+    return len(rows)
+
+
+def sweep_orphans():
+    now = timezone.now()
+    result = dict.fromkeys(("expired", "superseded", "missing", "untracked", "adopted", "temp"), 0)
+
+    result["expired"] = _delete_entries(
+        AudioCacheEntry.objects.filter(
+            Q(order__is_paid=False) | Q(order__tracking_code_expires_at__lt=now)
+        )
+    )
+
+    current = AudioRenderJob.objects.filter(
+        order_id=OuterRef("order_id"),
+        day_activity_id=OuterRef("day_activity_id"),
+        audio_type=OuterRef("audio_type"),
+        output_name=OuterRef("file_name"),
+    )
+    result["superseded"] = _delete_entries(
+        AudioCacheEntry.objects.exclude(Exists(current))
+    )
+
+    directory = cache_dir()
+    on_disk = {}
+    if os.path.isdir(directory):
+        with os.scandir(directory) as it:
+            for item in it:
+                if item.is_file():
+                    on_disk[item.name] = item.stat()
+
+    indexed = set(AudioCacheEntry.objects.values_list("file_name", flat=True))
+    missing = indexed - set(on_disk)
+    if missing:
+        result["missing"] = AudioCacheEntry.objects.filter(file_name__in=missing).delete()[0]
+
+    untracked = {name: st for name, st in on_disk.items() if name not in indexed}
+    if untracked:
+        # İndeksten önce render edilmiş ama hâlâ geçerli dosyalar indekse alınır
+        jobs = {
+            job.output_name: job
+            for job in AudioRenderJob.objects.filter(
+                output_name__in=list(untracked),
+                status=AudioRenderJob.Status.DONE,
+                order__is_paid=True,
+            ).filter(
+                Q(order__tracking_code_expires_at__isnull=True)
+                | Q(order__tracking_code_expires_at__gte=now)
+            )
+        }
+        for name, st in untracked.items():
+            if name.startswith(TEMP_PREFIX):
+                if time.time() - st.st_mtime > TEMP_MAX_AGE:
+                    _remove_file(name)
+                    result["temp"] += 1
+            elif name in jobs:
+                record_entry(jobs[name], os.path.join(directory, name))
+                result["adopted"] += 1
+            else:
+                _remove_file(name)
+                result["untracked"] += 1
+
+    return result
+
+
+def sweep_interval():
+    return getattr(settings, "AUDIO_CACHE_SWEEP_INTERVAL", 6 * 60 * 60)
+
+
+def run_sweep():
+    """
+    Yetim temizliği + bütçe. Paylaşımlı cache'te kilit alınır ki aynı aralıkta
+    tek process çalıştırsın (LocMem ile process başına). Kilit alınamazsa None.
+    """
+    if not cache.add(SWEEP_LOCK, 1, max(sweep_interval() - 60, 60)):
+        return None
+    result = sweep_orphans()
+    result["evicted"], result["freed"] = enforce_budget()
+    logger.info("audio cache sweep: %s", result)
+    return result
+
+
+# ------------- İSTATİSTİK -------------
+
+def cache_stats():
+    stats = metrics.hit_stats(STATS_PREFIX)
+    agg = AudioCacheEntry.objects.aggregate(s=Sum("size_bytes"))
+    stats["entries"] = AudioCacheEntry.objects.count()
+    stats["indexed_bytes"] = agg["s"] or 0
+    stats["max_bytes"] = max_bytes()
+
+    disk_bytes = 0
+    directory = cache_dir()
+    if os.path.isdir(directory):
+        with os.scandir(directory) as it:
+            disk_bytes = sum(item.stat().st_size for item in it if item.is_file())
+    stats["disk_bytes"] = disk_bytes
+
+    stale_cutoff = timezone.now() - timedelta(days=7)
+    stats["idle_7d"] = AudioCacheEntry.objects.filter(last_accessed_at__lt=stale_cutoff).count()
+    return stats
+
+
+def reset_cache_stats():
+    metrics.reset_hit_stats(STATS_PREFIX)
@@ -0,0 +1,196 @@
+"""
+Admin autocomplete alanları (Day / Tour change form inline'ları).
+
+- AutocompleteAdminMixin: hedef modelin admin'i. Autocomplete aramasında
+  çok tablolu search_fields yerine autocomplete_search_fields kullanılır
+  (join/DISTINCT yok), __str__'in gezdiği FK'lar select_related ile gelir,
+  changelist prefetch'leri atlanır.
+- CachedAutocompleteJsonView: /autocomplete/ sayfaları (terim + sayfa)
+  AUTOCOMPLETE_CACHE_TIMEOUT saniye cache'lenir; hedef model kaydedilince
+  model sürümü artar ve eski sayfalar kendiliğinden geçersiz kalır.
+- AutocompleteChoicesMixin: change form'daki autocomplete alanlarının
+  seçili değerleri hedefin select_related zinciriyle okunur.
+- AutocompleteInlineMixin: inline satırlarının seçili değer etiketleri
+  formset başına alan başına tek sorguda yüklenir; widget satır başına
+  sorgu açmaz. Sayfa boyutu katalog büyüklüğünden bağımsızdır.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+
+
+def _cache():
+    return caches[getattr(settings, "AUTOCOMPLETE_CACHE_ALIAS", "default")]
+
+
+def _version_key(model):
+    return f"admin:autocomplete:version:{model._meta.label_lower}"
+
+
+def model_version(model):
+    return _cache().get_or_set(_version_key(model), 1, None)
+
+
+def bump_version(model):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.add(_version_key(model), 1, None)
+
+
+def is_autocomplete_request(request):
+    match = getattr(request, "resolver_match", None)
+    return bool(match and match.url_name == "autocomplete")
+
+
+class AutocompleteAdminMixin:
+    # Autocomplete aramasında kullanılacak doğrudan kolonlar (boşsa search_fields)
+    autocomplete_search_fields = ()
+    # __str__'in gezdiği ilişkiler
+    autocomplete_select_related = ()
+
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+        for signal in (post_save, post_delete):
+            signal.connect(
+                self._autocomplete_changed,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"autocomplete:{model._meta.label_lower}:{signal is post_save}",
+            )
+
+    @staticmethod
+    def _autocomplete_changed(sender, **kwargs):
+        bump_version(sender)
+
+    def get_search_fields(self, request):
+        if self.autocomplete_search_fields and is_autocomplete_request(request):
+            return self.autocomplete_search_fields
+        return super().get_search_fields(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        if is_autocomplete_request(request):
+            queryset = queryset.prefetch_related(None).select_related(*self.autocomplete_select_related)
+        return super().get_search_results(request, queryset, search_term)
+
+
+class CachedAutocompleteJsonView(AutocompleteJsonView):
+    def get(self, request, *args, **kwargs):
+        term, model_admin, source_field, _ = self.process_request(request)
+        if not isinstance(model_admin, AutocompleteAdminMixin):
+            return super().get(request, *args, **kwargs)
+
+        self.model_admin = model_admin
+        self.source_field = source_field
+        if not self.has_perm(request):
+            raise PermissionDenied
+
+        model = model_admin.model
+        key = ":".join([
+            "admin:autocomplete",
+            source_field.model._meta.label_lower,
+            source_field.name,
+            str(model_version(model)),
+            request.GET.get("page", "1"),
+            hashlib.md5(term.encode("utf-8")).hexdigest(),
+        ])
+        cache = _cache()
+        content = cache.get(key)
+        if content is None:
+            content = super().get(request, *args, **kwargs).content
+            cache.set(key, content, getattr(settings, "AUTOCOMPLETE_CACHE_TIMEOUT", 300))
+        return HttpResponse(content, content_type="application/json")
+
+
+class LabeledAutocompleteSelect(AutocompleteSelect):
+    """Seçili değerin etiketini labels sözlüğünden alır; yoksa normal sorgu."""
+
+    labels = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = {str(v) for v in value if str(v) not in self.choices.field.empty_values}
+        if self.labels is None or not selected <= self.labels.keys():
+            return super().optgroups(name, value, attr)
+
+        default = (None, [], 0)
+        if not self.is_required and not self.allow_multiple_selected:
+            default[1].append(self.create_option(name, "", "", False, 0))
+        for pk in selected:
+            default[1].append(
+                self.create_option(name, pk, self.labels[pk], selected, len(default[1]))
+            )
+        return [default]
+
+
+class AutocompleteChoicesMixin:
+    """
+    autocomplete_fields'taki FK/M2M seçili değerleri, hedef admin'in
+    autocomplete_select_related'ı ile okunur (__str__ ek sorgu açmaz).
+    """
+
+    def _target_select_related(self, field_name):
+        remote = self.model._meta.get_field(field_name).related_model
+        target_admin = self.admin_site._registry.get(remote)
+        return remote, getattr(target_admin, "autocomplete_select_related", ())
+
+    def _autocomplete_queryset(self, db_field, request, kwargs):
+        if "queryset" in kwargs or db_field.name not in self.get_autocomplete_fields(request):
+            return
+        remote, chain = self._target_select_related(db_field.name)
+        if chain:
+            kwargs["queryset"] = remote._default_manager.select_related(*chain)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        self._autocomplete_queryset(db_field, request, kwargs)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        self._autocomplete_queryset(db_field, request, kwargs)
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class AutocompleteInlineMixin(AutocompleteChoicesMixin):
+
+    def get_queryset(self, request):
+        related = []
+        for field_name in self.get_autocomplete_fields(request):
+            related.append(field_name)
+            _, chain = self._target_select_related(field_name)
+            related.extend(f"{field_name}__{path}" for path in chain)
+        return super().get_queryset(request).select_related(*related)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if "widget" not in kwargs and db_field.name in self.get_autocomplete_fields(request):
+            kwargs["widget"] = LabeledAutocompleteSelect(
+                db_field, self.admin_site, using=kwargs.get("using")
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        if obj is None or obj.pk is None:
+            return formset
+
+        rows = self.model._default_manager.filter(**{formset.fk.name: obj})
+        for field_name in self.get_autocomplete_fields(request):
+            field = formset.form.base_fields.get(field_name)
+            widget = getattr(getattr(field, "widget", None), "widget", None)
+            if not isinstance(widget, LabeledAutocompleteSelect):
+                continue
+
+            remote, chain = self._target_select_related(field_name)
+            attname = self.model._meta.get_field(field_name).attname
+            targets = (
+                remote._default_manager
+                .filter(pk__in=rows.values(attname))
+                .select_related(*chain)
+            )
+            widget.labels = {str(t.pk): field.label_from_instance(t) for t in targets}
+        return formset
@@ -0,0 +1,40 @@
+"""
+Transaction boyunca id toplayıp commit anında tek seferde işleyen yardımcı.
+
+Signal'lar satır satır çalışır; pahalı yeniden hesaplamaları her satırda
+yapmak yerine etkilenen id'ler burada biriktirilir ve commit sonrası handler
+bir kez çağrılır. Transaction dışında on_commit hemen çalıştığı için davranış
+autocommit modunda da doğrudur.
+"""
+import threading
+
+from django.db import transaction
+
+
+class CommitBatch:
+    def __init__(self, handler, *buckets):
+        self.handler = handler
+        self.buckets = buckets
+        self._local = threading.local()
+
+    def _pending(self):
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = {b: set() for b in self.buckets}
+        return pending
+
+    def add(self, bucket, ids):
+        ids = {i for i in ids if i}
+        if not ids:
+            return
+        self._pending()[bucket].update(ids)
+        # Aynı transaction'da birden fazla kez kuyruğa girer;
+        # ilk flush işi yapar, diğerleri boş döner.
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        pending = getattr(self._local, "pending", None)
+        if not pending or not any(pending.values()):
+            return
+        self._local.pending = None
+        self.handler(**pending)
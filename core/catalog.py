@@ -0,0 +1,161 @@
+"""
+Tur kataloğu özeti (TourCatalogEntry).
+
+tour_grid'in her tur için Python'da hesapladığı süre, mil, başlangıç/bitiş
+şehri, kapak fotoğrafı ve otel sayısı burada toplu olarak hesaplanıp saklanır.
+Değişiklikler transaction boyunca toplanır ve commit anında tek seferde yazılır.
+"""
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .batching import CommitBatch
+from .models import (
+    Day, DayActivity, DayHotel, Tour, TourCatalogEntry, TourDay, TourPhoto,
+)
+
+
+def count_subquery(qs, group_by, field="id", distinct=False):
+    """OuterRef ile filtrelenmiş qs için satır başına sayı (yoksa 0); admin listeleri de kullanır."""
+    qs = (
+        qs.order_by()
+        .values(group_by)
+        .annotate(c=Count(field, distinct=distinct))
+        .values("c")[:1]
+    )
+    return Coalesce(Subquery(qs), Value(0))
+
+
+def refresh_catalog(tour_ids=None):
+    """
+    Verilen turların (None ise hepsinin) katalog kaydını yeniden yazar.
+    Tur sayısından bağımsız olarak sabit sayıda sorgu çalışır.
+    """
+    tours = Tour.objects.all()
+    if tour_ids is not None:
+        tour_ids = set(tour_ids)
+        if not tour_ids:
+            return 0
+        tours = tours.filter(pk__in=tour_ids)
+
+    rows = tours.annotate(
+        tour_days_total=count_subquery(
+            TourDay.objects.filter(tour_id=OuterRef("pk")), "tour_id"
+        ),
+        # Tour.total_days ile aynı: TourDay yoksa kapsanan şehirlerin günleri
+        covered_days_total=count_subquery(
+            Day.objects.filter(city__tours=OuterRef("pk")), "city__tours"
+        ),
+        hotels_distinct=count_subquery(
+            DayHotel.objects.filter(day__tourday__tour_id=OuterRef("pk")),
+            "day__tourday__tour_id",
+            field="hotel_id",
+            distinct=True,
+        ),
+    ).values_list("pk", "tour_days_total", "covered_days_total", "hotels_distinct")
+
+    entries = {
+        pk: TourCatalogEntry(
+            tour_id=pk,
+            total_days=tour_days_total or covered_days_total,
+            hotels_count=hotels_distinct,
+        )
+        for pk, tour_days_total, covered_days_total, hotels_distinct in rows
+    }
+    if not entries:
+        return 0
+    ids = list(entries)
+
+    # Mil: turdaki benzersiz aktivitelerin miles_reward toplamı
+    seen = set()
+    miles = (
+        DayActivity.objects
+        .filter(day__tourday__tour_id__in=ids)
+        .order_by()
+        .values_list("day__tourday__tour_id", "activity_id", "activity__miles_reward")
+    )
+    for tour_id, activity_id, reward in miles:
+        if (tour_id, activity_id) in seen:
+            continue
+        seen.add((tour_id, activity_id))
+        entries[tour_id].total_miles += reward or 0
+
+    # Başlangıç / bitiş şehri (TourDay sırasına göre ilk ve son gün)
+    cities = (
+        TourDay.objects
+        .filter(tour_id__in=ids)
+        .order_by("tour_id", "order", "id")
+        .values_list("tour_id", "day__city__name")
+    )
+    for tour_id, city_name in cities:
+        entry = entries[tour_id]
+        if not entry.start_city:
+            entry.start_city = city_name or ""
+        entry.end_city = city_name or ""
+
+    # Kapak: ilk TourPhoto
+    photos = (
+        TourPhoto.objects
+        .filter(tour_id__in=ids)
+        .order_by("tour_id", "order", "id")
+        .values_list("tour_id", "image", "alt_text")
+    )
+    for tour_id, image, alt_text in photos:
+        entry = entries[tour_id]
+        if not entry.cover_image:
+            entry.cover_image = image
+            entry.cover_alt_text = alt_text or ""
+
+    TourCatalogEntry.objects.bulk_create(
+        entries.values(),
+        update_conflicts=True,
+        unique_fields=["tour"],
+        update_fields=[
+            "total_days", "total_miles", "start_city", "end_city",
+            "cover_image", "cover_alt_text", "hotels_count", "updated_at",
+        ],
+    )
+    return len(entries)
+
+
+def refresh_missing(tours=None):
+    """
+    Katalog kaydı olmayan turları (None ise tüm turlar arasından) doldurur.
+    rebuild_tour_catalog çalıştırılmadan önce oluşturulmuş turlar ilk
+    okumada kendiliğinden yazılır; eksik yoksa tek sorgu çalışır.
+    """
+    tours = Tour.objects.all() if tours is None else tours
+    missing = list(
+        tours.filter(catalog_entry__isnull=True).order_by().values_list("pk", flat=True)
+    )
+    return refresh_catalog(missing) if missing else 0
+
+
+# ------------- DIRTY TAKİBİ -------------
+
+def _refresh_dirty(days, tours, cities):
+    if days:
+        tours |= set(
+            TourDay.objects.filter(day_id__in=days).values_list("tour_id", flat=True)
+        )
+    if cities:
+        # TourDay'i olmayan turların süresi kapsanan şehirlerin günlerinden gelir
+        tours |= set(
+            Tour.objects.filter(places_covered__in=cities).values_list("pk", flat=True)
+        )
+    refresh_catalog(tours)
+
+
+_batch = CommitBatch(_refresh_dirty, "days", "tours", "cities")
+flush = _batch.flush
+
+
+def mark_days_dirty(day_ids):
+    _batch.add("days", day_ids)
+
+
+def mark_tours_dirty(tour_ids):
+    _batch.add("tours", tour_ids)
+
+
+def mark_cities_dirty(city_ids):
+    _batch.add("cities", city_ids)
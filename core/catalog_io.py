@@ -0,0 +1,723 @@
+"""
+Katalog içe / dışa aktarımı (import_catalog / export_catalog).
+
+Belge JSON ya da YAML'dır; kayıtlar birbirine id ile değil doğal anahtarla
+bağlanır, böylece aynı belge farklı veritabanlarına yüklenebilir:
+
+    ülke        "Italy"
+    şehir       ["Italy", "Rome"]
+    havalimanı  "FCO"
+    havayolu    "Turkish Airlines"
+    uçuş        ["Turkish Airlines", "TK1861", "IST", "FCO"]
+    otel        ["Italy", "Rome", "Hotel Artemide"]
+    transfer    [["Italy", "Rome"], "FCO", ["Italy", "Rome", "Hotel Artemide"], "A2H"]
+    aktivite    [["Italy", "Rome"], "Kolezyum"]      (şehirsizse [null, başlık])
+    gün         [["Italy", "Rome"], 3]               (şehir + day_number)
+    tur         slug
+    tur tipi    ad, bullet: metin
+
+İçe aktarma her modeli tek sorguda okur, eksikleri bulk_create, değişenleri
+bulk_update ile yazar. Belgedeki gün/turların ara tabloları (DayFlight,
+TourDay, TourBullet, M2M'ler) belgeye eşitlenir; yalnızca belgeden çıkarılan
+satırlar silinir. bulk işlemler sinyal göndermez (TourDay receiver'ları da
+askıya alınır); fiyat, öğe sayısı ve katalog özeti en sonda set-based
+sorgularla bir kez hesaplanır. Görsel / ses dosyaları aktarılmaz.
+"""
+import json
+from collections import Counter
+from datetime import date, time
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import (
+    Activity, Airline, Airport, AirportTransfer, Bullet, City, Country, Day,
+    DayActivity, DayFlight, DayHotel, DayTransfer, Flight, Hotel, Tour,
+    TourBullet, TourDay, TourType,
+)
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 500
+
+FLIGHT_FIELDS = ("departure_time", "arrival_time", "duration_minutes", "price", "price_currency")
+HOTEL_FIELDS = ("star", "price_per_night", "price_currency", "hotel_type")
+TRANSFER_FIELDS = ("vehicle_type", "price", "price_currency")
+BULLET_FIELDS = ("icon", "tags", "is_active")
+ACTIVITY_FIELDS = (
+    "location_text", "points", "duration_hours", "price", "price_currency",
+    "miles_reward", "latitude", "longitude", "apple_maps_url",
+)
+DAY_FIELDS = ("title", "description", "bullets", "price_currency")
+TOUR_FIELDS = (
+    "title", "allow_flights", "allow_hotels", "allow_transfers", "start_date", "end_date",
+    "overview", "info", "commission", "price_currency", "compare_at_price",
+    "compare_at_currency", "badge_text", "is_published",
+)
+
+# Gün öğeleri: (belge anahtarı, through model, hedef FK)
+DAY_ITEMS = (
+    ("flights", DayFlight, "flight_id"),
+    ("transfers", DayTransfer, "transfer_id"),
+    ("hotels", DayHotel, "hotel_id"),
+    ("activities", DayActivity, "activity_id"),
+)
+
+
+class CatalogImportError(ValueError):
+    pass
+
+
+# ------------- DOSYA -------------
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError as exc:
+        raise ImproperlyConfigured("YAML katalog için PyYAML gerekli.") from exc
+    return yaml
+
+
+def format_for(path, fmt=None):
+    if fmt:
+        return fmt
+    return "yaml" if Path(str(path)).suffix.lower() in (".yaml", ".yml") else "json"
+
+
+def load_document(stream, fmt="json"):
+    if fmt == "yaml":
+        return _yaml().safe_load(stream)
+    return json.load(stream)
+
+
+def dump_document(document, stream, fmt="json"):
+    if fmt == "yaml":
+        _yaml().safe_dump(document, stream, allow_unicode=True, sort_keys=False)
+    else:
+        json.dump(document, stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+
+
+# ------------- DOĞAL ANAHTARLAR -------------
+
+def _freeze(value):
+    """Belgedeki liste anahtarları sözlük anahtarı olabilsin diye tuple'a çevrilir."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def city_key(city):
+    return (city.country.name, city.name)
+
+
+def flight_key(flight):
+    return (flight.airline.name, flight.flight_number, flight.origin.iata, flight.destination.iata)
+
+
+def hotel_key(hotel):
+    return (*city_key(hotel.city), hotel.name)
+
+
+def transfer_key(transfer):
+    return (city_key(transfer.city), transfer.airport.iata, hotel_key(transfer.hotel), transfer.direction)
+
+
+def activity_key(activity):
+    return (city_key(activity.city) if activity.city_id else None, activity.title)
+
+
+def day_key(day):
+    return (city_key(day.city), day.day_number)
+
+
+def _dump_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def _fields(obj, names):
+    return {name: _dump_value(getattr(obj, name)) for name in names}
+
+
+# ------------- DIŞA AKTARMA -------------
+
+def export_catalog(tour_slugs=None):
+    """
+    Kataloğu belge olarak döndürür. tour_slugs verilirse yalnızca o turlar
+    ve bağlı oldukları gün, bileşen ve coğrafya kayıtları yazılır.
+    Model başına sabit sayıda sorgu çalışır.
+    """
+    tours = Tour.objects.order_by("pk")
+    scoped = tour_slugs is not None
+    if scoped:
+        tours = tours.filter(slug__in=tour_slugs)
+    tours = list(
+        tours
+        .select_related(
+            "arrival_flight__airline", "arrival_flight__origin", "arrival_flight__destination",
+            "departure_flight__airline", "departure_flight__origin", "departure_flight__destination",
+        )
+        .prefetch_related("places_covered__country", "tour_types")
+    )
+    tour_ids = [t.pk for t in tours]
+
+    tour_days = list(
+        TourDay.objects.filter(tour_id__in=tour_ids)
+        .select_related("day__city__country").order_by("tour_id", "order", "id")
+    )
+    tour_bullets = list(
+        TourBullet.objects.filter(tour_id__in=tour_ids)
+        .select_related("bullet").order_by("tour_id", "section", "order", "id")
+    )
+
+    days = Day.objects.select_related("city__country").order_by("city__country__name", "city__name", "day_number")
+    if scoped:
+        days = days.filter(pk__in={td.day_id for td in tour_days})
+    days = list(days)
+    day_ids = [d.pk for d in days]
+
+    def scope(qs, ids, lookup="pk__in"):
+        return qs.filter(**{lookup: ids}) if scoped else qs
+
+    items = {
+        name: list(scope(model.objects.all(), day_ids, "day_id__in").order_by("day_id", "order", "id"))
+        for name, model, _ in DAY_ITEMS
+    }
+
+    flight_ids = {r.flight_id for r in items["flights"]}
+    flight_ids |= {t.arrival_flight_id for t in tours} | {t.departure_flight_id for t in tours}
+    flight_ids.discard(None)
+    flights = list(scope(
+        Flight.objects.select_related("airline", "origin__city__country", "destination__city__country"),
+        flight_ids,
+    ).order_by("airline__name", "flight_number", "pk"))
+
+    transfers = list(scope(
+        AirportTransfer.objects.select_related("city__country", "airport", "hotel__city__country"),
+        {r.transfer_id for r in items["transfers"]},
+    ).order_by("city__name", "pk"))
+
+    hotel_ids = {r.hotel_id for r in items["hotels"]} | {t.hotel_id for t in transfers}
+    hotels = list(scope(Hotel.objects.select_related("city__country"), hotel_ids).order_by("city__name", "name", "pk"))
+
+    activities = list(scope(
+        Activity.objects.select_related("city__country").prefetch_related("tour_types"),
+        {r.activity_id for r in items["activities"]},
+    ).order_by("city__name", "title", "pk"))
+
+    airport_ids = {f.origin_id for f in flights} | {f.destination_id for f in flights}
+    airport_ids |= {t.airport_id for t in transfers}
+    airports = list(scope(Airport.objects.select_related("city__country"), airport_ids).order_by("iata"))
+    airlines = list(scope(Airline.objects.all(), {f.airline_id for f in flights}).order_by("name"))
+
+    bullets = list(scope(Bullet.objects.all(), {tb.bullet_id for tb in tour_bullets}).order_by("text"))
+    type_names = {tt.name for t in tours for tt in t.tour_types.all()}
+    type_names |= {tt.name for a in activities for tt in a.tour_types.all()}
+    tour_types = TourType.objects.order_by("name")
+    if scoped:
+        tour_types = tour_types.filter(name__in=type_names)
+
+    city_ids = {d.city_id for d in days} | {h.city_id for h in hotels} | {t.city_id for t in transfers}
+    city_ids |= {a.city_id for a in airports} | {a.city_id for a in activities if a.city_id}
+    city_ids |= {c.pk for t in tours for c in t.places_covered.all()}
+    cities = list(scope(City.objects.select_related("country"), city_ids).order_by("country__name", "name"))
+    countries = scope(Country.objects.all(), {c.country_id for c in cities}).order_by("name")
+
+    # Aynı doğal anahtarı paylaşan kayıtlardan ilki yazılır
+    def unique(objs, key):
+        seen = {}
+        for obj in objs:
+            seen.setdefault(key(obj), obj)
+        return list(seen.values())
+
+    by_day = {name: {} for name, _, _ in DAY_ITEMS}
+    flight_by_id = {f.pk: f for f in flights}
+    transfer_by_id = {t.pk: t for t in transfers}
+    hotel_by_id = {h.pk: h for h in hotels}
+    activity_by_id = {a.pk: a for a in activities}
+    targets = {
+        "flights": (flight_by_id, flight_key),
+        "transfers": (transfer_by_id, transfer_key),
+        "hotels": (hotel_by_id, hotel_key),
+        "activities": (activity_by_id, activity_key),
+    }
+    for name, _, attname in DAY_ITEMS:
+        objs, key = targets[name]
+        for row in items[name]:
+            target = objs.get(getattr(row, attname))
+            if target is not None:
+                by_day[name].setdefault(row.day_id, []).append(_thaw(key(target)))
+
+    days_by_tour, bullets_by_tour = {}, {}
+    for td in tour_days:
+        days_by_tour.setdefault(td.tour_id, []).append({"day": _thaw(day_key(td.day)), "title": td.title})
+    for tb in tour_bullets:
+        bullets_by_tour.setdefault(tb.tour_id, []).append({"text": tb.bullet.text, "section": tb.section})
+
+    def flight_ref(flight):
+        return _thaw(flight_key(flight)) if flight else None
+
+    return {
+        "version": FORMAT_VERSION,
+        "countries": [{"name": c.name, "iso2": c.iso2} for c in countries],
+        "cities": [{"country": c.country.name, "name": c.name} for c in cities],
+        "airports": [
+            {"iata": a.iata, "name": a.name, "city": _thaw(city_key(a.city))} for a in airports
+        ],
+        "airlines": [{"name": a.name} for a in airlines],
+        "flights": [
+            {
+                "airline": f.airline.name, "flight_number": f.flight_number,
+                "origin": f.origin.iata, "destination": f.destination.iata,
+                **_fields(f, FLIGHT_FIELDS),
+            }
+            for f in unique(flights, flight_key)
+        ],
+        "hotels": [
+            {"city": _thaw(city_key(h.city)), "name": h.name, **_fields(h, HOTEL_FIELDS)}
+            for h in unique(hotels, hotel_key)
+        ],
+        "transfers": [
+            {
+                "city": _thaw(city_key(t.city)), "airport": t.airport.iata,
+                "hotel": _thaw(hotel_key(t.hotel)), "direction": t.direction,
+                **_fields(t, TRANSFER_FIELDS),
+            }
+            for t in unique(transfers, transfer_key)
+        ],
+        "tour_types": [tt.name for tt in tour_types],
+        "bullets": [{"text": b.text, **_fields(b, BULLET_FIELDS)} for b in bullets],
+        "activities": [
+            {
+                "city": _thaw(city_key(a.city)) if a.city_id else None, "title": a.title,
+                **_fields(a, ACTIVITY_FIELDS),
+                "tour_types": sorted(tt.name for tt in a.tour_types.all()),
+            }
+            for a in unique(activities, activity_key)
+        ],
+        "days": [
+            {
+                "city": _thaw(city_key(d.city)), "day_number": d.day_number,
+                **_fields(d, DAY_FIELDS),
+                **{name: by_day[name].get(d.pk, []) for name, _, _ in DAY_ITEMS},
+            }
+            for d in days
+        ],
+        "tours": [
+            {
+                "slug": t.slug,
+                **_fields(t, TOUR_FIELDS),
+                "places_covered": [_thaw(city_key(c)) for c in t.places_covered.all()],
+                "tour_types": sorted(tt.name for tt in t.tour_types.all()),
+                "arrival_flight": flight_ref(t.arrival_flight),
+                "departure_flight": flight_ref(t.departure_flight),
+                "days": days_by_tour.get(t.pk, []),
+                "bullets": bullets_by_tour.get(t.pk, []),
+            }
+            for t in tours
+        ],
+    }
+
+
+# Ara tablo satırlarına dönüşen iç listeler
+RELATION_LISTS = {
+    "activities": ("tour_types",),
+    "days": tuple(name for name, _, _ in DAY_ITEMS),
+    "tours": ("places_covered", "tour_types", "days", "bullets"),
+}
+
+
+def document_rows(document):
+    """Belgedeki kayıt + ara tablo satırı sayısı (satır/sn raporu için)."""
+    total = 0
+    for name, rows in document.items():
+        if not isinstance(rows, list):
+            continue
+        total += len(rows)
+        for row in rows:
+            for relation in RELATION_LISTS.get(name, ()):
+                total += len(row.get(relation) or ())
+    return total
+
+
+# ------------- İÇE AKTARMA -------------
+
+def _clean(model, name, value):
+    return model._meta.get_field(name).to_python(value)
+
+
+class CatalogImporter:
+    """
+    importer = CatalogImporter(document); importer.run()
+    importer.written: {model adı: oluşturulan + güncellenen satır}
+    """
+
+    def __init__(self, document):
+        if not isinstance(document, dict):
+            raise CatalogImportError("Katalog belgesi bir sözlük olmalı.")
+        version = document.get("version", FORMAT_VERSION)
+        if version != FORMAT_VERSION:
+            raise CatalogImportError(f"Desteklenmeyen katalog sürümü: {version}")
+        self.document = document
+        self.written = Counter()
+        # Güncellenen (yeni olmayan) satırlar; fiyatı değişen bileşenin günleri de yenilenir
+        self.updated = {}
+
+    def rows(self, name):
+        return self.document.get(name) or []
+
+    def _resolve(self, index, key, kind):
+        key = _freeze(key)
+        try:
+            return index[key].pk
+        except KeyError:
+            raise CatalogImportError(f"Bilinmeyen {kind}: {_thaw(key)}") from None
+
+    def _upsert(self, model, existing, entries):
+        """
+        entries: [(doğal anahtar, {alan: değer})]. existing ({anahtar: nesne})
+        yerinde güncellenir; yeni satırlar bulk_create, değişenler bulk_update.
+        """
+        created, updated, fields = [], {}, set()
+        for key, values in entries:
+            obj = existing.get(key)
+            if obj is None:
+                existing[key] = obj = model(**values)
+                created.append(obj)
+                continue
+            changed = [name for name, value in values.items() if getattr(obj, name) != value]
+            if changed and obj.pk is not None:
+                for name in changed:
+                    setattr(obj, name, values[name])
+                updated[obj.pk] = obj
+                fields.update(changed)
+            elif changed:
+                # Belgede aynı anahtar ikinci kez geçti; yeni satırın değerleri güncellenir
+                for name in changed:
+                    setattr(obj, name, values[name])
+
+        model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if updated:
+            model.objects.bulk_update(list(updated.values()), sorted(fields), batch_size=BATCH_SIZE)
+        self.written[model._meta.model_name] += len(created) + len(updated)
+        self.updated[model] = set(updated)
+        return existing
+
+    def _sync_through(self, model, parent_attr, child_attr, desired):
+        """
+        desired: {parent_id: [(child_id, {alan: değer}), ...]}. Ebeveynlerin
+        mevcut satırları (parent, child, tekrar sırası) ile eşlenir; eksikler
+        oluşturulur, değişenler güncellenir, belgede olmayanlar silinir.
+        """
+        if not desired:
+            return
+        existing = {}
+        seen = Counter()
+        for obj in model.objects.filter(**{f"{parent_attr}__in": list(desired)}).order_by("pk"):
+            pair = (getattr(obj, parent_attr), getattr(obj, child_attr))
+            existing[(*pair, seen[pair])] = obj
+            seen[pair] += 1
+
+        created, updated, fields = [], [], set()
+        for parent_id, children in desired.items():
+            occurrence = Counter()
+            for child_id, values in children:
+                obj = existing.pop((parent_id, child_id, occurrence[child_id]), None)
+                occurrence[child_id] += 1
+                if obj is None:
+                    created.append(model(**{parent_attr: parent_id, child_attr: child_id}, **values))
+                    continue
+                changed = [name for name, value in values.items() if getattr(obj, name) != value]
+                if changed:
+                    for name in changed:
+                        setattr(obj, name, values[name])
+                    updated.append(obj)
+                    fields.update(changed)
+
+        if existing:
+            model.objects.filter(pk__in=[obj.pk for obj in existing.values()]).delete()
+        model.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if updated:
+            model.objects.bulk_update(updated, sorted(fields), batch_size=BATCH_SIZE)
+        self.written[model._meta.model_name] += len(created) + len(updated) + len(existing)
+
+    def run(self):
+        from .tourdays import suspend_tourday_signals
+
+        with transaction.atomic(), suspend_tourday_signals():
+            self._import()
+        return sum(self.written.values())
+
+    def _import(self):
+        countries = self._upsert(
+            Country,
+            {c.name: c for c in Country.objects.all()},
+            [(r["name"], {"name": r["name"], "iso2": r.get("iso2")}) for r in self.rows("countries")],
+        )
+
+        cities = self._upsert(
+            City,
+            {city_key(c): c for c in City.objects.select_related("country")},
+            [
+                ((r["country"], r["name"]), {
+                    "name": r["name"],
+                    "country_id": self._resolve(countries, r["country"], "ülke"),
+                })
+                for r in self.rows("cities")
+            ],
+        )
+        airports = self._upsert(
+            Airport,
+            {a.iata: a for a in Airport.objects.all()},
+            [
+                (r["iata"], {
+                    "iata": r["iata"], "name": r["name"],
+                    "city_id": self._resolve(cities, r["city"], "şehir"),
+                })
+                for r in self.rows("airports")
+            ],
+        )
+        airlines = self._upsert(
+            Airline,
+            {a.name: a for a in Airline.objects.all()},
+            [(r["name"], {"name": r["name"]}) for r in self.rows("airlines")],
+        )
+
+        flights = self._upsert(
+            Flight,
+            {flight_key(f): f for f in Flight.objects.select_related("airline", "origin", "destination")},
+            [
+                ((r["airline"], r["flight_number"], r["origin"], r["destination"]), {
+                    "airline_id": self._resolve(airlines, r["airline"], "havayolu"),
+                    "flight_number": r["flight_number"],
+                    "origin_id": self._resolve(airports, r["origin"], "havalimanı"),
+                    "destination_id": self._resolve(airports, r["destination"], "havalimanı"),
+                    **self._values(Flight, r, FLIGHT_FIELDS),
+                })
+                for r in self.rows("flights")
+            ],
+        )
+
+        hotels = self._upsert(
+            Hotel,
+            {hotel_key(h): h for h in Hotel.objects.select_related("city__country")},
+            [
+                ((*r["city"], r["name"]), {
+                    "name": r["name"],
+                    "city_id": self._resolve(cities, r["city"], "şehir"),
+                    **self._values(Hotel, r, HOTEL_FIELDS),
+                })
+                for r in self.rows("hotels")
+            ],
+        )
+
+        transfers = self._upsert(
+            AirportTransfer,
+            {
+                transfer_key(t): t
+                for t in AirportTransfer.objects.select_related("city__country", "airport", "hotel__city__country")
+            },
+            [
+                (_freeze([r["city"], r["airport"], r["hotel"], r.get("direction", "A2H")]), {
+                    "city_id": self._resolve(cities, r["city"], "şehir"),
+                    "airport_id": self._resolve(airports, r["airport"], "havalimanı"),
+                    "hotel_id": self._resolve(hotels, r["hotel"], "otel"),
+                    "direction": r.get("direction", "A2H"),
+                    **self._values(AirportTransfer, r, TRANSFER_FIELDS),
+                })
+                for r in self.rows("transfers")
+            ],
+        )
+
+        type_names = set(self.rows("tour_types"))
+        type_names |= {n for r in self.rows("activities") for n in r.get("tour_types", ())}
+        type_names |= {n for r in self.rows("tours") for n in r.get("tour_types", ())}
+        tour_types = self._upsert(
+            TourType,
+            {t.name: t for t in TourType.objects.all()},
+            [(name, {"name": name}) for name in sorted(type_names)],
+        )
+
+        bullet_rows = list(self.rows("bullets"))
+        known = {r["text"] for r in bullet_rows}
+        bullet_rows += [
+            {"text": b["text"]} for r in self.rows("tours") for b in r.get("bullets", ())
+            if b["text"] not in known
+        ]
+        bullets = self._upsert(
+            Bullet,
+            {b.text: b for b in Bullet.objects.all()},
+            [(r["text"], {"text": r["text"], **self._values(Bullet, r, BULLET_FIELDS)}) for r in bullet_rows],
+        )
+
+        activities = self._upsert(
+            Activity,
+            {activity_key(a): a for a in Activity.objects.select_related("city__country")},
+            [
+                (_freeze([r.get("city"), r["title"]]), {
+                    "title": r["title"],
+                    "city_id": self._resolve(cities, r["city"], "şehir") if r.get("city") else None,
+                    **self._values(Activity, r, ACTIVITY_FIELDS),
+                })
+                for r in self.rows("activities")
+            ],
+        )
+        self._sync_through(
+            Activity.tour_types.through, "activity_id", "tourtype_id",
+            {
+                activities[_freeze([r.get("city"), r["title"]])].pk: [
+                    (self._resolve(tour_types, name, "tur tipi"), {}) for name in r.get("tour_types", ())
+                ]
+                for r in self.rows("activities") if "tour_types" in r
+            },
+        )
+
+        days = self._upsert(
+            Day,
+            {day_key(d): d for d in Day.objects.select_related("city__country")},
+            [
+                (_freeze([r["city"], r["day_number"]]), {
+                    "day_number": r["day_number"],
+                    "city_id": self._resolve(cities, r["city"], "şehir"),
+                    **self._values(Day, r, DAY_FIELDS),
+                })
+                for r in self.rows("days")
+            ],
+        )
+        indexes = {"flights": flights, "transfers": transfers, "hotels": hotels, "activities": activities}
+        for name, model, attname in DAY_ITEMS:
+            self._sync_through(
+                model, "day_id", attname,
+                {
+                    days[_freeze([r["city"], r["day_number"]])].pk: [
+                        (self._resolve(indexes[name], key, name), {"order": position})
+                        for position, key in enumerate(r[name], start=1)
+                    ]
+                    for r in self.rows("days") if name in r
+                },
+            )
+
+        self.day_ids = {days[_freeze([r["city"], r["day_number"]])].pk for r in self.rows("days")}
+        self.tour_ids = self._import_tours(cities, flights, tour_types, bullets, days)
+        self._recompute()
+
+    def _values(self, model, row, names):
+        return {name: _clean(model, name, row[name]) for name in names if name in row}
+
+    def _import_tours(self, cities, flights, tour_types, bullets, days):
+        rows = self.rows("tours")
+        for r in rows:
+            r.setdefault("slug", slugify(r.get("title", "")))
+
+        def flight_id(value):
+            return self._resolve(flights, value, "uçuş") if value else None
+
+        tours = self._upsert(
+            Tour,
+            {t.slug: t for t in Tour.objects.all()},
+            [
+                (r["slug"], {
+                    "slug": r["slug"],
+                    **self._values(Tour, r, TOUR_FIELDS),
+                    **{
+                        f"{name}_id": flight_id(r[name])
+                        for name in ("arrival_flight", "departure_flight") if name in r
+                    },
+                })
+                for r in rows
+            ],
+        )
+
+        city_names = {c.pk: c.name for c in cities.values()}
+
+        def desired(name, build):
+            return {tours[r["slug"]].pk: build(r[name]) for r in rows if name in r}
+
+        self._sync_through(
+            Tour.places_covered.through, "tour_id", "city_id",
+            desired("places_covered", lambda keys: [
+                (self._resolve(cities, key, "şehir"), {}) for key in keys
+            ]),
+        )
+        self._sync_through(
+            Tour.tour_types.through, "tour_id", "tourtype_id",
+            desired("tour_types", lambda names: [
+                (self._resolve(tour_types, name, "tur tipi"), {}) for name in names
+            ]),
+        )
+
+        def tour_days(entries):
+            result = []
+            for position, entry in enumerate(entries, start=1):
+                day = days.get(_freeze(entry["day"]))
+                if day is None:
+                    raise CatalogImportError(f"Bilinmeyen gün: {entry['day']}")
+                title = entry.get("title") or f"Day {position}: {day.title or city_names[day.city_id]}"
+                result.append((day.pk, {"order": position, "title": title}))
+            return result
+
+        self._sync_through(TourDay, "tour_id", "day_id", desired("days", tour_days))
+
+        def tour_bullets(entries):
+            positions = Counter()
+            result = []
+            for entry in entries:
+                section = entry.get("section", TourBullet.Section.HIGHLIGHTS)
+                positions[section] += 1
+                result.append((
+                    self._resolve(bullets, entry["text"], "bullet"),
+                    {"section": section, "order": positions[section]},
+                ))
+            return result
+
+        self._sync_through(TourBullet, "tour_id", "bullet_id", desired("bullets", tour_bullets))
+        return {t.pk for t in tours.values() if t.slug in {r["slug"] for r in rows}}
+
+    def _recompute(self):
+        """Etkilenen gün ve turlar için fiyat, öğe sayısı ve katalog özeti."""
+        from . import itinerary
+        from .catalog import refresh_catalog
+        from .pricing import recompute_day_prices, recompute_tour_prices
+        from .tourdays import recompute_item_counts
+
+        day_ids = set(self.day_ids)
+        components = Q()
+        for model, lookup in (
+            (Flight, "dayflight__flight_id__in"),
+            (AirportTransfer, "daytransfer__transfer_id__in"),
+            (Hotel, "dayhotel__hotel_id__in"),
+            (Activity, "dayactivity__activity_id__in"),
+        ):
+            if self.updated.get(model):
+                components |= Q(**{lookup: self.updated[model]})
+        if components:
+            day_ids |= set(Day.objects.filter(components).order_by().values_list("pk", flat=True).distinct())
+        tour_ids = self.tour_ids | set(
+            TourDay.objects.filter(day_id__in=day_ids).order_by().values_list("tour_id", flat=True).distinct()
+        )
+
+        recompute_day_prices(day_ids)
+        recompute_tour_prices(tour_ids)
+        recompute_item_counts(tour_ids)
+        refresh_catalog(tour_ids)
+        itinerary.mark_stale("tours", tour_ids)
+        self.recomputed = (len(day_ids), len(tour_ids))
+
+
+def import_catalog(document):
+    importer = CatalogImporter(document)
+    importer.run()
+    return importer
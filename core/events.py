@@ -0,0 +1,204 @@
+"""
+Canlı olaylar (SSE) için pub/sub.
+
+publish senkron koddan (view, konum flush thread'i, signal) commit sonrası
+çağrılır; subscribe ASGI altında çalışan SSE view'ları içindir.
+
+- LocalBroker: process içi; tek worker için yeterli.
+- PostgresBroker: olaylar pg_notify ile yayınlanır, her process tek bir
+  LISTEN bağlantısıyla alıp kendi abonelerine dağıtır. Birden fazla worker
+  için EVENTS_BACKEND = "core.events.PostgresBroker".
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+LOCATIONS = "locations"
+PROGRESS = "progress"
+
+# Yavaş istemci kuyruğu dolarsa en eski olay düşer
+QUEUE_SIZE = 100
+
+
+def progress_topic(code):
+    return f"{PROGRESS}:{code}"
+
+
+class Subscription:
+    """async with broker.subscribe(...) as sub: aboneliği çıkışta kaldırır."""
+
+    def __init__(self, broker, topics):
+        self.broker = broker
+        self.topics = topics
+        self.loop = None
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.remove(self)
+
+    def deliver(self, event, data):
+        # Sadece aboneliğin event loop'unda çalışır
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait((event, data))
+
+    async def get(self, timeout):
+        """(event, data); timeout dolarsa None."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event, data):
+        self.dispatch(topic, event, data)
+
+    def dispatch(self, topic, event, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for sub in subscriptions:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, event, data)
+            except RuntimeError:
+                # Event loop kapanmış; abonelik birazdan kendini siler
+                pass
+
+    def start(self):
+        pass
+
+    def subscribe(self, *topics):
+        self.start()
+        return Subscription(self, topics)
+
+    def add(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                self._subscriptions.setdefault(topic, set()).add(sub)
+
+    def remove(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers:
+                    subscribers.discard(sub)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+
+class PostgresBroker(LocalBroker):
+    channel = "nomaya_events"
+    # NOTIFY payload sınırı 8000 bayt
+    max_payload = 7900
+    # DATABASES OPTIONS içinde libpq'ye gitmeyen, Django'ya özgü anahtarlar
+    django_only_options = {"isolation_level", "server_side_binding", "assume_role", "pool"}
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, topic, event, data):
+        payload = json.dumps({"topic": topic, "event": event, "data": data}, cls=DjangoJSONEncoder)
+        if len(payload.encode("utf-8")) > self.max_payload:
+            logger.warning("event payload çok büyük, atlandı: %s/%s", topic, event)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen_forever, name="nomaya-events", daemon=True,
+                )
+                self._listener.start()
+
+    def _conninfo(self):
+        try:
+            from psycopg.conninfo import make_conninfo
+        except ImportError as exc:
+            raise ImproperlyConfigured("PostgresBroker için psycopg (v3) gerekli.") from exc
+
+        db = settings.DATABASES["default"]
+        params = {
+            "dbname": db.get("NAME"),
+            "user": db.get("USER"),
+            "password": db.get("PASSWORD"),
+            "host": db.get("HOST"),
+            "port": db.get("PORT"),
+        }
+        # sslmode, connect_timeout vb. OPTIONS Django bağlantısıyla aynı olmalı
+        params.update(
+            (k, v) for k, v in db.get("OPTIONS", {}).items() if k not in self.django_only_options
+        )
+        return make_conninfo(**{k: str(v) for k, v in params.items() if v})
+
+    def _listen_forever(self):
+        import psycopg
+
+        while True:
+            try:
+                with psycopg.connect(self._conninfo(), autocommit=True) as conn:
+                    conn.execute(f"LISTEN {self.channel}")
+                    for notify in conn.notifies():
+                        message = json.loads(notify.payload)
+                        self.dispatch(message["topic"], message["event"], message["data"])
+            except Exception:
+                logger.exception("event listener bağlantısı koptu, yeniden bağlanılıyor")
+                time.sleep(3)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            backend = getattr(settings, "EVENTS_BACKEND", "core.events.LocalBroker")
+            _broker = import_string(backend)()
+        return _broker
+
+
+def publish(topic, event, data):
+    """Olay yayınlar; hata yazma yolunu asla bozmaz."""
+    try:
+        broker().publish(topic, event, data)
+    except Exception:
+        logger.exception("event yayınlanamadı: %s/%s", topic, event)
+
+
+def publish_on_commit(topic, event, data):
+    transaction.on_commit(lambda: publish(topic, event, data))
+
+
+def publish_progress(progress):
+    """ActivityProgress durumu: tracker sayfasına ve canlı haritaya."""
+    code = progress.order.tracking_code
+    data = {
+        "code": code,
+        "day_activity_id": progress.day_activity_id,
+        "status": progress.status,
+    }
+    publish_on_commit(progress_topic(code), "progress", data)
+    publish_on_commit(PROGRESS, "progress", data)
@@ -0,0 +1,344 @@
+"""
+Tur gün planı (itinerary) oluşturucu.
+
+tour_detail, tour_booking_detail_public, tour_booking_detail ve
+order_itinerary aynı gün grafiğini (TourDay -> Day -> uçuş/transfer/otel/
+aktivite/görsel) kullanır. ItineraryBuilder bu grafiği gün sayısından
+bağımsız, sabit sayıda sorguyla yükler ve değiştirilemez bir yapı döndürür.
+
+Oluşan yapı Tour.itinerary_version ile anahtarlanarak Django cache'inde
+tutulur; gün planını etkileyen kayıtlar değişince sürüm commit anında artar
+ve eski anahtar kendiliğinden geçersiz kalır.
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, replace
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Q
+
+from . import metrics
+from .metrics import QueryCounter
+from .batching import CommitBatch
+from .models import (
+    DayActivity, DayFlight, DayHotel, DayImage, DayTransfer, Tour, TourDay,
+    duration_label_for,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ItineraryDay:
+    tour_day_id: int
+    order: int
+    title: str
+    day: object
+    images: tuple = ()
+    flights: tuple = ()      # DayFlight (flight, airline, origin, destination yüklü)
+    transfers: tuple = ()    # DayTransfer (transfer, city, airport, hotel yüklü)
+    hotels: tuple = ()       # DayHotel (hotel, city yüklü)
+    activities: tuple = ()   # DayActivity (activity yüklü)
+
+
+@dataclass(frozen=True)
+class Itinerary:
+    tour: object
+    days: tuple
+    query_count: int = 0
+    cache_hit: bool = False
+
+    def __len__(self):
+        return len(self.days)
+
+    def __iter__(self):
+        return iter(self.days)
+
+    # --- varlık bayrakları ---
+    @property
+    def has_flights(self):
+        return any(d.flights for d in self.days)
+
+    @property
+    def has_transfers(self):
+        return any(d.transfers for d in self.days)
+
+    @property
+    def has_hotels(self):
+        return any(d.hotels for d in self.days)
+
+    @property
+    def has_activities(self):
+        return any(d.activities for d in self.days)
+
+    # --- özet ---
+    @property
+    def start_point(self):
+        return self.days[0].day.city.name if self.days else None
+
+    @property
+    def end_point(self):
+        return self.days[-1].day.city.name if self.days else None
+
+    @property
+    def duration_label(self):
+        if self.days:
+            return duration_label_for(len(self.days))
+        return self.tour.duration_label
+
+    def serialize_days(self, hide_flights=False, hide_transfers=False, hide_hotels=False):
+        """order_itinerary JSON çıktısındaki "days" listesi."""
+        days_data = []
+
+        for td in self.days:
+            day = td.day
+
+            activities = []
+            for da in td.activities:
+                activity = da.activity
+                activities.append({
+                    "title": activity.title,
+                    "location": activity.location_text,
+                    "points": activity.points or [],
+                    "duration_hours": str(activity.duration_hours) if activity.duration_hours else None,
+                })
+
+            hotels = []
+            for dh in td.hotels:
+                hotel = dh.hotel
+                hotels.append({
+                    "name": hotel.name,
+                    "city": hotel.city.name,
+                    "star": hotel.star,
+                    "type": hotel.hotel_type,
+                })
+
+            flights = []
+            for df in td.flights:
+                flight = df.flight
+                flights.append({
+                    "airline": flight.airline.name,
+                    "flight_number": flight.flight_number,
+                    "origin": flight.origin.iata,
+                    "destination": flight.destination.iata,
+                    "departure_time": str(flight.departure_time) if flight.departure_time else None,
+                    "arrival_time": str(flight.arrival_time) if flight.arrival_time else None,
+                })
+
+            transfers = []
+            for dt in td.transfers:
+                transfer = dt.transfer
+                transfers.append({
+                    "direction": transfer.get_direction_display(),
+                    "vehicle_type": transfer.vehicle_type,
+                    "airport": transfer.airport.iata,
+                    "hotel": transfer.hotel.name,
+                })
+
+            days_data.append({
+                "order": td.order,
+                "title": td.title,
+                "city": day.city.name,
+                "day_number": day.day_number,
+                "description": day.description,
+                "bullets": day.bullets or [],
+                "activities": activities,
+                "hotels": hotels if not hide_hotels else [],
+                "flights": flights if not hide_flights else [],
+                "transfers": transfers if not hide_transfers else [],
+            })
+
+        return days_data
+
+
+def _group_by_day(qs):
+    grouped = defaultdict(list)
+    for row in qs:
+        grouped[row.day_id].append(row)
+    return grouped
+
+
+class ItineraryBuilder:
+    """
+    Kullanım:
+        itinerary = ItineraryBuilder(tour).build()
+
+    Gün sayısından bağımsız olarak en fazla 6 sorgu çalışır.
+    """
+
+    def __init__(self, tour):
+        self.tour = tour
+
+    def build(self):
+        with QueryCounter() as counter:
+            tour_days = list(
+                TourDay.objects
+                .filter(tour=self.tour)
+                .select_related("day", "day__city", "day__city__country")
+                .order_by("order", "id")
+            )
+            day_ids = {td.day_id for td in tour_days}
+
+            if day_ids:
+                images = _group_by_day(
+                    DayImage.objects.filter(day_id__in=day_ids).order_by("order", "id")
+                )
+                flights = _group_by_day(
+                    DayFlight.objects.filter(day_id__in=day_ids).select_related(
+                        "flight", "flight__airline", "flight__origin", "flight__destination"
+                    ).order_by("order", "id")
+                )
+                transfers = _group_by_day(
+                    DayTransfer.objects.filter(day_id__in=day_ids).select_related(
+                        "transfer", "transfer__city", "transfer__airport",
+                        "transfer__hotel", "transfer__hotel__city",
+                    ).order_by("order", "id")
+                )
+                hotels = _group_by_day(
+                    DayHotel.objects.filter(day_id__in=day_ids).select_related(
+                        "hotel", "hotel__city"
+                    ).order_by("order", "id")
+                )
+                activities = _group_by_day(
+                    DayActivity.objects.filter(day_id__in=day_ids).select_related(
+                        "activity"
+                    ).order_by("order", "id")
+                )
+            else:
+                images = flights = transfers = hotels = activities = {}
+
+            days = tuple(
+                ItineraryDay(
+                    tour_day_id=td.pk,
+                    order=td.order,
+                    title=td.title,
+                    day=td.day,
+                    images=tuple(images.get(td.day_id, ())),
+                    flights=tuple(flights.get(td.day_id, ())),
+                    transfers=tuple(transfers.get(td.day_id, ())),
+                    hotels=tuple(hotels.get(td.day_id, ())),
+                    activities=tuple(activities.get(td.day_id, ())),
+                )
+                for td in tour_days
+            )
+
+        logger.debug(
+            "itinerary built tour=%s days=%s queries=%s",
+            self.tour.pk, len(days), counter.count,
+        )
+        return Itinerary(tour=self.tour, days=days, query_count=counter.count)
+
+
+# ------------- ÖNBELLEK -------------
+
+CACHE_PREFIX = "itinerary"
+STATS_PREFIX = f"{CACHE_PREFIX}:stats"
+
+
+def _cache():
+    return caches[getattr(settings, "ITINERARY_CACHE_ALIAS", "default")]
+
+
+def _cache_key(tour):
+    # created_at: silinip aynı pk ile yeniden oluşan tur eski kaydı görmesin
+    stamp = int(tour.created_at.timestamp() * 1_000_000) if tour.created_at else 0
+    return f"{CACHE_PREFIX}:{tour.pk}:{stamp}:v{tour.itinerary_version}"
+
+
+def cache_stats():
+    """Önbellek isabet/ıska sayaçları (backend paylaşımlıysa tüm worker'lar için)."""
+    return metrics.hit_stats(STATS_PREFIX)
+
+
+def reset_cache_stats():
+    metrics.reset_hit_stats(STATS_PREFIX)
+
+
+def get_itinerary(tour):
+    """
+    Önbellekteki gün planını döndürür; yoksa ItineraryBuilder ile kurup yazar.
+    İsabette sorgu çalışmaz (query_count=0, cache_hit=True).
+    """
+    cache = _cache()
+    key = _cache_key(tour)
+    cached = cache.get(key)
+    if cached is not None:
+        metrics.incr(f"{STATS_PREFIX}:hits")
+        return replace(cached, tour=tour, query_count=0, cache_hit=True)
+
+    metrics.incr(f"{STATS_PREFIX}:misses")
+    itinerary = ItineraryBuilder(tour).build()
+    # Tour her istekte view'dan gelir; önbelleğe sadece gün grafiği yazılır
+    cache.set(
+        key,
+        replace(itinerary, tour=None),
+        getattr(settings, "ITINERARY_CACHE_TIMEOUT", 60 * 60 * 24),
+    )
+    return itinerary
+
+
+def _stale_tour_ids(
+    tours, days, activities, hotels, flights, transfers, cities, countries, airlines, airports,
+):
+    cond = Q()
+    if days:
+        cond |= Q(day_id__in=days)
+    if activities:
+        cond |= Q(day__dayactivity__activity_id__in=activities)
+    if hotels:
+        cond |= Q(day__dayhotel__hotel_id__in=hotels)
+        cond |= Q(day__daytransfer__transfer__hotel_id__in=hotels)
+    if flights:
+        cond |= Q(day__dayflight__flight_id__in=flights)
+    if transfers:
+        cond |= Q(day__daytransfer__transfer_id__in=transfers)
+    # Önbellekteki gün grafiği şehir/ülke/havayolu/havalimanı adlarını da taşır
+    if cities:
+        cond |= Q(day__city_id__in=cities)
+        cond |= Q(day__dayhotel__hotel__city_id__in=cities)
+        cond |= Q(day__daytransfer__transfer__city_id__in=cities)
+        cond |= Q(day__daytransfer__transfer__hotel__city_id__in=cities)
+    if countries:
+        cond |= Q(day__city__country_id__in=countries)
+    if airlines:
+        cond |= Q(day__dayflight__flight__airline_id__in=airlines)
+    if airports:
+        cond |= Q(day__dayflight__flight__origin_id__in=airports)
+        cond |= Q(day__dayflight__flight__destination_id__in=airports)
+        cond |= Q(day__daytransfer__transfer__airport_id__in=airports)
+    if cond:
+        tours |= set(
+            TourDay.objects.filter(cond).values_list("tour_id", flat=True).distinct()
+        )
+    return tours
+
+
+def _bump_versions(**pending):
+    tour_ids = _stale_tour_ids(**pending)
+    if tour_ids:
+        Tour.objects.filter(pk__in=tour_ids).update(
+            itinerary_version=F("itinerary_version") + 1
+        )
+
+
+_batch = CommitBatch(
+    _bump_versions, "tours", "days", "activities", "hotels", "flights", "transfers",
+    "cities", "countries", "airlines", "airports",
+)
+flush = _batch.flush
+
+
+def mark_stale(kind, ids):
+    """
+    kind: tours / days / activities / hotels / flights / transfers /
+    cities / countries / airlines / airports
+    """
+    _batch.add(kind, ids)
+
+
+def itinerary_query_header(response, itinerary):
+    """Sorgu sayısını yanıt başlığına ekler; regresyonlar tarayıcıda görünür."""
+    response["X-Itinerary-Queries"] = str(itinerary.query_count)
+    response["X-Itinerary-Cache"] = "hit" if itinerary.cache_hit else "miss"
+    return response
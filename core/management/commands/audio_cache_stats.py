@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.audio_cache import cache_stats, reset_cache_stats
+
+
+def _mb(value):
+    return f"{value / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = "Birleştirilmiş ses önbelleğinin disk kullanımı ve isabet oranını gösterir."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="İsabet/ıska sayaçlarını sıfırla.")
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        usage = stats["indexed_bytes"] / stats["max_bytes"] if stats["max_bytes"] else 0
+
+        self.stdout.write(
+            f"kayıt: {stats['entries']}  indeks: {_mb(stats['indexed_bytes'])}  "
+            f"disk: {_mb(stats['disk_bytes'])}  bütçe: {_mb(stats['max_bytes'])} ({usage:.0%})"
+        )
+        self.stdout.write(f"7 gündür dinlenmeyen: {stats['idle_7d']}")
+        self.stdout.write(
+            f"isabet: {stats['hits']}  ıska: {stats['misses']}  oran: {stats['hit_ratio']:.1%}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Sayaçlar sıfırlandı."))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.track_history import prune, simplify_days
+
+
+class Command(BaseCommand):
+    help = "Saklama süresi dolan konum geçmişini siler, eski günleri sadeleştirir (Douglas–Peucker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--simplify-after", type=int, default=None, help="TRACK_SIMPLIFY_AFTER_DAYS yerine (gün).")
+        parser.add_argument("--epsilon", type=float, default=None, help="TRACK_SIMPLIFY_EPSILON_M yerine (metre).")
+        parser.add_argument("--retention", type=int, default=None, help="TRACK_RETENTION_DAYS yerine (gün).")
+        parser.add_argument("--limit", type=int, default=500, help="Tek çalıştırmada en fazla order-gün.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        # Önce budanır; silinecek günleri sadeleştirmeye gerek yok
+        deleted = prune(options["retention"])
+        groups, before, after = simplify_days(
+            older_than_days=options["simplify_after"],
+            epsilon_m=options["epsilon"],
+            limit=options["limit"],
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Sadeleştirilen order-gün: {groups} ({before} -> {after} nokta), "
+            f"silinen parça: {deleted} ({elapsed:.2f} sn)."
+        ))
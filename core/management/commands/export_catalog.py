@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.catalog_io import format_for, document_rows, dump_document, export_catalog
+
+
+class Command(BaseCommand):
+    help = "Tur kataloğunu doğal anahtarlı JSON/YAML belgesi olarak yazar."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Çıktı dosyası (varsayılan: stdout)")
+        parser.add_argument("--format", choices=("json", "yaml"), help="Varsayılan: dosya uzantısından")
+        parser.add_argument(
+            "--tour", action="append", dest="tours", metavar="SLUG",
+            help="Sadece bu tur(lar) ve bağlı kayıtları (tekrarlanabilir)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = options["path"]
+        fmt = format_for(path, options["format"])
+
+        document = export_catalog(options["tours"])
+        if path == "-":
+            dump_document(document, self.stdout, fmt)
+        else:
+            with open(path, "w", encoding="utf-8") as stream:
+                dump_document(document, stream, fmt)
+
+        elapsed = time.monotonic() - started
+        rows = document_rows(document)
+        # stdout belgeye ayrıldıysa özet stderr'e yazılır
+        out = self.stderr if path == "-" else self.stdout
+        out.write(self.style.SUCCESS(
+            f"{len(document['tours'])} tur, {rows} satır dışa aktarıldı "
+            f"({elapsed:.2f} sn, {rows / max(elapsed, 1e-6):.0f} satır/sn)."
+        ))
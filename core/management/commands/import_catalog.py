@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.catalog_io import (
+    CatalogImportError, CatalogImporter, format_for, document_rows, load_document,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Doğal anahtarlı JSON/YAML katalog belgesini toplu olarak içe aktarır; "
+        "fiyat ve sayılar en sonda bir kez hesaplanır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Katalog dosyası ('-' ise stdin)")
+        parser.add_argument("--format", choices=("json", "yaml"), help="Varsayılan: dosya uzantısından")
+        parser.add_argument("--dry-run", action="store_true", help="Her şeyi çalıştır, sonra geri al")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = format_for(path, options["format"])
+        try:
+            if path == "-":
+                document = load_document(sys.stdin, fmt)
+            else:
+                with open(path, encoding="utf-8") as stream:
+                    document = load_document(stream, fmt)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Katalog okunamadı: {exc}") from exc
+
+        started = time.monotonic()
+        try:
+            importer = CatalogImporter(document)
+            with transaction.atomic():
+                importer.run()
+                if options["dry_run"]:
+                    transaction.set_rollback(True)
+        except (CatalogImportError, KeyError) as exc:
+            raise CommandError(f"Katalog içe aktarılamadı: {exc}") from exc
+        elapsed = time.monotonic() - started
+
+        if options["verbosity"] > 1:
+            for name, count in sorted(importer.written.items()):
+                self.stdout.write(f"  {name}: {count}")
+
+        rows = document_rows(document)
+        days, tours = importer.recomputed
+        suffix = " (dry-run, geri alındı)" if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} satır işlendi, {sum(importer.written.values())} satır yazıldı; "
+            f"{days} gün ve {tours} tur yeniden hesaplandı "
+            f"({elapsed:.2f} sn, {rows / max(elapsed, 1e-6):.0f} satır/sn){suffix}."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.itinerary import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Itinerary önbelleğinin isabet/ıska sayaçlarını gösterir."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Sayaçları sıfırla.")
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(
+            f"isabet: {stats['hits']}  ıska: {stats['misses']}  "
+            f"oran: {stats['hit_ratio']:.1%}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Sayaçlar sıfırlandı."))
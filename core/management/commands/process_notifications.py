@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import TelegramDispatcher
+
+
+class Command(BaseCommand):
+    help = "NotificationOutbox'taki bekleyen Telegram bildirimlerini gönderir."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Bir tur işleyip çık.")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--interval", type=float, default=2.0, help="Boşta bekleme (sn).")
+        parser.add_argument(
+            "--digest-threshold", type=int, default=3,
+            help="Aynı sohbete bu kadar mesaj birikirse tek özet olarak gönder.",
+        )
+
+    def handle(self, *args, **options):
+        dispatcher = TelegramDispatcher(digest_threshold=options["digest_threshold"])
+
+        try:
+            while True:
+                started = time.monotonic()
+                stats = dispatcher.run_once(batch_size=options["batch_size"])
+
+                if stats["messages"]:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{stats['messages']} bildirim işlendi: {stats['sent']} gönderildi, "
+                        f"{stats['retried']} ertelendi, {stats['failed']} başarısız "
+                        f"({stats['requests']} istek, {stats['digests']} özet, {elapsed:.2f} sn)."
+                    ))
+
+                if options["once"]:
+                    break
+                if stats["messages"] < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Durduruldu.")
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.whatsapp import WhatsAppQueueProcessor
+
+
+class Command(BaseCommand):
+    help = "WhatsAppMessageQueue'daki bekleyen mesajları WAHA üzerinden gönderir."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Bir parti işleyip çık.")
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=4, help="Paralel gönderici sayısı.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Boşta bekleme (sn).")
+        parser.add_argument(
+            "--stale-after", type=int, default=300,
+            help="Bu kadar saniyedir PROCESSING kalan mesajlar yeniden kuyruğa alınır.",
+        )
+        parser.add_argument("--max-attempts", type=int, default=6)
+
+    def handle(self, *args, **options):
+        processor = WhatsAppQueueProcessor(
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+            stale_after=options["stale_after"],
+            max_attempts=options["max_attempts"],
+        )
+
+        total_sent = 0
+        started = time.monotonic()
+
+        try:
+            while True:
+                stats = processor.run_once()
+                total_sent += stats.sent
+
+                if stats.recovered:
+                    self.stdout.write(self.style.WARNING(
+                        f"{stats.recovered} takılı mesaj yeniden kuyruğa alındı."
+                    ))
+                if stats.claimed:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{stats.claimed} mesaj: {stats.sent} gönderildi, "
+                        f"{stats.retried} ertelendi, {stats.failed} başarısız "
+                        f"({stats.rate:.1f} mesaj/sn, kuyruk gecikmesi {stats.lag_seconds:.0f} sn)."
+                    ))
+
+                if options["once"]:
+                    break
+                if stats.claimed < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.monotonic() - started
+        rate = total_sent / elapsed if elapsed else 0.0
+        self.stdout.write(f"Toplam {total_sent} mesaj gönderildi ({rate:.1f} mesaj/sn).")
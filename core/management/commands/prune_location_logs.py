@@ -0,0 +1,42 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ActivityProgressLocationLog
+
+
+class Command(BaseCommand):
+    help = "ActivityProgressLocationLog saklama süresini uygular (created_at ile, parça parça siler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="LOCATION_LOG_RETENTION_DAYS yerine.")
+        parser.add_argument("--max-rows", type=int, default=ActivityProgressLocationLog.MAX_ROWS, help="Tutulacak en fazla satır (0: sınırsız).")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--pause", type=float, default=0.0, help="Parçalar arası bekleme (sn).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        model = ActivityProgressLocationLog
+        days = options["days"] if options["days"] is not None else settings.LOCATION_LOG_RETENTION_DAYS
+
+        estimate = model.estimated_count()
+        deleted = model.prune(
+            timezone.now() - timedelta(days=days),
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+        )
+
+        # Tahmin sınırın altındaysa tam sayım / offset taramasına gerek yok
+        max_rows = options["max_rows"]
+        if max_rows and estimate - deleted > max_rows:
+            cutoff = model.cap_cutoff(max_rows)
+            if cutoff:
+                deleted += model.prune(cutoff, batch_size=options["batch_size"], pause=options["pause"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Tahmini satır: {estimate}, silinen: {deleted} ({elapsed:.2f} sn)."
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.catalog import refresh_catalog
+
+
+class Command(BaseCommand):
+    help = "Tüm turlar için TourCatalogEntry özetlerini yeniden oluşturur."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        with transaction.atomic():
+            count = refresh_catalog()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} tur katalog kaydı güncellendi ({elapsed:.2f} sn)."
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.pricing import recompute_all_prices
+
+
+class Command(BaseCommand):
+    help = "Tüm Day ve Tour fiyatlarını sabit sayıda sorguyla yeniden hesaplar."
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        with CaptureQueriesContext(connection) as ctx, transaction.atomic():
+            days, tours = recompute_all_prices()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} gün ve {tours} tur fiyatı güncellendi "
+            f"({len(ctx.captured_queries)} sorgu, {elapsed:.2f} sn)."
+        ))
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.audio import enqueue_order_audio, recover_stale_jobs, render_job
+from core.models import AudioRenderJob, Order
+
+
+def _render(job_id):
+    try:
+        return render_job(job_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Bekleyen kişisel ses (intro + aktivite) render işlerini işler."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enqueue-paid", action="store_true",
+            help="Önce tüm ödenmiş order'lar için eksik işleri aç.",
+        )
+        parser.add_argument("--order", type=int, action="append", default=[], help="Sadece bu order(lar).")
+        parser.add_argument("--workers", type=int, default=None, help="Aynı anda çalışacak ffmpeg sayısı.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        workers = options["workers"] or getattr(settings, "AUDIO_RENDER_WORKERS", 2)
+
+        recovered = recover_stale_jobs()
+        if recovered:
+            self.stdout.write(self.style.WARNING(f"{recovered} takılı iş yeniden kuyruğa alındı."))
+
+        if options["enqueue_paid"] or options["order"]:
+            order_ids = options["order"] or list(
+                Order.objects.filter(is_paid=True).values_list("id", flat=True)
+            )
+            # --order: o order'ların tüm işleri yeniden render edilir
+            queued = enqueue_order_audio(
+                order_ids, only_new=not options["order"], force=bool(options["order"]),
+            )
+            self.stdout.write(f"{queued} iş kuyruğa alındı.")
+
+        jobs = AudioRenderJob.objects.filter(status=AudioRenderJob.Status.PENDING)
+        if options["order"]:
+            jobs = jobs.filter(order_id__in=options["order"])
+        job_ids = list(jobs.values_list("id", flat=True))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            processed = sum(1 for claimed in pool.map(_render, job_ids) if claimed)
+
+        failed = AudioRenderJob.objects.filter(
+            id__in=job_ids, status=AudioRenderJob.Status.FAILED,
+        ).count()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{processed} iş işlendi, {failed} başarısız ({workers} worker, {elapsed:.2f} sn)."
+        ))
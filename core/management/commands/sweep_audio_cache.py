@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.audio_cache import enforce_budget, sweep_orphans
+
+
+class Command(BaseCommand):
+    # Web servisi bunu AUDIO_CACHE_SWEEP_INTERVAL'da bir kendisi yapar (core.audio_cache.run_sweep);
+    # komut diskin bağlı olduğu serviste elle çalıştırmak içindir.
+    help = "Birleştirilmiş ses önbelleğinde yetim dosyaları siler ve disk bütçesini uygular."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-bytes", type=int, default=None, help="AUDIO_CACHE_MAX_BYTES yerine.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        result = sweep_orphans()
+        evicted, freed = enforce_budget(options["max_bytes"])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Süresi dolmuş: {result['expired']}, eskimiş hash: {result['superseded']}, "
+            f"dosyası yok: {result['missing']}, indekssiz: {result['untracked']}, "
+            f"indekse alınan: {result['adopted']}, geçici: {result['temp']}, "
+            f"LRU: {evicted} ({freed / (1024 * 1024):.1f} MB) ({elapsed:.2f} sn)."
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.miles import MilesLedger
+from core.models import ActivityProgress
+
+
+class Command(BaseCommand):
+    help = "Deftere işlenmemiş ActivityProgress millerini işler (ilk kurulum / tutarlılık kontrolü)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        # Tamamlanmış ama mili işlenmemiş ya da tamamlanmamış ama mili işlenmiş satırlar
+        completed = Q(status=ActivityProgress.Status.COMPLETED)
+        ids = list(
+            ActivityProgress.objects
+            .filter((completed & Q(miles_awarded=0)) | (~completed & Q(miles_awarded__gt=0)))
+            .values_list("id", flat=True)
+        )
+
+        synced = miles = 0
+        batch_size = options["batch_size"]
+        for start in range(0, len(ids), batch_size):
+            # Durum ve ödül sync içinde kilitli satırdan okunur
+            progresses = (
+                ActivityProgress.objects
+                .filter(pk__in=ids[start:start + batch_size])
+                .only("id", "order_id")
+            )
+            for progress in progresses:
+                delta = MilesLedger.sync(progress)
+                if delta:
+                    synced += 1
+                    miles += delta
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"İşlenen progress: {synced}, net mil: {miles} ({elapsed:.2f} sn)."
+        ))
@@ -0,0 +1,66 @@
+"""
+Django cache üzerinde basit sayaçlar (isabet/ıska vb.).
+
+Backend paylaşımlıysa (Redis vb.) sayaçlar tüm worker'lar için ortaktır;
+varsayılan LocMem'de process başınadır. QueryCounter istek ve blok bazında
+SQL sayısı/süresi ölçer (core.middleware.RequestMetricsMiddleware).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+
+def _cache():
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def incr(key, delta=1):
+    cache = _cache()
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Anahtar yoksa (ilk kullanım / backend temizlendi) başlat
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def hit_stats(prefix):
+    """{prefix}:hits / {prefix}:misses sayaçları ve isabet oranı."""
+    values = _cache().get_many([f"{prefix}:hits", f"{prefix}:misses"])
+    stats = {
+        "hits": values.get(f"{prefix}:hits", 0),
+        "misses": values.get(f"{prefix}:misses", 0),
+    }
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = (stats["hits"] / total) if total else 0.0
+    return stats
+
+
+def reset_hit_stats(prefix):
+    _cache().delete_many([f"{prefix}:hits", f"{prefix}:misses"])
+
+
+class QueryCounter:
+    """Blok içinde çalışan SQL sorgularını ve SQL süresini ölçer (DEBUG gerektirmez)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._wrapper.__exit__(*exc)
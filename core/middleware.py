@@ -1,5 +1,12 @@
+import json
+import logging
+import time
+
+from django.conf import settings
 from django.shortcuts import redirect
 
+from .metrics import QueryCounter
+
 
 class ForcePasswordChangeMiddleware:
 
@@ -32,3 +39,82 @@ class ForcePasswordChangeMiddleware:
                 return redirect("sign_in")
 
         return self.get_response(request)
+
+
+# ─────────────────────────────
+# İstek ölçümü (SQL sayısı / süresi, toplam süre)
+# ─────────────────────────────
+request_logger = logging.getLogger("core.requests")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """
+    View için istek başına SQL sorgu bütçesi (session/auth sorguları dahil).
+    Aşılırsa uyarı loglanır; QUERY_BUDGET_STRICT açıkken hata fırlatılır (testler
+    override_settings ile açar).
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class RequestMetricsMiddleware:
+    """
+    Her istek için SQL sorgu sayısı, SQL süresi, toplam süre ve view adını
+    Server-Timing başlığı ve core.requests logger'ına tek satır JSON olarak yazar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._query_budget = None
+        started = time.perf_counter()
+
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = counter.duration * 1000
+        match = request.resolver_match
+        view = match.view_name if match else None
+        budget = request._query_budget
+
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = (
+                f'db;dur={db_ms:.1f};desc="{counter.count} queries", '
+                f"app;dur={total_ms - db_ms:.1f}, "
+                f"total;dur={total_ms:.1f}"
+            )
+
+        record = {
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": counter.count,
+            "db_ms": round(db_ms, 1),
+            "total_ms": round(total_ms, 1),
+        }
+        over_budget = budget is not None and counter.count > budget
+        if budget is not None:
+            record["query_budget"] = budget
+
+        if over_budget:
+            request_logger.warning(json.dumps(record))
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(
+                    f"{view}: {counter.count} sorgu, bütçe {budget}"
+                )
+        else:
+            request_logger.info(json.dumps(record))
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = getattr(view_func, "query_budget", None)
@@ -0,0 +1,54 @@
+"""
+Traveler.index alanı ve (order, index) tekilliği.
+
+Depodaki migration serisi 0018'de kalıyor; ortamlar 0018 sonrasını kendi
+makemigrations çıktısıyla üretmiş olabilir. Öyle bir ortamda bu dosya ikinci
+bir 0019 yaprağı oluşturur: deploy'da ya ortamın son migration'ından sonraki
+numaraya taşınıp dependencies o migration'a çevrilir ya da
+`python manage.py makemigrations core --merge` çalıştırılır. İşlemler sadece
+Traveler'a dokunur, merge çakışma çıkarmaz.
+"""
+from django.db import migrations, models
+
+
+def number_travelers(apps, schema_editor):
+    # Mevcut yolcular order içinde id sırasıyla 1..n numaralanır
+    Traveler = apps.get_model("core", "Traveler")
+    order_id, index = None, 0
+    to_update = []
+    for traveler in Traveler.objects.order_by("order_id", "id").only("id", "order_id"):
+        if traveler.order_id != order_id:
+            order_id, index = traveler.order_id, 0
+        index += 1
+        traveler.index = index
+        to_update.append(traveler)
+    Traveler.objects.bulk_update(to_update, ["index"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_alter_tourday_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='traveler',
+            name='index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_travelers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='traveler',
+            name='index',
+            field=models.PositiveIntegerField(blank=True),
+        ),
+        migrations.AlterModelOptions(
+            name='traveler',
+            options={'ordering': ['index', 'id']},
+        ),
+        migrations.AddConstraint(
+            model_name='traveler',
+            constraint=models.UniqueConstraint(fields=('order', 'index'), name='uniq_traveler_order_index'),
+        ),
+    ]
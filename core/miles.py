@@ -0,0 +1,91 @@
+"""
+Mil defteri (MilesLedgerEntry).
+
+ActivityProgress durumu her kaydedildiğinde (post_save) MilesLedger.sync
+satırın olması gereken mil değerini (tamamlandıysa aktivitenin
+miles_reward'ı, değilse 0) deftere işlenmiş değerle (miles_awarded)
+karşılaştırır; fark varsa tek kayıt ekler ve Order.earned_miles ile
+UserProfile.miles'ı F() ile günceller. Hepsi progress kaydıyla aynı
+transaction'dadır; okuma tarafı sadece önbellek alanını okur.
+
+Order'ın kullanıcıya bağı yok; profil, sign_in'deki gibi order e-postasıyla
+eşleşen kullanıcıdan bulunur. Geri alma, kazanımın yazıldığı profile yapılır.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import ActivityProgress, MilesLedgerEntry, Order, UserProfile
+
+
+def _profile_for_email(email):
+    if not email:
+        return None
+    user = get_user_model().objects.filter(email__iexact=email).first()
+    if user is None:
+        return None
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    return profile
+
+
+def _add(model, pk, field, delta):
+    # Elle düşülmüş bakiyede geri alma negatife inmesin
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+class MilesLedger:
+    @staticmethod
+    def target_for(status, miles_reward):
+        if status != ActivityProgress.Status.COMPLETED:
+            return 0
+        return miles_reward or 0
+
+    @classmethod
+    def sync(cls, progress):
+        """Progress'in mil karşılığını deftere işler. Dönüş: eklenen fark."""
+        with transaction.atomic():
+            # Hedef kilitli satırın durumundan hesaplanır; elde eski bir
+            # progress örneği olsa da eşzamanlı iki kayıt farkı iki kez yazmaz
+            status, awarded, reward = (
+                ActivityProgress.objects
+                .select_for_update(of=("self",))
+                .values_list("status", "miles_awarded", "day_activity__activity__miles_reward")
+                .get(pk=progress.pk)
+            )
+            target = cls.target_for(status, reward)
+            delta = target - awarded
+            if not delta:
+                progress.miles_awarded = awarded
+                return 0
+
+            if delta > 0:
+                email = Order.objects.values_list("email", flat=True).get(pk=progress.order_id)
+                profile = _profile_for_email(email)
+                profile_id = profile.pk if profile else None
+            else:
+                profile_id = (
+                    MilesLedgerEntry.objects
+                    .filter(activity_progress=progress, kind=MilesLedgerEntry.Kind.EARN)
+                    .order_by("-id")
+                    .values_list("profile_id", flat=True)
+                    .first()
+                )
+
+            MilesLedgerEntry.objects.create(
+                order_id=progress.order_id,
+                profile_id=profile_id,
+                activity_progress=progress,
+                kind=MilesLedgerEntry.Kind.EARN if delta > 0 else MilesLedgerEntry.Kind.REVERSE,
+                amount=delta,
+            )
+            ActivityProgress.objects.filter(pk=progress.pk).update(miles_awarded=target)
+            _add(Order, progress.order_id, "earned_miles", delta)
+            if profile_id:
+                _add(UserProfile, profile_id, "miles", delta)
+
+        progress.miles_awarded = target
+        # Çağıranın elindeki order sonradan save() edilirse eski toplamı yazmasın
+        if ActivityProgress.order.is_cached(progress):
+            progress.order.earned_miles = max(progress.order.earned_miles + delta, 0)
+        return delta
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
+import time
 import uuid
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models
 from django.db.models import Sum, Max
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import slugify
@@ -47,7 +48,7 @@ class LiveLocation(models.Model):
     accuracy = models.FloatField(null=True, blank=True)
     user_agent = models.TextField(blank=True, null=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -143,6 +144,13 @@ class Flight(models.Model):
 # Tour
 # =========================
 
+def duration_label_for(d):
+    if not d or d <= 0:
+        return ""
+    nights = max(d - 1, 0)
+    return f"{d} Gün / {nights} Gece"
+
+
 class Tour(models.Model):
     title = models.CharField(max_length=180)
     slug = models.SlugField(max_length=220, unique=True, blank=True)
@@ -175,6 +183,8 @@ class Tour(models.Model):
     flights_count = models.PositiveIntegerField(default=0)
     hotels_count = models.PositiveIntegerField(default=0)
     activities_count = models.PositiveIntegerField(default=0)
+    # Gün planı değiştikçe artar; itinerary önbellek anahtarının parçası
+    itinerary_version = models.PositiveIntegerField(default=0, editable=False)
 
     commission = models.DecimalField(
         max_digits=4, decimal_places=2, default=Decimal("1.00"),
@@ -183,6 +193,13 @@ class Tour(models.Model):
     )
     price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     price_currency = models.CharField(max_length=3, choices=Currency.choices, default=Currency.USD)
+    # Fiyat bileşenleri (komisyonsuz, her gün bir kez); price ile birlikte
+    # core.pricing / recompute_price yazar, quote() sorgusuz hesaplar
+    flights_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    transfers_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    hotels_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    activities_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    PRICE_COMPONENT_FIELDS = ("flights_amount", "transfers_amount", "hotels_amount", "activities_amount")
     compare_at_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     compare_at_currency = models.CharField(max_length=3, choices=Currency.choices, default=Currency.USD)
 
@@ -256,11 +273,7 @@ class Tour(models.Model):
 
     @property
     def duration_label(self):
-        d = self.total_days
-        if d <= 0:
-            return ""
-        nights = max(d - 1, 0)
-        return f"{d} Gün / {nights} Gece"
+        return duration_label_for(self.total_days)
 
     def days_total_amount(self) -> Decimal:
         # ❗️ in_tours yerine TourDay üzerinden bağlan
@@ -269,9 +282,42 @@ class Tour(models.Model):
 
     def recompute_price(self, save=True):
         base = self.days_total_amount()
-        self.price = (base * (self.commission or Decimal("1.00"))).quantize(Decimal("0.01"))
+        self.price = (base * (self.commission or Decimal("1.00"))).quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP
+        )
+        self.flights_amount = self.flights_total()
+        self.transfers_amount = self.transfers_total()
+        self.hotels_amount = self.hotels_total()
+        self.activities_amount = self.activities_total()
         if save:
-            self.save(update_fields=["price"])
+            self.save(update_fields=["price", *self.PRICE_COMPONENT_FIELDS])
+
+    def quote(self, pax, same_room=True, hide_flights=False, hide_transfers=False, hide_hotels=False):
+        """
+        Order.compute_total'ın fiyatı: saklanan bileşenlerden sorgusuz hesaplanır.
+        Uçuş ve aktivite kişi başı, transfer araç başı, otel oda başıdır
+        (2 kişi ayrı odada 2 oda).
+        """
+        try:
+            commission = Decimal(str(self.commission)) if self.commission is not None else Decimal("1")
+        except Exception:
+            commission = Decimal("1")
+
+        pax_dec = Decimal(pax)
+        if hide_hotels:
+            rooms = Decimal("0")
+        elif pax == 2 and not same_room:
+            rooms = Decimal("2")
+        else:
+            rooms = Decimal("1")
+
+        net_total = (
+            (Decimal("0") if hide_flights else self.flights_amount) * pax_dec
+            + self.activities_amount * pax_dec
+            + self.hotels_amount * rooms
+            + (Decimal("0") if hide_transfers else self.transfers_amount)
+        )
+        return (net_total * commission).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
     # --- alt toplam hesaplayıcılar ---
     def flights_total(self) -> Decimal:
@@ -298,6 +344,14 @@ class Tour(models.Model):
         )
         return total or Decimal("0.00")
 
+    def activities_total(self) -> Decimal:
+        total = (
+            Activity.objects.filter(dayactivity__day__in=self.days.all())
+            .aggregate(t=Sum("price"))
+            .get("t")
+        )
+        return total or Decimal("0.00")
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -342,6 +396,34 @@ class TourPhoto(models.Model):
             raise ValidationError("Bir tur için en fazla 10 fotoğraf yüklenebilir.")
 
 
+class TourCatalogEntry(models.Model):
+    """
+    tour_grid için önceden hesaplanmış tur özeti.
+    core.catalog tarafından TourDay/DayActivity/Activity vb. değiştikçe güncellenir.
+    """
+    tour = models.OneToOneField(
+        Tour,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="catalog_entry",
+    )
+    total_days = models.PositiveIntegerField(default=0, db_index=True)
+    total_miles = models.PositiveIntegerField(default=0)
+    start_city = models.CharField(max_length=120, blank=True)
+    end_city = models.CharField(max_length=120, blank=True)
+    cover_image = models.ImageField(upload_to="tours/photos/", blank=True)
+    cover_alt_text = models.CharField(max_length=160, blank=True, default="")
+    hotels_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.tour_id} - {self.total_days} gün"
+
+    @property
+    def duration_label(self):
+        return duration_label_for(self.total_days)
+
+
 class TourType(models.Model):
     name = models.CharField(max_length=80, unique=True)
 
@@ -552,18 +634,17 @@ class Order(models.Model):
     help_text="Bu order için aktivite seslerinin başına eklenecek kişisel ses"
     )
 
-    @property
-    def earned_miles(self):
-        total = 0
-
-        progresses = self.activity_progresses.filter(
-            status=ActivityProgress.Status.COMPLETED
-        ).select_related("day_activity__activity")
+    # MilesLedger'ın tuttuğu toplam (core.miles); elle değiştirilmez
+    earned_miles = models.PositiveIntegerField(default=0, editable=False)
 
-        for p in progresses:
-            total += p.day_activity.activity.miles_reward or 0
-
-        return total
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # post_save receiver'ları is_paid False -> True geçişini ve kod değişimini ayırt etsin
+        loaded = dict(zip(field_names, values))
+        instance._loaded_is_paid = loaded.get("is_paid")
+        instance._loaded_tracking_code = loaded.get("tracking_code")
+        return instance
 
     def mark_paid(self):
         was_paid = self.is_paid
@@ -585,50 +666,13 @@ class Order(models.Model):
             enqueue_paid_order_message(self)
 
     def compute_total(self):
-        t = self.tour
-
-        try:
-            commission = Decimal(str(t.commission)) if t.commission is not None else Decimal("1")
-        except Exception:
-            commission = Decimal("1")
-
-        flights = Decimal(t.flights_total() or 0) if not self.hide_flights else Decimal("0")
-        transfers = Decimal(t.transfers_total() or 0) if not self.hide_transfers else Decimal("0")
-        hotels = Decimal(t.hotels_total() or 0) if not self.hide_hotels else Decimal("0")
-
-        activities = Decimal("0")
-
-        if hasattr(t, "days"):
-            for d in t.days.all():
-                for da in d.dayactivity_set.all():
-                    price = getattr(da.activity, "price", None)
-                    if price:
-                        activities += Decimal(price)
-
-        pax_dec = Decimal(self.pax)
-
-        m_flights = pax_dec
-        m_activities = pax_dec
-        m_transfers = Decimal("1")
-
-        if self.hide_hotels:
-            m_hotels = Decimal("0")
-        else:
-            if self.pax == 2:
-                m_hotels = Decimal("1") if self.same_room else Decimal("2")
-            else:
-                m_hotels = Decimal("1")
-
-        net_total = (
-            flights * m_flights +
-            activities * m_activities +
-            hotels * m_hotels +
-            transfers * m_transfers
+        self.total_price = self.tour.quote(
+            self.pax,
+            same_room=self.same_room,
+            hide_flights=self.hide_flights,
+            hide_transfers=self.hide_transfers,
+            hide_hotels=self.hide_hotels,
         )
-
-        grand = net_total * commission
-        self.total_price = grand.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
         return self.total_price
 
     def __str__(self):
@@ -729,6 +773,9 @@ class Activity(models.Model):
         return self.title
 class Traveler(models.Model):
     order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="travelers")
+    # Formdaki yolcu sırası (1..pax); tekrar gönderimde aynı satır güncellenir.
+    # Boş bırakılırsa (admin, script) save() order'daki son sıranın ardına koyar.
+    index = models.PositiveIntegerField(blank=True)
     title = models.CharField(max_length=10, blank=True)
     first_name = models.CharField(max_length=80)
     last_name = models.CharField(max_length=80)
@@ -738,7 +785,16 @@ class Traveler(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["id"]
+        ordering = ["index", "id"]
+        constraints = [
+            models.UniqueConstraint(fields=["order", "index"], name="uniq_traveler_order_index"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.index is None:
+            last = Traveler.objects.filter(order_id=self.order_id).aggregate(m=Max("index"))["m"]
+            self.index = (last or 0) + 1
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.order_id})"
@@ -810,7 +866,10 @@ class ActivityProgress(models.Model):
     )
 
     note = models.CharField(max_length=255, blank=True)
+    # Telegram bildirimi teslim edildi (core.notifications worker'ı yazar)
     telegram_sent = models.BooleanField(default=False)
+    # Bu satır için deftere işlenmiş net mil (core.miles)
+    miles_awarded = models.PositiveIntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -823,6 +882,79 @@ class ActivityProgress(models.Model):
         return f"{self.order.tracking_code} - {self.day_activity.activity.title} - {self.status}"
 
 
+class MilesLedgerEntry(models.Model):
+    """
+    Mil defteri: yalnızca eklenir. Aktivite tamamlanınca kazanım (+), durum
+    geri alınınca ters kayıt (-) yazılır. Order.earned_miles ve
+    UserProfile.miles bu kayıtların toplamını aynı transaction içinde tutar.
+    """
+    class Kind(models.TextChoices):
+        EARN = "earn", "Kazanım"
+        REVERSE = "reverse", "Geri Alma"
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="miles_entries"
+    )
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="miles_entries"
+    )
+    activity_progress = models.ForeignKey(
+        ActivityProgress,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="miles_entries"
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    amount = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["activity_progress", "-id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} {self.amount:+d} mil"
+
+
+class LocationTrackChunk(models.Model):
+    """
+    Konum geçmişi parçası: bir order'ın bir yerel gündeki ardışık noktaları.
+    points: [[epoch saniye, lat, lon, accuracy], ...]. Yazma, budama ve
+    sadeleştirme core.track_history'dedir.
+    """
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="track_chunks"
+    )
+    day = models.DateField(db_index=True)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    point_count = models.PositiveIntegerField(default=0)
+    points = BaseJSONField(default=list)
+    # Douglas–Peucker ile tek parçaya indirildiyse
+    simplified = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["started_at", "id"]
+        indexes = [
+            models.Index(fields=["order", "day", "started_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.day} ({self.point_count} nokta)"
+
+
 class ActivityProgressLocationLog(models.Model):
     class Action(models.TextChoices):
         PENDING = "pending", "Bekliyor"
@@ -864,6 +996,7 @@ class ActivityProgressLocationLog(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    # prune_location_logs süre sınırından sonra bu sayının üstünü de siler
     MAX_ROWS = 100000
 
     class Meta:
@@ -877,22 +1010,53 @@ class ActivityProgressLocationLog(models.Model):
         return f"{self.tracking_code} - {self.action} - {self.latitude},{self.longitude}"
 
     @classmethod
-    def prune_if_needed(cls):
-        total = cls.objects.count()
-
-        if total <= cls.MAX_ROWS:
-            return
+    def estimated_count(cls):
+        """
+        Satır sayısı tahmini. Postgres'te pg_class.reltuples (ANALYZE ile
+        güncellenir, tablo taranmaz); tahmin yoksa ya da başka DB'de count().
+        """
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [cls._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0]
+        return cls.objects.count()
 
-        excess = total - cls.MAX_ROWS
+    @classmethod
+    def prune(cls, before, batch_size=5000, pause=0):
+        """
+        created_at < before olan satırları created_at indeksiyle en fazla
+        batch_size'lık parçalar halinde siler. Dönüş: silinen satır.
+        """
+        deleted = 0
+        while True:
+            ids = list(
+                cls.objects
+                .filter(created_at__lt=before)
+                .order_by("created_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += cls.objects.filter(id__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                return deleted
+            if pause:
+                time.sleep(pause)
 
-        old_ids = list(
+    @classmethod
+    def cap_cutoff(cls, max_rows):
+        """En yeni max_rows satırı bırakan created_at sınırı (bundan eskiler silinir)."""
+        rows = list(
             cls.objects
-            .order_by("id")
-            .values_list("id", flat=True)[:excess]
+            .order_by("-created_at")
+            .values_list("created_at", flat=True)[max_rows - 1:max_rows]
         )
-
-        if old_ids:
-            cls.objects.filter(id__in=old_ids).delete()
+        return rows[0] if rows else None
 
 class WhatsAppMessageTemplate(models.Model):
     key = models.CharField(max_length=100, unique=True)
@@ -962,12 +1126,17 @@ class WhatsAppMessageQueue(models.Model):
     sent_at = models.DateTimeField(null=True, blank=True)
     failed_at = models.DateTimeField(null=True, blank=True)
 
+    # process_whatsapp_queue yeniden deneme durumu
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
     dedupe_key = models.CharField(max_length=160, unique=True, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
 
     def save(self, *args, **kwargs):
         digits = str(self.phone or "")
@@ -982,6 +1151,52 @@ class WhatsAppMessageQueue(models.Model):
     def __str__(self):
         return f"{self.phone} - {self.status}"
 
+
+class NotificationOutbox(models.Model):
+    """
+    Operasyon bildirimleri (Telegram) için kalıcı giden kutusu.
+    View'lar sadece kayıt ekler; gönderimi process_notifications worker'ı yapar.
+    """
+    class Channel(models.TextChoices):
+        TELEGRAM = "telegram", "Telegram"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    channel = models.CharField(max_length=20, choices=Channel.choices, default=Channel.TELEGRAM)
+    chat_id = models.CharField(max_length=80)
+    message = models.TextField()
+    # Aktivite bildirimi: gönderilince worker ActivityProgress.telegram_sent'i işaretler
+    activity_progress = models.ForeignKey(
+        "ActivityProgress",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="notifications",
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.channel}:{self.chat_id} - {self.status}"
+
 class CustomizedTravelSettings(models.Model):
     stripe_payment_link = models.URLField()
     is_active = models.BooleanField(default=True)
@@ -1076,7 +1291,123 @@ class OrderIntroAudio(models.Model):
     def __str__(self):
         return f"Order #{self.order_id} - {self.title or self.id}"
 
+
+class IntroAudioSettings(models.Model):
+    """Intro seçim politikası; admin panelinden yönetilir (aktif ilk kayıt geçerli)."""
+    class RotationPolicy(models.TextChoices):
+        PER_ORDER = "per_order", "Order boyunca aynı intro"
+        ROTATE = "rotate", "Aktiviteler arasında sırayla"
+        RANDOM = "random", "Rastgele (seçim sabitlenir)"
+
+    rotation_policy = models.CharField(
+        max_length=20,
+        choices=RotationPolicy.choices,
+        default=RotationPolicy.ROTATE,
+    )
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Intro audio settings"
+        verbose_name_plural = "Intro audio settings"
+
+    def __str__(self):
+        return f"Intro rotation: {self.get_rotation_policy_display()}"
+
+
+class OrderIntroAssignment(models.Model):
+    """
+    Order x DayActivity için seçilen intro. Seçim bir kez yapılır ve
+    birleştirilmiş ses önbelleğinin anahtarı sabit kalsın diye saklanır.
+    """
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="intro_assignments")
+    day_activity = models.ForeignKey("DayActivity", on_delete=models.CASCADE, related_name="intro_assignments")
+    intro = models.ForeignKey(IntroAudioLibrary, on_delete=models.SET_NULL, null=True, blank=True)
+    # Seçim anındaki normalize isim; traveler adı değişirse yeniden seçilir
+    name = models.CharField(max_length=80)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "day_activity"],
+                name="uniq_order_intro_assignment",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} / {self.day_activity_id} -> {self.intro_id}"
+
+
+class AudioRenderJob(models.Model):
+    """
+    Order x DayActivity x ses tipi için intro + aktivite sesi birleştirme işi.
+    core.audio render havuzu tarafından işlenir.
+    """
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="audio_render_jobs")
+    day_activity = models.ForeignKey("DayActivity", on_delete=models.CASCADE, related_name="audio_render_jobs")
+    audio_type = models.CharField(max_length=20)
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    cache_hash = models.CharField(max_length=24, blank=True)
+    output_name = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    requested_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["requested_at", "id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "day_activity", "audio_type"],
+                name="uniq_audio_render_job",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} / {self.day_activity_id} {self.audio_type} - {self.status}"
+
+
+class AudioCacheEntry(models.Model):
+    """
+    MEDIA_ROOT/orders/combined_audio altındaki bir birleştirilmiş ses dosyası.
+    Boyut bütçesi (LRU) ve yetim temizliği core.audio_cache tarafından yapılır.
+    """
+    file_name = models.CharField(max_length=255, unique=True)
+    order = models.ForeignKey("Order", on_delete=models.CASCADE, related_name="audio_cache_entries")
+    day_activity = models.ForeignKey(
+        "DayActivity", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+    )
+    audio_type = models.CharField(max_length=20)
+    cache_hash = models.CharField(max_length=24)
+    size_bytes = models.BigIntegerField(default=0)
+
+    hits = models.PositiveIntegerField(default=0)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["last_accessed_at"]
+
+    def __str__(self):
+        return self.file_name
+
 # --- Day içindeki through kayıtları değişince Day fiyatını yeniden hesapla
+# Hesaplama commit anında core.pricing tarafından toplu yapılır.
 @receiver(post_save, sender=DayFlight)
 @receiver(post_delete, sender=DayFlight)
 @receiver(post_save, sender=DayTransfer)
@@ -1086,36 +1417,14 @@ class OrderIntroAudio(models.Model):
 @receiver(post_save, sender=DayActivity)
 @receiver(post_delete, sender=DayActivity)
 def _recalc_day_total_on_components_change(sender, instance, **kwargs):
-    day = instance.day
-    day.recompute_price()
-    # ❗️Bu günü içeren tüm tur id'leri
-    tour_ids = (
-        TourDay.objects.filter(day=day)
-        .values_list("tour_id", flat=True)
-        .distinct()
-    )
-    for tid in tour_ids:
-        try:
-            Tour.objects.get(pk=tid).recompute_price()
-        except Tour.DoesNotExist:
-            pass
+    from .pricing import mark_days_dirty
+    mark_days_dirty([instance.day_id])
 
 
 # --- Bileşenlerin fiyatı değişirse onları kullanan Day’leri güncelle
 def _recompute_days_for_qs(qs):
-    day_ids = qs.values_list("day_id", flat=True).distinct()
-    for day in Day.objects.filter(pk__in=day_ids):
-        day.recompute_price()
-        tour_ids = (
-            TourDay.objects.filter(day=day)
-            .values_list("tour_id", flat=True)
-            .distinct()
-        )
-        for tid in tour_ids:
-            try:
-                Tour.objects.get(pk=tid).recompute_price()
-            except Tour.DoesNotExist:
-                pass
+    from .pricing import mark_days_dirty
+    mark_days_dirty(qs.values_list("day_id", flat=True).distinct())
 
 
 @receiver(post_save, sender=Flight)
@@ -1142,6 +1451,144 @@ def _recalc_when_activity_price_changes(sender, instance, **kwargs):
     _recompute_days_for_qs(qs)
 
 
+# --- Katalog özeti (TourCatalogEntry) — commit anında core.catalog yazar
+@receiver([post_save, post_delete], sender=TourDay)
+@receiver([post_save, post_delete], sender=TourPhoto)
+def _catalog_tour_changed(sender, instance, **kwargs):
+    if sender is TourDay:
+        from .tourdays import tourday_signals_suspended
+        if tourday_signals_suspended():
+            return
+    from .catalog import mark_tours_dirty
+    mark_tours_dirty([instance.tour_id])
+
+
+@receiver(post_save, sender=Tour)
+def _catalog_tour_created(sender, instance, created, **kwargs):
+    if created:
+        from .catalog import mark_tours_dirty
+        mark_tours_dirty([instance.pk])
+
+
+@receiver(m2m_changed, sender=Tour.places_covered.through)
+def _catalog_places_changed(sender, instance, action, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    from .catalog import mark_tours_dirty
+    if isinstance(instance, Tour):
+        mark_tours_dirty([instance.pk])
+    else:
+        mark_tours_dirty(instance.tours.values_list("id", flat=True))
+
+
+@receiver([post_save, post_delete], sender=DayActivity)
+@receiver([post_save, post_delete], sender=DayHotel)
+def _catalog_day_item_changed(sender, instance, **kwargs):
+    from .catalog import mark_days_dirty
+    mark_days_dirty([instance.day_id])
+
+
+@receiver(post_save, sender=Day)
+def _catalog_day_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Sadece fiyat güncellemesi katalog özetini etkilemez
+    if update_fields == frozenset({"price"}):
+        return
+    from .catalog import mark_cities_dirty, mark_days_dirty
+    if not created:
+        mark_days_dirty([instance.pk])
+    # places_covered'a düşen turların gün sayısı şehrin gün sayısıyla değişir
+    mark_cities_dirty([instance.city_id])
+
+
+@receiver(post_delete, sender=Day)
+def _catalog_day_deleted(sender, instance, **kwargs):
+    from .catalog import mark_cities_dirty
+    mark_cities_dirty([instance.city_id])
+
+
+@receiver(post_save, sender=Activity)
+def _catalog_activity_changed(sender, instance, **kwargs):
+    from .catalog import mark_days_dirty
+    mark_days_dirty(
+        DayActivity.objects.filter(activity=instance).values_list("day_id", flat=True)
+    )
+
+
+# --- Itinerary önbelleği — commit anında core.itinerary sürümü artırır
+@receiver([post_save, post_delete], sender=TourDay)
+def _itinerary_tour_day_changed(sender, instance, **kwargs):
+    from .tourdays import tourday_signals_suspended
+    if tourday_signals_suspended():
+        return
+    from .itinerary import mark_stale
+    mark_stale("tours", [instance.tour_id])
+
+
+@receiver([post_save, post_delete], sender=DayFlight)
+@receiver([post_save, post_delete], sender=DayTransfer)
+@receiver([post_save, post_delete], sender=DayHotel)
+@receiver([post_save, post_delete], sender=DayActivity)
+@receiver([post_save, post_delete], sender=DayImage)
+def _itinerary_day_item_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("days", [instance.day_id])
+
+
+@receiver(post_save, sender=Day)
+def _itinerary_day_changed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields != frozenset({"price"}):
+        from .itinerary import mark_stale
+        mark_stale("days", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Activity)
+def _itinerary_activity_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("activities", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Hotel)
+def _itinerary_hotel_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("hotels", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def _itinerary_flight_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("flights", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=AirportTransfer)
+def _itinerary_transfer_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("transfers", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=City)
+def _itinerary_city_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("cities", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Country)
+def _itinerary_country_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("countries", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Airline)
+def _itinerary_airline_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("airlines", [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Airport)
+def _itinerary_airport_changed(sender, instance, **kwargs):
+    from .itinerary import mark_stale
+    mark_stale("airports", [instance.pk])
+
+
 # ------------- SIGNAL YARDIMCILARI -------------
 
 def _recompute_for_day(day_id: int):
@@ -1163,7 +1610,13 @@ def _recompute_for_day(day_id: int):
 
 @receiver([post_save, post_delete], sender=TourDay)
 def _tourday_changed(sender, instance, **kwargs):
+    # Toplu sıralamada tour_days_changed tur başına bir kez çağrılır
+    from .tourdays import tourday_signals_suspended
+    if tourday_signals_suspended():
+        return
+    from .pricing import mark_tours_dirty
     instance.tour.recompute_item_counts(save=True)
+    mark_tours_dirty([instance.tour_id])
 
 
 @receiver([post_save, post_delete], sender=DayFlight)
@@ -1183,10 +1636,54 @@ def _dayactivity_changed(sender, instance, **kwargs):
     if instance.day_id:
         _recompute_for_day(instance.day_id)
 
-@receiver(post_save, sender=Activity)
-def _recalc_when_activity_price_changes(sender, instance, **kwargs):
-    qs = DayActivity.objects.filter(activity=instance)
-    _recompute_days_for_qs(qs)
+# --- Kişisel ses render kuyruğu — commit anında core.audio iş açar
+@receiver(post_save, sender=Order)
+def _audio_order_paid(sender, instance, created, update_fields=None, **kwargs):
+    # Sadece ödenmemiş -> ödenmiş geçişi; ödenmiş order'ın diğer kayıtları iş açmaz
+    was_paid = getattr(instance, "_loaded_is_paid", None)
+    instance._loaded_is_paid = instance.is_paid
+    if not instance.is_paid or (update_fields is not None and "is_paid" not in update_fields):
+        return
+    if created or not was_paid:
+        from .audio import mark_orders_paid
+        mark_orders_paid([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Traveler)
+def _audio_travelers_changed(sender, instance, **kwargs):
+    from .audio import mark_orders_changed
+    mark_orders_changed([instance.order_id])
+
+
+# --- Tracker API'lerinin cache'lediği tracking oturumu
+@receiver([post_save, post_delete], sender=Order)
+def _tracking_session_changed(sender, instance, **kwargs):
+    from .tracking import forget_session
+    # Kod değiştiyse eski kodun oturumu da düşer
+    old_code = getattr(instance, "_loaded_tracking_code", None)
+    instance._loaded_tracking_code = instance.tracking_code
+    if old_code and old_code != instance.tracking_code:
+        forget_session(old_code)
+    forget_session(instance.tracking_code)
+
+
+# --- Aktivite durumu değişince SSE abonelerine (core.events)
+@receiver(post_save, sender=ActivityProgress)
+def _progress_event(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and "status" not in update_fields):
+        return
+    from .events import publish_progress
+    publish_progress(instance)
+
+
+# --- Aktivite tamamlanınca / geri alınınca mil defteri (core.miles)
+@receiver(post_save, sender=ActivityProgress)
+def _progress_miles(sender, instance, update_fields=None, **kwargs):
+    if update_fields and "status" not in update_fields:
+        return
+    from .miles import MilesLedger
+    MilesLedger.sync(instance)
+
 
 @receiver(post_save, sender=Order)
 def _order_paid_whatsapp_queue(sender, instance, created, **kwargs):
@@ -0,0 +1,282 @@
+"""
+Telegram bildirim giden kutusu (NotificationOutbox).
+
+View'lar enqueue_telegram ile sadece satır ekler; istek süresi Telegram'ın
+yanıt süresine bağlı kalmaz. process_notifications worker'ı bekleyen satırları
+havuzlu bir HTTP oturumuyla gönderir:
+
+- aynı sohbete biriken mesajlar (digest_threshold ve üstü) tek özet mesajda
+  birleştirilir,
+- sohbet başına ve genel hız sınırına uyulur, 429'da retry_after beklenir,
+- geçici hatalarda üstel geri çekilmeyle yeniden denenir,
+- aktivite bildirimleri teslim edilince ActivityProgress.telegram_sent
+  işaretlenir (kuyruğa alınınca değil).
+
+Worker tek kopya çalışacak şekilde tasarlanmıştır (satır kilitleme yok).
+"""
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import ActivityProgress, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+
+# Telegram: sohbet başına ~1 mesaj/sn, bot başına ~30 mesaj/sn
+PER_CHAT_INTERVAL = 1.0
+GLOBAL_INTERVAL = 1.0 / 30
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 15 * 60
+MAX_ATTEMPTS = 8
+
+
+def telegram_recipients():
+    """Ayarlardaki (token, chat_id) çiftleri -> {chat_id: token}"""
+    pairs = [
+        (
+            getattr(settings, "TELEGRAM_BOT_TOKEN", "") or "",
+            getattr(settings, "TELEGRAM_CHAT_ID", "") or "",
+        ),
+        (
+            getattr(settings, "TELEGRAM_BOT_TOKEN_2", "") or "",
+            getattr(settings, "TELEGRAM_CHAT_ID_2", "") or "",
+        ),
+    ]
+    return {str(chat_id): token for token, chat_id in pairs if token and chat_id}
+
+
+def enqueue_telegram(message: str, activity_progress=None) -> bool:
+    """Her alıcı için bir outbox satırı ekler; en az bir alıcı varsa True."""
+    chat_ids = list(telegram_recipients())
+    if not chat_ids or not message:
+        return False
+
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            channel=NotificationOutbox.Channel.TELEGRAM,
+            chat_id=chat_id,
+            message=message,
+            activity_progress=activity_progress,
+        )
+        for chat_id in chat_ids
+    ])
+    return True
+
+
+def build_session(pool_size=4):
+    """Bağlantıları yeniden kullanan oturum; yeniden deneme bizde, adapter'da değil."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def build_digests(messages, limit=TELEGRAM_MAX_LENGTH):
+    """
+    Mesajları limit'i aşmayan özet parçalarına böler.
+    Dönüş: [(metin, mesaj_index_listesi), ...]
+    """
+    chunks = []
+    current, indexes = [], []
+
+    def close():
+        if not current:
+            return
+        header = f"<b>📬 {len(current)} bildirim</b>" + DIGEST_SEPARATOR
+        chunks.append((header + DIGEST_SEPARATOR.join(current), list(indexes)))
+        current.clear()
+        indexes.clear()
+
+    # başlık + ayraçlar için pay
+    budget = limit - 64
+    size = 0
+    for i, text in enumerate(messages):
+        extra = len(text) + (len(DIGEST_SEPARATOR) if current else 0)
+        if current and size + extra > budget:
+            close()
+            size, extra = 0, len(text)
+        current.append(text)
+        indexes.append(i)
+        size += extra
+    close()
+    return chunks
+
+
+class SendResult:
+    OK = "ok"
+    RETRY = "retry"          # geçici hata, geri çekilmeyle tekrar
+    THROTTLED = "throttled"  # 429, retry_after kadar bekle
+    FAILED = "failed"        # kalıcı hata (ör. 400 parse hatası)
+
+    def __init__(self, state, error="", retry_after=None):
+        self.state = state
+        self.error = error
+        self.retry_after = retry_after
+
+
+class TelegramDispatcher:
+    def __init__(self, session=None, digest_threshold=3, timeout=10, max_attempts=MAX_ATTEMPTS):
+        self.session = session or build_session()
+        self.digest_threshold = digest_threshold
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.api_url = getattr(settings, "TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+        self._last_sent = {}
+        self._last_global = 0.0
+
+    # --- hız sınırı ---
+    def _wait_turn(self, chat_id):
+        now = time.monotonic()
+        wait = max(
+            self._last_sent.get(chat_id, 0.0) + PER_CHAT_INTERVAL - now,
+            self._last_global + GLOBAL_INTERVAL - now,
+        )
+        if wait > 0:
+            time.sleep(wait)
+        now = time.monotonic()
+        self._last_sent[chat_id] = now
+        self._last_global = now
+
+    def send(self, token, chat_id, text):
+        self._wait_turn(chat_id)
+        try:
+            resp = self.session.post(
+                f"{self.api_url}/bot{token}/sendMessage",
+                json={
+                    "chat_id": chat_id,
+                    "text": text,
+                    "parse_mode": "HTML",
+                    "disable_web_page_preview": True,
+                },
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            return SendResult(SendResult.RETRY, error=str(exc))
+
+        if resp.status_code == 200:
+            return SendResult(SendResult.OK)
+
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+        error = f"{resp.status_code}: {data.get('description') or resp.text[:300]}"
+
+        if resp.status_code == 429:
+            retry_after = (data.get("parameters") or {}).get("retry_after") or BACKOFF_BASE
+            return SendResult(SendResult.THROTTLED, error=error, retry_after=retry_after)
+        if resp.status_code >= 500:
+            return SendResult(SendResult.RETRY, error=error)
+        return SendResult(SendResult.FAILED, error=error)
+
+    # --- durum yazımı ---
+    def _apply(self, rows, result):
+        ids = [r.pk for r in rows]
+        qs = NotificationOutbox.objects.filter(pk__in=ids)
+        now = timezone.now()
+
+        if result.state == SendResult.OK:
+            qs.update(
+                status=NotificationOutbox.Status.SENT,
+                attempts=F("attempts") + 1,
+                sent_at=now,
+                last_error="",
+            )
+            progress_ids = {r.activity_progress_id for r in rows if r.activity_progress_id}
+            if progress_ids:
+                ActivityProgress.objects.filter(pk__in=progress_ids).update(telegram_sent=True)
+            return
+
+        if result.state == SendResult.THROTTLED:
+            # Deneme sayısı artmaz; sadece ertelenir
+            qs.update(
+                next_attempt_at=now + timedelta(seconds=result.retry_after),
+                last_error=result.error,
+            )
+            return
+
+        for r in rows:
+            r.attempts += 1
+            r.last_error = result.error
+            if result.state == SendResult.FAILED or r.attempts >= self.max_attempts:
+                r.status = NotificationOutbox.Status.FAILED
+            else:
+                r.next_attempt_at = now + timedelta(seconds=backoff_delay(r.attempts))
+        NotificationOutbox.objects.bulk_update(
+            rows, ["attempts", "last_error", "status", "next_attempt_at"]
+        )
+
+    def run_once(self, batch_size=100):
+        """
+        Vadesi gelmiş bekleyen satırları işler.
+        Dönüş: {"messages", "requests", "digests", "sent", "retried", "failed"}
+        """
+        stats = dict.fromkeys(("messages", "requests", "digests", "sent", "retried", "failed"), 0)
+        rows = list(
+            NotificationOutbox.objects
+            .filter(
+                channel=NotificationOutbox.Channel.TELEGRAM,
+                status=NotificationOutbox.Status.PENDING,
+                next_attempt_at__lte=timezone.now(),
+            )
+            .order_by("id")[:batch_size]
+        )
+        if not rows:
+            return stats
+
+        tokens = telegram_recipients()
+        by_chat = OrderedDict()
+        for row in rows:
+            by_chat.setdefault(row.chat_id, []).append(row)
+
+        for chat_id, chat_rows in by_chat.items():
+            token = tokens.get(chat_id)
+            if not token:
+                self._apply(chat_rows, SendResult(SendResult.FAILED, error="chat_id ayarlarda yok"))
+                stats["failed"] += len(chat_rows)
+                continue
+
+            if len(chat_rows) >= self.digest_threshold:
+                groups = [
+                    (text, [chat_rows[i] for i in idx])
+                    for text, idx in build_digests([r.message for r in chat_rows])
+                ]
+                stats["digests"] += sum(1 for _, g in groups if len(g) > 1)
+            else:
+                groups = [(r.message, [r]) for r in chat_rows]
+
+            for text, group in groups:
+                result = self.send(token, chat_id, text)
+                self._apply(group, result)
+                stats["messages"] += len(group)
+                stats["requests"] += 1
+                if result.state == SendResult.OK:
+                    stats["sent"] += len(group)
+                elif any(r.status == NotificationOutbox.Status.FAILED for r in group):
+                    stats["failed"] += len(group)
+                    logger.warning("telegram gönderimi başarısız chat=%s: %s", chat_id, result.error)
+                else:
+                    stats["retried"] += len(group)
+                    if result.state == SendResult.THROTTLED:
+                        # Bu sohbetin kalanı da bekleyecek
+                        break
+
+        return stats
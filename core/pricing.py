@@ -0,0 +1,146 @@
+"""
+Fiyat yayılımı (Day -> Tour).
+
+Through kayıtları (DayFlight/DayTransfer/DayHotel/DayActivity) ya da bileşen
+fiyatları değiştiğinde satır satır yeniden hesaplamak yerine etkilenen Day/Tour
+id'leri transaction boyunca toplanır ve commit anında gruplu aggregate
+UPDATE'lerle tek seferde yeniden hesaplanır. Tour fiyatıyla aynı UPDATE'te
+bileşen kırılımı (*_amount) da yazılır; Tour.quote / Order.compute_total ve
+tour_detail fiyatı bunlardan sorgusuz hesaplar.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Func, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+from .batching import CommitBatch
+from .models import (
+    Day, DayActivity, DayFlight, DayHotel, DayTransfer, Tour, TourDay,
+)
+
+DAY_PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+TOUR_PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+# (through model, fiyat alanı) — Day.recompute_price ile aynı kaynaklar
+DAY_COMPONENTS = (
+    (DayFlight, "flight__price"),
+    (DayTransfer, "transfer__price"),
+    (DayHotel, "hotel__price_per_night"),
+    (DayActivity, "activity__price"),
+)
+
+# ------------- SET-BASED HESAPLAYICILAR -------------
+
+def _component_sum(model, price_field):
+    qs = (
+        model.objects
+        .filter(day_id=OuterRef("pk"))
+        .order_by()
+        .values("day_id")
+        .annotate(s=Sum(price_field))
+        .values("s")[:1]
+    )
+    return Coalesce(Subquery(qs), Value(Decimal("0.00")), output_field=DAY_PRICE_FIELD)
+
+
+def day_price_expression():
+    expr = None
+    for model, price_field in DAY_COMPONENTS:
+        part = _component_sum(model, price_field)
+        expr = part if expr is None else expr + part
+    return expr
+
+
+def tour_price_expression():
+    days_total = (
+        TourDay.objects
+        .filter(tour_id=OuterRef("pk"))
+        .order_by()
+        .values("tour_id")
+        .annotate(s=Sum("day__price"))
+        .values("s")[:1]
+    )
+    base = Coalesce(Subquery(days_total), Value(Decimal("0.00")), output_field=TOUR_PRICE_FIELD)
+    # Tour.recompute_price ile aynı yuvarlama (ROUND_HALF_UP); kolon ataması
+    # veritabanına göre farklı yuvarladığından açıkça ROUND uygulanır
+    return Round(base * F("commission"), 2, output_field=TOUR_PRICE_FIELD)
+
+
+# (Tour alanı, through model, fiyat alanı) — Tour.flights_total() vb. ile aynı
+TOUR_COMPONENTS = (
+    ("flights_amount", DayFlight, "flight__price"),
+    ("transfers_amount", DayTransfer, "transfer__price"),
+    ("hotels_amount", DayHotel, "hotel__price_per_night"),
+    ("activities_amount", DayActivity, "activity__price"),
+)
+
+
+def tour_component_expressions():
+    """Tour bileşen alanları için {alan: ifade}; turda tekrar eden gün bir kez sayılır."""
+    tour_day_ids = TourDay.objects.filter(tour_id=OuterRef(OuterRef("pk"))).values("day_id")
+    expressions = {}
+    for field, model, price_field in TOUR_COMPONENTS:
+        qs = (
+            model.objects
+            .filter(day_id__in=tour_day_ids)
+            .order_by()
+            .annotate(s=Func(F(price_field), function="SUM", output_field=TOUR_PRICE_FIELD))
+            .values("s")[:1]
+        )
+        expressions[field] = Coalesce(Subquery(qs), Value(Decimal("0.00")), output_field=TOUR_PRICE_FIELD)
+    return expressions
+
+
+def recompute_day_prices(day_ids=None):
+    """Verilen Day'lerin (None ise hepsinin) fiyatını tek UPDATE ile yazar."""
+    qs = Day.objects.all()
+    if day_ids is not None:
+        day_ids = set(day_ids)
+        if not day_ids:
+            return 0
+        qs = qs.filter(pk__in=day_ids)
+    return qs.update(price=day_price_expression())
+
+
+def recompute_tour_prices(tour_ids=None, day_ids=None):
+    """
+    Verilen Tour'ların ve verilen Day'leri içeren Tour'ların fiyatını tek UPDATE
+    ile yazar. İkisi de None ise tüm turlar hesaplanır.
+    """
+    qs = Tour.objects.all()
+    if tour_ids is not None or day_ids is not None:
+        cond = Q(pk__in=set(tour_ids or ()))
+        if day_ids:
+            cond |= Q(pk__in=TourDay.objects.filter(day_id__in=set(day_ids)).values("tour_id"))
+        elif not tour_ids:
+            return 0
+        qs = qs.filter(cond)
+    return qs.update(price=tour_price_expression(), **tour_component_expressions())
+
+
+def recompute_all_prices():
+    """Tüm Day ve Tour fiyatlarını iki UPDATE sorgusuyla yeniden kurar."""
+    days = recompute_day_prices()
+    tours = recompute_tour_prices()
+    return days, tours
+
+
+# ------------- DIRTY TAKİBİ -------------
+
+def _recompute_dirty(days, tours):
+    with transaction.atomic():
+        recompute_day_prices(days)
+        recompute_tour_prices(tours, days)
+
+
+_batch = CommitBatch(_recompute_dirty, "days", "tours")
+flush = _batch.flush
+
+
+def mark_days_dirty(day_ids):
+    _batch.add("days", day_ids)
+
+
+def mark_tours_dirty(tour_ids):
+    _batch.add("tours", tour_ids)
@@ -0,0 +1,60 @@
+"""
+ActivityProgress toplu okuma/oluşturma.
+
+today_plan her poll'da günün aktiviteleri için progress satırlarına bakar.
+Aktivite başına get_or_create yerine ProgressRepository order'ın o günkü
+tüm satırlarını tek sorguda okur, eksikleri tek bulk_create ile açar.
+unique_together (order, day_activity) sayesinde eşzamanlı istekler aynı
+satırı iki kez oluşturamaz; çakışan satır sessizce atlanır ve yeniden okunur.
+"""
+from django.db.models import Count, Q
+
+from .models import ActivityProgress
+
+
+class ProgressRepository:
+    def __init__(self, order_id):
+        self.order_id = order_id
+
+    @staticmethod
+    def queryset():
+        """Admin inline / listeler için: aktivite başlığı ek sorgu açmasın."""
+        return ActivityProgress.objects.select_related("day_activity__activity")
+
+    def _fetch(self, day_activity_ids):
+        return {
+            progress.day_activity_id: progress
+            for progress in ActivityProgress.objects.filter(
+                order_id=self.order_id,
+                day_activity_id__in=day_activity_ids,
+            )
+        }
+
+    def for_day_activities(self, day_activities):
+        """{day_activity_id: ActivityProgress}; eksik satırlar oluşturulur."""
+        ids = [da.id for da in day_activities]
+        if not ids:
+            return {}
+
+        progresses = self._fetch(ids)
+        missing = [i for i in ids if i not in progresses]
+
+        if missing:
+            ActivityProgress.objects.bulk_create(
+                [ActivityProgress(order_id=self.order_id, day_activity_id=i) for i in missing],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts pk döndürmez; yeni (ya da yarışta başkasının
+            # açtığı) satırlar tek sorguda okunur
+            progresses.update(self._fetch(missing))
+
+        return progresses
+
+    def summary(self):
+        """(toplam, tamamlanan, atlanan) tek sorguda."""
+        counts = ActivityProgress.objects.filter(order_id=self.order_id).aggregate(
+            total=Count("id"),
+            completed=Count("id", filter=Q(status=ActivityProgress.Status.COMPLETED)),
+            skipped=Count("id", filter=Q(status=ActivityProgress.Status.SKIPPED)),
+        )
+        return counts["total"], counts["completed"], counts["skipped"]
@@ -7,6 +7,7 @@ from .models import (
     DayActivity,
     ActivityProgress,
 )
+from .progress import ProgressRepository
 
 
 def get_order_phone(order):
@@ -105,17 +106,14 @@ def get_today_first_pending_activity(order):
     if not tour_day:
         return None
 
-    day_activities = DayActivity.objects.filter(
+    day_activities = list(DayActivity.objects.filter(
         day=tour_day.day
-    ).select_related("activity", "day").order_by("order", "id")
+    ).select_related("activity", "day").order_by("order", "id"))
 
-    for da in day_activities:
-        progress, _ = ActivityProgress.objects.get_or_create(
-            order=order,
-            day_activity=da
-        )
+    progresses = ProgressRepository(order.pk).for_day_activities(day_activities)
 
-        if progress.status == ActivityProgress.Status.PENDING:
+    for da in day_activities:
+        if progresses[da.id].status == ActivityProgress.Status.PENDING:
             return da
 
     return None
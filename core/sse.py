@@ -0,0 +1,86 @@
+"""
+Server-Sent Events uçları (canlı harita, Nomaya Asistan).
+
+ASGI (nomaya.asgi) altında bağlantı başına bir coroutine tutulur. Uygulama
+WSGI'da kalır; SSE ayrı bir ASGI servisinden (EVENTS_ORIGIN) sunulur. WSGI
+altında her bağlantı bir worker'ı kilitleyeceği için 501 döner; istemciler
+bu durumda polling'e geri döner.
+
+Django 4.2 istemci kopmasını stream sırasında bildirmez; bu yüzden bağlantı
+SSE_MAX_DURATION saniye sonra kapatılır, EventSource kendiliğinden yeniden
+bağlanır.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import events
+from .tracking import resolve_tracking_session
+from .views import superuser_required
+
+HEARTBEAT = 15
+RETRY_MS = 3000
+
+
+def format_event(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def event_stream(*topics):
+    deadline = time.monotonic() + getattr(settings, "SSE_MAX_DURATION", 300)
+    yield f"retry: {RETRY_MS}\n\n"
+
+    async with events.broker().subscribe(*topics) as sub:
+        while time.monotonic() < deadline:
+            item = await sub.get(HEARTBEAT)
+            if item is None:
+                yield ": ping\n\n"
+            else:
+                yield format_event(*item)
+
+
+def allow_origin(request, response):
+    """Sayfa başka origin'deyse (EVENTS_ORIGIN) güvenilen origin'e çerezli CORS."""
+    origin = request.headers.get("Origin")
+    if origin and origin in settings.CSRF_TRUSTED_ORIGINS:
+        response["Access-Control-Allow-Origin"] = origin
+        response["Access-Control-Allow-Credentials"] = "true"
+    response["Vary"] = "Origin"
+    return response
+
+
+def sse_response(request, *topics):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"success": False, "message": "sse_requires_asgi"}, status=501)
+
+    response = StreamingHttpResponse(event_stream(*topics), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx / Render proxy tamponlamasın
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def live_map_events(request):
+    if not superuser_required(request.user):
+        response = JsonResponse({"success": False, "message": "forbidden"}, status=403)
+    else:
+        response = sse_response(request, events.LOCATIONS, events.PROGRESS)
+    return allow_origin(request, response)
+
+
+def tracker_events(request, code):
+    session = resolve_tracking_session(code)
+
+    if session is None or not session.is_paid or session.is_expired():
+        response = JsonResponse({
+            "valid": False,
+            "message": "Geçersiz veya süresi dolmuş kod"
+        }, status=404)
+    else:
+        response = sse_response(request, events.progress_topic(session.code))
+    return allow_origin(request, response)
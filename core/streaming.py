@@ -0,0 +1,140 @@
+"""
+Yerel medya dosyalarını Range / koşullu istek desteğiyle sunar.
+
+- Accept-Ranges: bytes, tek aralıklı "bytes=a-b" istekleri 206 ile döner.
+  Çok aralıklı istekler tüm dosya (200) ile yanıtlanır (RFC 9110'a uygun).
+- If-None-Match eşleşirse 304, If-Range eşleşmezse Range yok sayılır.
+- MEDIA_OFFLOAD ayarı "x-accel" ya da "x-sendfile" ise baytları Python
+  worker'ı yerine önündeki proxy (nginx / Apache) gönderir.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def etag_matches(header, etag):
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match zayıf karşılaştırma kullanır
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag in tags
+
+
+def parse_range(header, size):
+    """
+    Tek aralıklı Range başlığını (start, end) olarak döndürür.
+    Başlık yok / desteklenmiyorsa None, karşılanamıyorsa "unsatisfiable".
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # "bytes=-500": son 500 bayt
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def is_initial_request(header):
+    """Range yoksa ya da baştan başlıyorsa True; sarma / devam istekleri False."""
+    if not header:
+        return True
+    match = RANGE_RE.match(header.strip())
+    # Desteklenmeyen başlıkta tüm dosya döner
+    return not match or match.group(1) == "0"
+
+
+def _iter_file(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _offload_response(path, content_type):
+    mode = getattr(settings, "MEDIA_OFFLOAD", "")
+    if mode == "x-accel":
+        # nginx: internal location MEDIA_ROOT'u MEDIA_OFFLOAD_PREFIX altında sunar
+        prefix = getattr(settings, "MEDIA_OFFLOAD_PREFIX", "/protected-media/").rstrip("/")
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{prefix}/{relative}"
+        return response
+    if mode == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+    return None
+
+
+def ranged_file_response(request, path, content_type, etag="", filename=None):
+    stat = os.stat(path)
+    size = stat.st_size
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    response = _offload_response(path, content_type)
+    if response is None:
+        byte_range = parse_range(request.headers.get("Range"), size)
+
+        # If-Range güçlü karşılaştırma ister; ETag değiştiyse tüm dosya gönderilir
+        if_range = request.headers.get("If-Range")
+        if byte_range and if_range and (not etag or if_range.strip() != etag):
+            byte_range = None
+
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_file(path, start, length), status=206, content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            length = size
+            response = StreamingHttpResponse(
+                _iter_file(path, 0, size), content_type=content_type,
+            )
+        response["Content-Length"] = str(length)
+
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if etag:
+        response["ETag"] = etag
+    if filename:
+        response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
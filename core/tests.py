@@ -1,3 +1,1770 @@
-from django.test import TestCase
+import atexit
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from itertools import product
+from decimal import ROUND_HALF_UP, Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import JsonResponse, QueryDict
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from . import audio, audio_cache, events, track_history, tracking
+from .audio import enqueue_order_audio
+from .catalog import refresh_catalog
+from .catalog_io import CatalogImporter, export_catalog
+from .itinerary import get_itinerary
+from .middleware import QueryBudgetExceeded, query_budget
+from .miles import MilesLedger
+from .models import (
+    Activity, ActivityProgress, ActivityProgressLocationLog, Airline, Airport, AirportTransfer,
+    AudioCacheEntry, AudioRenderJob, Bullet, City, Country, Day, DayActivity, DayFlight,
+    DayHotel, DayTransfer, Flight, Hotel, IntroAudioLibrary, LiveLocation, LocationTrackChunk,
+    MilesLedgerEntry, NotificationOutbox, Order, OrderIntroAssignment, Tour, TourCatalogEntry,
+    TourDay, TourType, Traveler, UserProfile, WhatsAppMessageQueue,
+)
+from .notifications import TelegramDispatcher, enqueue_telegram
+from .pricing import recompute_day_prices, recompute_tour_prices
+from .streaming import is_initial_request, parse_range, ranged_file_response
+from .tourdays import reorder_tour_days, suspend_tourday_signals
+from .travelers import parse_travelers, upsert_travelers
+from .whatsapp import WahaClient, WhatsAppQueueProcessor
+
+Status = WhatsAppMessageQueue.Status
+
+# Her isteğin JSON satırı test çıktısını kirletmesin; içeriği doğrulayan
+# testler assertLogs kullanır (handler'ı geçici olarak kendisi takar)
+QUIET_LOGGERS = ("core.requests",)
+_saved_handlers = {}
+
+
+def setUpModule():
+    for name in QUIET_LOGGERS:
+        logger = logging.getLogger(name)
+        _saved_handlers[name] = logger.handlers
+        logger.handlers = [logging.NullHandler()]
+
+
+def tearDownModule():
+    for name, handlers in _saved_handlers.items():
+        logging.getLogger(name).handlers = handlers
+
+
+class FakeWahaHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.received.append(payload)
+
+        code = self.server.responses.get(payload.get("chatId"), 201)
+        body = json.dumps({"id": f"msg-{len(self.server.received)}"}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class WhatsAppQueueProcessorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeWahaHandler)
+        cls.server.received = []
+        cls.server.responses = {}
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.received.clear()
+        self.server.responses.clear()
+        host, port = self.server.server_address
+        self.processor = WhatsAppQueueProcessor(
+            client=WahaClient(base_url=f"http://{host}:{port}", api_key="test"),
+            concurrency=4,
+        )
+
+    def enqueue(self, phone, message):
+        return WhatsAppMessageQueue.objects.create(phone=phone, message=message)
+
+    def test_sends_pending_messages(self):
+        for i in range(5):
+            self.enqueue(f"+90 555 000 00 0{i}", f"merhaba {i}")
+
+        stats = self.processor.run_once()
+
+        self.assertEqual(stats.sent, 5)
+        self.assertEqual(len(self.server.received), 5)
+        self.assertFalse(WhatsAppMessageQueue.objects.exclude(status=Status.SENT).exists())
+        self.assertEqual(self.server.received[0]["session"], "default")
+
+    def test_keeps_order_per_phone(self):
+        self.enqueue("905550000000", "bir")
+        self.enqueue("905550000000", "iki")
+
+        self.assertEqual(self.processor.run_once().sent, 1)
+        self.assertEqual(self.processor.run_once().sent, 1)
+
+        self.assertEqual([p["text"] for p in self.server.received], ["bir", "iki"])
+
+    def test_retry_blocks_later_messages_for_same_phone(self):
+        self.server.responses["905550000000@c.us"] = 503
+        first = self.enqueue("905550000000", "bir")
+        self.enqueue("905550000000", "iki")
+
+        stats = self.processor.run_once()
+        self.assertEqual(stats.retried, 1)
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, Status.PENDING)
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.next_attempt_at, timezone.now())
+
+        # İlk mesaj beklerken ikincisi gönderilmez
+        self.assertEqual(self.processor.run_once().claimed, 0)
+
+    def test_client_error_fails_without_retry(self):
+        self.server.responses["905550000000@c.us"] = 400
+        message = self.enqueue("905550000000", "bir")
+
+        with self.assertLogs("core.whatsapp", "WARNING"):
+            self.assertEqual(self.processor.run_once().failed, 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, Status.FAILED)
+        self.assertIsNotNone(message.failed_at)
+
+    def test_recovers_stale_locks(self):
+        message = self.enqueue("905550000000", "bir")
+        WhatsAppMessageQueue.objects.filter(pk=message.pk).update(
+            status=Status.PROCESSING,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        stats = self.processor.run_once()
+
+        self.assertEqual(stats.recovered, 1)
+        self.assertEqual(stats.sent, 1)
+
+
+def _run_queries(n):
+    with connection.cursor() as cursor:
+        for _ in range(n):
+            cursor.execute("SELECT 1")
+
+
+@query_budget(2)
+def budgeted_view(request):
+    _run_queries(int(request.GET.get("n", 0)))
+    return JsonResponse({"ok": True})
+
+
+urlpatterns = [
+    path("budgeted/", budgeted_view, name="budgeted"),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, SERVER_TIMING=True)
+class RequestMetricsMiddlewareTests(TestCase):
+    def get(self, n):
+        return self.client.get("/budgeted/", {"n": n}, secure=True)
+
+    def test_server_timing_header(self):
+        response = self.get(1)
+
+        timing = response["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_logs_structured_record(self):
+        with self.assertLogs("core.requests", "INFO") as logs:
+            self.get(2)
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "budgeted")
+        self.assertEqual(record["queries"], 2)
+        self.assertEqual(record["query_budget"], 2)
+        self.assertEqual(record["status"], 200)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_budget_exceeded_fails_when_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.get(3)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_only_warns(self):
+        with self.assertLogs("core.requests", "WARNING"):
+            response = self.get(3)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class TrackerViewBudgetTests(TestCase):
+    """Tracker API'leri gün/aktivite sayısından bağımsız olarak bütçede kalır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        cls.tour = Tour.objects.create(title="Roma")
+        for i in range(1, 6):
+            day = Day.objects.create(city=city, day_number=i, title=f"Gün {i}")
+            TourDay.objects.create(tour=cls.tour, day=day, order=i)
+            for j in range(4):
+                activity = Activity.objects.create(title=f"A{i}-{j}", city=city)
+                DayActivity.objects.create(day=day, activity=activity, order=j)
+        today = timezone.localdate()
+        cls.order = Order.objects.create(
+            tour=cls.tour, pax=2, is_paid=True, start_date=today, end_date=today + timedelta(days=4),
+        )
+
+    def test_today_plan_within_budget(self):
+        url = f"/api/today-plan/{self.order.tracking_code}/"
+        # İlk çağrı progress satırlarını oluşturur, ikincisi sadece okur
+        for _ in range(2):
+            response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["activities"]), 4)
+
+    def test_order_itinerary_within_budget(self):
+        response = self.client.get(f"/api/order-itinerary/{self.order.tracking_code}/", secure=True)
+        self.assertEqual(response.status_code, 200)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist sorgu sayısı satır sayısından bağımsızdır."""
+
+    changelists = [
+        "admin:core_order_changelist",
+        "admin:core_tour_changelist",
+        "admin:core_activity_changelist",
+        "admin:core_activityprogress_changelist",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        country = Country.objects.create(name="Italy")
+        cls.city = City.objects.create(name="Rome", country=country)
+        cls.tour_type = TourType.objects.create(name="Kültür")
+        cls.created = 0
+
+    def add_rows(self, n):
+        for _ in range(n):
+            self.created += 1
+            i = self.created
+            tour = Tour.objects.create(title=f"Tur {i}")
+            day = Day.objects.create(city=self.city, day_number=i, title=f"Gün {i}")
+            TourDay.objects.create(tour=tour, day=day, order=1)
+            activity = Activity.objects.create(title=f"Aktivite {i}", city=self.city)
+            activity.tour_types.add(self.tour_type)
+            day_activity = DayActivity.objects.create(day=day, activity=activity, order=1)
+            order = Order.objects.create(tour=tour, pax=1)
+            ActivityProgress.objects.create(
+                order=order, day_activity=day_activity, status=ActivityProgress.Status.COMPLETED,
+            )
+        refresh_catalog()
+
+    def query_counts(self):
+        counts = {}
+        for name in self.changelists:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name), secure=True)
+            self.assertEqual(response.status_code, 200)
+            counts[name] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_count_is_constant(self):
+        self.client.force_login(self.user)
+
+        self.add_rows(3)
+        small = self.query_counts()
+        self.add_rows(97)
+        large = self.query_counts()
+
+        self.assertEqual(small, large)
+        for name, count in large.items():
+            self.assertLessEqual(count, 20, name)
+
+
+class AdminAutocompleteTests(TestCase):
+    """Day change form ve inline autocomplete uçları katalog büyüklüğünden bağımsızdır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("admin", "admin@example.com", "x")
+        country = Country.objects.create(name="Italy")
+        cls.city = City.objects.create(name="Rome", country=country)
+        cls.day = Day.objects.create(city=cls.city, day_number=1, title="Roma")
+        cls.created = 0
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_catalog(self, n, attach=0):
+        for _ in range(n):
+            self.created += 1
+            i = self.created
+            hotel = Hotel.objects.create(name=f"Otel {i}", city=self.city, price_per_night=100)
+            activity = Activity.objects.create(title=f"Aktivite {i}", city=self.city)
+            if attach:
+                attach -= 1
+                DayHotel.objects.create(day=self.day, hotel=hotel, order=i)
+                DayActivity.objects.create(day=self.day, activity=activity, order=i)
+
+    def change_form_queries(self):
+        url = reverse("admin:core_day_change", args=[self.day.pk])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def autocomplete(self, term):
+        params = {"term": term, "app_label": "core", "model_name": "dayhotel", "field_name": "hotel"}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("admin:autocomplete"), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [row["text"] for row in response.json()["results"]], len(ctx.captured_queries)
+
+    def test_day_change_form_query_count_is_constant(self):
+        self.add_catalog(3, attach=2)
+        # İlk istek ContentType cache'ini doldurur
+        self.change_form_queries()
+        small, _ = self.change_form_queries()
+        self.add_catalog(100, attach=20)
+        large, response = self.change_form_queries()
+
+        self.assertEqual(small, large)
+        # Seçili değerlerin etiketleri satır başına sorgu açmadan gelir
+        self.assertContains(response, "Otel 23 – Rome, Italy")
+        self.assertNotContains(response, "Otel 24 –")
+
+    def test_autocomplete_pages_are_cached_until_target_changes(self):
+        self.add_catalog(2)
+        results, first = self.autocomplete("Otel")
+        self.assertEqual(results, ["Otel 1 – Rome, Italy", "Otel 2 – Rome, Italy"])
+
+        # Sinyalsiz değişiklik cache'teki sayfayı etkilemez
+        Hotel.objects.filter(name="Otel 2").update(name="Otel 2b")
+        cached, second = self.autocomplete("Otel")
+        self.assertEqual(cached, results)
+        self.assertLess(second, first)
+
+        # Kaydetme model sürümünü artırır, sayfa yeniden oluşur
+        Hotel.objects.create(name="Otel 3", city=self.city, price_per_night=100)
+        results, _ = self.autocomplete("Otel")
+        self.assertEqual(
+            results, ["Otel 1 – Rome, Italy", "Otel 2b – Rome, Italy", "Otel 3 – Rome, Italy"],
+        )
+
+
+class TourDayReorderTests(TestCase):
+    """Toplu sıralama gün sayısından bağımsız sayıda sorgu çalıştırır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        cls.city = City.objects.create(name="Rome", country=country)
+
+    def make_tour(self, n):
+        # Kurulumun commit sonrası işleri ölçüme karışmasın
+        with self.captureOnCommitCallbacks(execute=True):
+            tour = Tour.objects.create(title=f"Tur {n}")
+            for i in range(1, n + 1):
+                day = Day.objects.create(city=self.city, day_number=n * 100 + i, title=f"Gün {i}")
+                TourDay.objects.create(tour=tour, day=day, order=i)
+        return tour
+
+    def reverse_order(self, tour):
+        ids = list(tour.tour_days.values_list("id", flat=True))[::-1]
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                reorder_tour_days(tour, ids)
+        return ids, len(ctx.captured_queries)
+
+    def test_reorder_renumbers_titles(self):
+        tour = self.make_tour(3)
+        ids, _ = self.reverse_order(tour)
+
+        rows = list(tour.tour_days.values_list("id", "order", "title"))
+        self.assertEqual([r[0] for r in rows], ids)
+        self.assertEqual(
+            [(r[1], r[2]) for r in rows],
+            [(1, "Day 1: Gün 3"), (2, "Day 2: Gün 2"), (3, "Day 3: Gün 1")],
+        )
+
+    def test_query_count_is_constant(self):
+        _, small = self.reverse_order(self.make_tour(3))
+        _, large = self.reverse_order(self.make_tour(20))
+        self.assertEqual(small, large)
+
+    def test_suspended_saves_skip_recompute(self):
+        tour = self.make_tour(5)
+        tour_days = list(tour.tour_days.all())
+        with CaptureQueriesContext(connection) as ctx:
+            with suspend_tourday_signals():
+                for tour_day in tour_days:
+                    tour_day.save(update_fields=["order"])
+        self.assertEqual(len(ctx.captured_queries), len(tour_days))
+
+
+def catalog_document(n_tours, days_per_tour=3):
+    hotel = ["Italy", "Rome", "Hotel Roma"]
+    days, tours = [], []
+    for t in range(n_tours):
+        tour_days = []
+        for i in range(days_per_tour):
+            number = t * days_per_tour + i + 1
+            days.append({
+                "city": ["Italy", "Rome"], "day_number": number, "title": f"Gün {number}",
+                "hotels": [hotel], "activities": [[["Italy", "Rome"], f"Aktivite {number}"]],
+            })
+            tour_days.append({"day": [["Italy", "Rome"], number]})
+        tours.append({
+            "slug": f"tur-{t}", "title": f"Tur {t}", "commission": "1.50",
+            "places_covered": [["Italy", "Rome"]], "tour_types": ["Kültür"],
+            "days": tour_days, "bullets": [{"text": "Kolezyum", "section": "highlights"}],
+        })
+    return {
+        "version": 1,
+        "countries": [{"name": "Italy", "iso2": "IT"}],
+        "cities": [{"country": "Italy", "name": "Rome"}],
+        "hotels": [{"city": ["Italy", "Rome"], "name": "Hotel Roma", "price_per_night": "50.00"}],
+        "activities": [
+            {"city": ["Italy", "Rome"], "title": f"Aktivite {d['day_number']}", "price": "10.00",
+             "miles_reward": 5, "tour_types": ["Kültür"]}
+            for d in days
+        ],
+        "days": days,
+        "tours": tours,
+    }
+
+
+class CatalogImportTests(TestCase):
+    """Toplu içe aktarma: fiyat/sayılar sonda bir kez, sorgu sayısı tur sayısından bağımsız."""
+
+    def import_document(self, document):
+        importer = CatalogImporter(document)
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                importer.run()
+        return importer, len(ctx.captured_queries)
+
+    def test_import_recomputes_once(self):
+        self.import_document(catalog_document(2))
+
+        tour = Tour.objects.get(slug="tur-0")
+        self.assertEqual((tour.hotels_count, tour.activities_count), (3, 3))
+        self.assertEqual(tour.price, Decimal("270.00"))  # 3 x (50 + 10) x 1.50
+        self.assertEqual(
+            list(tour.tour_days.values_list("order", "title")),
+            [(1, "Day 1: Gün 1"), (2, "Day 2: Gün 2"), (3, "Day 3: Gün 3")],
+        )
+        entry = TourCatalogEntry.objects.get(tour=tour)
+        self.assertEqual((entry.total_days, entry.total_miles), (3, 15))
+
+    def test_export_reimport_is_idempotent(self):
+        self.import_document(catalog_document(2))
+        document = export_catalog()
+
+        importer, _ = self.import_document(document)
+
+        self.assertEqual(sum(importer.written.values()), 0)
+        self.assertEqual(export_catalog(), document)
+
+    def test_query_count_is_constant(self):
+        _, small = self.import_document(catalog_document(2))
+        with self.captureOnCommitCallbacks(execute=True):
+            for model in (Tour, Day, Activity, Hotel, Bullet, TourType, City, Country):
+                model.objects.all().delete()
+        _, large = self.import_document(catalog_document(20))
+        self.assertEqual(small, large)
+
+
+def legacy_order_total(order):
+    """Order.compute_total'ın bileşen kırılımından önceki hesabı (karşılaştırma için)."""
+    t = order.tour
+    commission = Decimal(str(t.commission))
+    flights = Decimal(t.flights_total() or 0) if not order.hide_flights else Decimal("0")
+    transfers = Decimal(t.transfers_total() or 0) if not order.hide_transfers else Decimal("0")
+    hotels = Decimal(t.hotels_total() or 0) if not order.hide_hotels else Decimal("0")
+    activities = Decimal("0")
+    for d in t.days.all():
+        for da in d.dayactivity_set.all():
+            if da.activity.price:
+                activities += Decimal(da.activity.price)
+
+    pax = Decimal(order.pax)
+    if order.hide_hotels:
+        m_hotels = Decimal("0")
+    elif order.pax == 2:
+        m_hotels = Decimal("1") if order.same_room else Decimal("2")
+    else:
+        m_hotels = Decimal("1")
+    net = flights * pax + activities * pax + hotels * m_hotels + transfers
+    return (net * commission).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+class TourPriceBreakdownTests(TestCase):
+    """Tour bileşen kırılımı fiyatla birlikte güncellenir; teklif sorgusuz hesaplanır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        airport = Airport.objects.create(name="Fiumicino", iata="FCO", city=city)
+        airline = Airline.objects.create(name="ITA")
+        cls.hotel = Hotel.objects.create(name="Roma", city=city, price_per_night=Decimal("83.40"))
+        flight = Flight.objects.create(
+            airline=airline, flight_number="AZ1", origin=airport, destination=airport,
+            duration_minutes=60, price=Decimal("129.99"),
+        )
+        transfer = AirportTransfer.objects.create(
+            city=city, airport=airport, hotel=cls.hotel, price=Decimal("35.50"),
+        )
+        cls.tour = Tour.objects.create(title="Roma", commission=Decimal("1.37"))
+        for i in range(1, 4):
+            day = Day.objects.create(city=city, day_number=i, title=f"Gün {i}")
+            TourDay.objects.create(tour=cls.tour, day=day, order=i)
+            DayHotel.objects.create(day=day, hotel=cls.hotel)
+            for j in range(2):
+                activity = Activity.objects.create(title=f"A{i}-{j}", city=city, price=Decimal("12.25") * (j + 1))
+                DayActivity.objects.create(day=day, activity=activity, order=j)
+            if i in (1, 3):
+                DayFlight.objects.create(day=day, flight=flight)
+                DayTransfer.objects.create(day=day, transfer=transfer)
+
+    def setUp(self):
+        # Bileşenler commit anında core.pricing tarafından yazılır
+        with self.captureOnCommitCallbacks(execute=True):
+            Tour.objects.filter(pk=self.tour.pk).update(price=0)
+            from .pricing import mark_tours_dirty
+            mark_tours_dirty([self.tour.pk])
+        self.tour.refresh_from_db()
+
+    def test_quote_matches_legacy_total_without_queries(self):
+        self.assertEqual(self.tour.activities_amount, Decimal("110.25"))
+        for pax, same_room, hide_f, hide_t, hide_h in product((1, 2, 3), *[(False, True)] * 4):
+            order = Order(
+                tour=self.tour, pax=pax, same_room=same_room,
+                hide_flights=hide_f, hide_transfers=hide_t, hide_hotels=hide_h,
+            )
+            expected = legacy_order_total(order)
+            with self.assertNumQueries(0):
+                self.assertEqual(order.compute_total(), expected)
+
+    def test_component_price_change_updates_breakdown(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hotel.price_per_night = Decimal("100.00")
+            self.hotel.save()
+        self.tour.refresh_from_db()
+        self.assertEqual(self.tour.hotels_amount, Decimal("300.00"))
+
+        set_based = [getattr(self.tour, f) for f in Tour.PRICE_COMPONENT_FIELDS]
+        self.tour.recompute_price()
+        self.assertEqual([getattr(self.tour, f) for f in Tour.PRICE_COMPONENT_FIELDS], set_based)
+
+
+def legacy_day_price(day):
+    """Day.recompute_price'ın satır satır hesabı (set-based UPDATE ile karşılaştırma için)."""
+    total = Decimal("0.00")
+    for through, field in (
+        (DayFlight, "flight__price"), (DayTransfer, "transfer__price"),
+        (DayHotel, "hotel__price_per_night"), (DayActivity, "activity__price"),
+    ):
+        total += Decimal(through.objects.filter(day=day).aggregate(s=Sum(field))["s"] or 0)
+    return total.quantize(Decimal("0.01"))
+
+
+def legacy_tour_price(tour):
+    base = Decimal(Day.objects.filter(tourday__tour=tour).aggregate(t=Sum("price"))["t"] or 0)
+    return (base * (tour.commission or Decimal("1.00"))).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+class SetBasedPriceRecomputeTests(TestCase):
+    """recompute_day_prices / recompute_tour_prices eski satır satır hesapla aynı sonucu verir."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Spain")
+        city = City.objects.create(name="Madrid", country=country)
+        airport = Airport.objects.create(name="Barajas", iata="MAD", city=city)
+        airline = Airline.objects.create(name="Iberia")
+        hotel = Hotel.objects.create(name="Prado", city=city, price_per_night=Decimal("71.35"))
+        free_hotel = Hotel.objects.create(name="Arkadaş evi", city=city, price_per_night=Decimal("0.00"))
+        flight = Flight.objects.create(
+            airline=airline, flight_number="IB1", origin=airport, destination=airport,
+            duration_minutes=90, price=Decimal("210.99"),
+        )
+        transfer = AirportTransfer.objects.create(city=city, airport=airport, hotel=hotel, price=Decimal("18.40"))
+
+        def day(number, flights=(), transfers=(), hotels=(), activities=()):
+            d = Day.objects.create(city=city, day_number=number, title=f"Gün {number}")
+            for f in flights:
+                DayFlight.objects.create(day=d, flight=f)
+            for t in transfers:
+                DayTransfer.objects.create(day=d, transfer=t)
+            for h in hotels:
+                DayHotel.objects.create(day=d, hotel=h)
+            for i, price in enumerate(activities):
+                a = Activity.objects.create(title=f"A{number}-{i}", city=city, price=Decimal(price))
+                DayActivity.objects.create(day=d, activity=a, order=i)
+            return d
+
+        full = day(1, [flight], [transfer], [hotel], ["12.50", "7.15"])
+        empty = day(2)
+        free = day(3, hotels=[free_hotel], activities=["0.00", "0.00"])
+        activities_only = day(4, activities=["33.33"])
+        cls.days = [full, empty, free, activities_only]
+
+        cls.tours = []
+        for commission, days in (
+            ("1.00", [full, empty]),
+            ("1.37", [full, free, activities_only]),
+            ("2.00", [activities_only]),
+            ("1.15", [empty, free]),
+            ("1.50", []),
+        ):
+            tour = Tour.objects.create(title=f"Tur {commission}", commission=Decimal(commission))
+            for order, d in enumerate(days, start=1):
+                TourDay.objects.create(tour=tour, day=d, order=order)
+            cls.tours.append(tour)
+
+    def setUp(self):
+        Day.objects.update(price=Decimal("999.99"))
+        Tour.objects.update(price=Decimal("999.99"))
+
+    def test_day_prices_match_legacy(self):
+        recompute_day_prices()
+        for d in self.days:
+            d.refresh_from_db()
+            self.assertEqual(d.price, legacy_day_price(d), d.title)
+        self.assertEqual(
+            [d.price for d in self.days],
+            [Decimal("320.39"), Decimal("0.00"), Decimal("0.00"), Decimal("33.33")],
+        )
+
+    def test_tour_prices_match_legacy(self):
+        recompute_day_prices()
+        recompute_tour_prices()
+        for tour in self.tours:
+            tour.refresh_from_db()
+            self.assertEqual(tour.price, legacy_tour_price(tour), tour.title)
+        self.assertEqual(self.tours[-1].price, Decimal("0.00"))
+
+    def test_model_methods_match_set_based(self):
+        for d in self.days:
+            d.recompute_price()
+        for tour in self.tours:
+            tour.recompute_price()
+        per_row = {t.pk: (t.price, [getattr(t, f) for f in Tour.PRICE_COMPONENT_FIELDS]) for t in self.tours}
+
+        Tour.objects.update(price=0, flights_amount=0, hotels_amount=0)
+        recompute_day_prices()
+        recompute_tour_prices([t.pk for t in self.tours])
+        for tour in Tour.objects.filter(pk__in=per_row):
+            self.assertEqual(
+                (tour.price, [getattr(tour, f) for f in Tour.PRICE_COMPONENT_FIELDS]), per_row[tour.pk]
+            )
+
+    def test_commission_rounds_half_up(self):
+        # 100.15 * 1.50 = 150.225 — iki yol da 150.23'e yuvarlar
+        activity = Activity.objects.get(title="A4-0")
+        Activity.objects.filter(pk=activity.pk).update(price=Decimal("100.15"))
+        tour = self.tours[2]
+        Tour.objects.filter(pk=tour.pk).update(commission=Decimal("1.50"))
+
+        recompute_day_prices()
+        recompute_tour_prices([tour.pk])
+        tour.refresh_from_db()
+        self.assertEqual(tour.price, Decimal("150.23"))
+
+        tour.recompute_price()
+        self.assertEqual(tour.price, Decimal("150.23"))
+
+    def test_partial_recompute_follows_days(self):
+        recompute_day_prices()
+        recompute_tour_prices()
+        Activity.objects.filter(title="A4-0").update(price=Decimal("40.00"))
+        changed = self.days[3]
+
+        recompute_day_prices([changed.pk])
+        recompute_tour_prices(day_ids=[changed.pk])
+        prices = dict(Tour.objects.values_list("pk", "price"))
+        self.assertEqual(prices[self.tours[2].pk], Decimal("80.00"))
+        self.assertEqual(prices[self.tours[1].pk], legacy_tour_price(self.tours[1]))
+        # Değişen günü içermeyen turlar yeniden yazılmaz
+        self.assertEqual(prices[self.tours[0].pk], Decimal("320.39"))
+
+
+class CatalogEntryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(name="Portugal")
+        cls.city = City.objects.create(name="Lisbon", country=cls.country)
+        Day.objects.create(city=cls.city, day_number=1, title="Alfama")
+
+    def test_day_created_in_covered_city_updates_fallback_days(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tour = Tour.objects.create(title="Lizbon", is_published=True)
+            tour.places_covered.add(self.city)
+        self.assertEqual(TourCatalogEntry.objects.get(tour=tour).total_days, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            day = Day.objects.create(city=self.city, day_number=2, title="Belém")
+        self.assertEqual(TourCatalogEntry.objects.get(tour=tour).total_days, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            day.delete()
+        self.assertEqual(TourCatalogEntry.objects.get(tour=tour).total_days, 1)
+
+    def test_tour_grid_backfills_missing_entries(self):
+        tour = Tour.objects.create(title="Lizbon", is_published=True)
+        tour.places_covered.add(self.city)
+        TourCatalogEntry.objects.all().delete()
+
+        admin = get_user_model().objects.create_superuser("root", "root@example.com", "x")
+        self.client.force_login(admin)
+        params = {"dates": "2026-05-01 - 2026-05-04"}
+        # İlk istek eksik kaydı yazar; bütçe kalıcı durumdaki sayfa içindir
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            response = self.client.get(reverse("tour_grid"), params)
+        self.assertEqual([t.pk for t in response.context["tours"]], [tour.pk])
+        self.assertEqual(TourCatalogEntry.objects.get(tour=tour).total_days, 1)
+
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            response = self.client.get(reverse("tour_grid"), params)
+        self.assertEqual([t.pk for t in response.context["tours"]], [tour.pk])
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class ItineraryCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(name="Greece")
+        cls.city = City.objects.create(name="Athens", country=cls.country)
+        cls.airport = Airport.objects.create(name="Athens Intl", iata="ATH", city=cls.city)
+        cls.airline = Airline.objects.create(name="Aegean")
+        flight = Flight.objects.create(
+            airline=cls.airline, flight_number="A3 1", origin=cls.airport, destination=cls.airport,
+            duration_minutes=50, price=Decimal("80.00"),
+        )
+        cls.tour = Tour.objects.create(title="Atina", slug="atina", is_published=True)
+        for i in range(1, 4):
+            day = Day.objects.create(city=cls.city, day_number=i, title=f"Gün {i}")
+            TourDay.objects.create(tour=cls.tour, day=day, order=i)
+        DayFlight.objects.create(day=day, flight=flight)
+
+    def _itinerary(self):
+        return get_itinerary(Tour.objects.get(pk=self.tour.pk))
+
+    def test_lookup_renames_invalidate_cached_itinerary(self):
+        self.assertFalse(self._itinerary().cache_hit)
+        self.assertTrue(self._itinerary().cache_hit)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = "Athína"
+            self.city.save()
+        itinerary = self._itinerary()
+        self.assertFalse(itinerary.cache_hit)
+        self.assertEqual(itinerary.start_point, "Athína")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.airline.name = "Olympic"
+            self.airline.save()
+        itinerary = self._itinerary()
+        self.assertFalse(itinerary.cache_hit)
+        self.assertEqual(itinerary.days[-1].flights[0].flight.airline.name, "Olympic")
+
+        for obj, field, value in (
+            (self.airport, "iata", "ATX"), (self.country, "name", "Hellas"),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                setattr(obj, field, value)
+                obj.save()
+            self.assertFalse(self._itinerary().cache_hit)
+
+    def test_tour_detail_summary_uses_itinerary(self):
+        url = reverse("tour_detail", args=[self.tour.slug])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response["X-Itinerary-Cache"], "hit")
+        self.assertContains(response, "Athens")
+        # Süre ve başlangıç/bitiş önbellekteki gün planından okunur
+        self.assertFalse([q for q in ctx.captured_queries if "core_tourday" in q["sql"]])
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.received.append(payload)
+
+        code, data = self.server.responses.pop(0) if self.server.responses else (200, {"ok": True})
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TelegramDispatcherTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)
+        cls.server.received = []
+        cls.server.responses = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        host, port = cls.server.server_address
+        cls.settings_override = override_settings(
+            TELEGRAM_API_URL=f"http://{host}:{port}",
+            TELEGRAM_BOT_TOKEN="token", TELEGRAM_CHAT_ID="42",
+            TELEGRAM_BOT_TOKEN_2="", TELEGRAM_CHAT_ID_2="",
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        tour = Tour.objects.create(title="Roma")
+        day = Day.objects.create(city=city, day_number=1, title="Gün 1")
+        activity = Activity.objects.create(title="Kolezyum", city=city)
+        day_activity = DayActivity.objects.create(day=day, activity=activity)
+        order = Order.objects.create(tour=tour, pax=1)
+        cls.progress = ActivityProgress.objects.create(order=order, day_activity=day_activity)
+
+    def setUp(self):
+        self.server.received.clear()
+        self.server.responses.clear()
+
+    def drain(self):
+        # Her turda yeni dispatcher: sohbet başına hız sınırı testleri bekletmesin
+        return TelegramDispatcher(digest_threshold=3).run_once()
+
+    def test_drains_pending_rows_into_digest(self):
+        for i in range(3):
+            enqueue_telegram(f"mesaj {i}")
+
+        stats = self.drain()
+
+        self.assertEqual((stats["sent"], stats["requests"], stats["digests"]), (3, 1, 1))
+        self.assertEqual(self.server.received[0]["chat_id"], "42")
+        self.assertIn("mesaj 2", self.server.received[0]["text"])
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.Status.SENT).exists())
+
+    def test_server_error_is_retried_with_backoff(self):
+        self.server.responses.append((502, {"description": "bad gateway"}))
+        enqueue_telegram("mesaj")
+
+        self.assertEqual(self.drain()["retried"], 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts), (NotificationOutbox.Status.PENDING, 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+        # Vadesi gelmeden tekrar denenmez; gelince gönderilir
+        self.assertEqual(self.drain()["messages"], 0)
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.drain()["sent"], 1)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.last_error), (NotificationOutbox.Status.SENT, 2, ""))
+
+    def test_throttled_rows_wait_without_attempt(self):
+        self.server.responses.append((429, {"parameters": {"retry_after": 30}}))
+        enqueue_telegram("mesaj")
+
+        self.assertEqual(self.drain()["retried"], 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual(row.attempts, 0)
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=25))
+
+    def test_client_error_fails_permanently(self):
+        self.server.responses.append((400, {"description": "can't parse entities"}))
+        enqueue_telegram("mesaj")
+
+        with self.assertLogs("core.notifications", "WARNING"):
+            self.assertEqual(self.drain()["failed"], 1)
+        self.assertEqual(NotificationOutbox.objects.get().status, NotificationOutbox.Status.FAILED)
+
+    def test_telegram_sent_is_set_after_delivery(self):
+        self.server.responses.append((503, {}))
+        enqueue_telegram("aktivite", activity_progress=self.progress)
+
+        self.drain()
+        self.progress.refresh_from_db()
+        self.assertFalse(self.progress.telegram_sent)
+
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.drain()
+        self.progress.refresh_from_db()
+        self.assertTrue(self.progress.telegram_sent)
+
+
+@override_settings(AUDIO_RENDER_IN_PROCESS=False)
+class AudioEnqueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        cls.tour = Tour.objects.create(title="Roma")
+        day = Day.objects.create(city=city, day_number=1, title="Gün 1")
+        TourDay.objects.create(tour=cls.tour, day=day, order=1)
+        cls.day_activities = []
+        for i in range(2):
+            activity = Activity.objects.create(
+                title=f"A{i}", city=city,
+                audio_on_the_way=f"activities/audio/way-{i}.mp3",
+                audio_at_location=f"activities/audio/at-{i}.mp3",
+            )
+            cls.day_activities.append(DayActivity.objects.create(day=day, activity=activity, order=i))
+        cls.intro = IntroAudioLibrary.objects.create(name="ali", audio="intro_library/ali.mp3")
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(tour=self.tour, pax=1, is_paid=True)
+            self.traveler = Traveler.objects.create(
+                order=self.order, index=1, first_name="Ali", last_name="Kaya",
+            )
+        for da in self.day_activities:
+            OrderIntroAssignment.objects.create(order=self.order, day_activity=da, intro=self.intro, name="ali")
+
+    def statuses(self):
+        return sorted(AudioRenderJob.objects.values_list("status", flat=True))
+
+    def test_payment_opens_jobs_once(self):
+        self.assertEqual(AudioRenderJob.objects.filter(order=self.order).count(), 4)
+        AudioRenderJob.objects.update(status=AudioRenderJob.Status.DONE)
+
+        # Ödenmiş order'ın sonraki kayıtları ses kuyruğuna sorgu atmaz
+        order = Order.objects.get(pk=self.order.pk)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            order.email = "ali@example.com"
+            order.save()
+        self.assertFalse([q for q in ctx.captured_queries if "core_audiorenderjob" in q["sql"]])
+        self.assertEqual(self.statuses(), [AudioRenderJob.Status.DONE] * 4)
+
+    def test_unchanged_plan_is_not_reset(self):
+        AudioRenderJob.objects.update(status=AudioRenderJob.Status.DONE)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.traveler.passport_no = "U123"
+            self.traveler.save()
+        self.assertEqual(self.statuses(), [AudioRenderJob.Status.DONE] * 4)
+
+    def test_name_change_resets_finished_jobs_only(self):
+        AudioRenderJob.objects.update(status=AudioRenderJob.Status.DONE)
+        processing = AudioRenderJob.objects.first()
+        AudioRenderJob.objects.filter(pk=processing.pk).update(status=AudioRenderJob.Status.PROCESSING)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.traveler.first_name = "Veli"
+            self.traveler.save()
+
+        processing.refresh_from_db()
+        self.assertEqual(processing.status, AudioRenderJob.Status.PROCESSING)
+        self.assertEqual(
+            AudioRenderJob.objects.filter(status=AudioRenderJob.Status.PENDING).count(), 3
+        )
+
+    def test_force_resets_all_but_processing(self):
+        AudioRenderJob.objects.update(status=AudioRenderJob.Status.DONE)
+        AudioRenderJob.objects.filter(pk=AudioRenderJob.objects.first().pk).update(
+            status=AudioRenderJob.Status.PROCESSING,
+        )
+        self.assertEqual(enqueue_order_audio([self.order.pk], force=True), 3)
+        self.assertEqual(enqueue_order_audio([self.order.pk]), 0)
+
+
+@override_settings(AUDIO_RENDER_IN_PROCESS=True, AUDIO_CACHE_SWEEP_INTERVAL=0)
+class RenderJobRecoveryTests(TestCase):
+    """Havuz process belleğinde; restart sonrası kaybolan işler geri toplanır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        tour = Tour.objects.create(title="Roma")
+        day = Day.objects.create(city=city, day_number=1, title="Gün 1")
+        activity = Activity.objects.create(title="A", city=city, audio_on_the_way="activities/audio/way.mp3")
+        cls.day_activity = DayActivity.objects.create(day=day, activity=activity, order=1)
+        cls.order = Order.objects.create(tour=tour, pax=1)
+
+    def job(self, status, started_seconds_ago=None):
+        started_at = None
+        if started_seconds_ago is not None:
+            started_at = timezone.now() - timedelta(seconds=started_seconds_ago)
+        return AudioRenderJob.objects.create(
+            order=self.order, day_activity=self.day_activity, audio_type="on-the-way",
+            status=status, started_at=started_at,
+        )
+
+    def request_render(self):
+        with mock.patch.object(audio.pool, "submit") as submit, \
+                self.captureOnCommitCallbacks(execute=True):
+            audio.request_render(self.order, self.day_activity, "on-the-way", "hash")
+        return submit
+
+    def test_lost_pending_job_is_resubmitted(self):
+        job = self.job(AudioRenderJob.Status.PENDING)
+        self.request_render().assert_called_once_with([job.pk])
+
+    def test_stuck_processing_job_is_reset(self):
+        job = self.job(AudioRenderJob.Status.PROCESSING, audio.STALE_PROCESSING_AFTER + 1)
+        self.request_render().assert_called_once_with([job.pk])
+        job.refresh_from_db()
+        self.assertEqual(job.status, AudioRenderJob.Status.PENDING)
+
+    def test_running_job_is_left_alone(self):
+        job = self.job(AudioRenderJob.Status.PROCESSING, 10)
+        self.request_render().assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, AudioRenderJob.Status.PROCESSING)
+
+    def test_pool_start_resubmits_outstanding_jobs(self):
+        stuck = self.job(AudioRenderJob.Status.PROCESSING, audio.STALE_PROCESSING_AFTER + 1)
+        lost = AudioRenderJob.objects.create(
+            order=self.order, day_activity=self.day_activity, audio_type="at-location",
+        )
+        pool = audio.RenderPool()
+        with mock.patch.object(audio, "_run_job_in_thread") as run:
+            pool.start()
+            pool._executor.shutdown(wait=True)
+
+        self.assertEqual(sorted(c.args[0] for c in run.call_args_list), sorted([stuck.pk, lost.pk]))
+
+
+class AudioCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        tour = Tour.objects.create(title="Roma")
+        day = Day.objects.create(city=city, day_number=1, title="Gün 1")
+        activity = Activity.objects.create(title="A", city=city)
+        cls.day_activity = DayActivity.objects.create(day=day, activity=activity, order=1)
+        cls.order = Order.objects.create(tour=tour, pax=1, is_paid=True)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(audio_cache.cache_dir())
+        cache.delete(audio_cache.SWEEP_LOCK)
+
+    def write(self, name, size=100, age_seconds=0):
+        path = os.path.join(audio_cache.cache_dir(), name)
+        with open(path, "wb") as fh:
+            fh.write(b"x" * size)
+        if age_seconds:
+            stamp = time.time() - age_seconds
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def entry(self, name, order=None, audio_type="on-the-way", accessed_seconds_ago=0, job=True):
+        order = order or self.order
+        self.write(name)
+        if job:
+            AudioRenderJob.objects.create(
+                order=order, day_activity=self.day_activity, audio_type=audio_type,
+                status=AudioRenderJob.Status.DONE, output_name=name,
+            )
+        return AudioCacheEntry.objects.create(
+            file_name=name, order=order, day_activity=self.day_activity, audio_type=audio_type,
+            cache_hash="h", size_bytes=100,
+            last_accessed_at=timezone.now() - timedelta(seconds=accessed_seconds_ago),
+        )
+
+    def on_disk(self):
+        return sorted(os.listdir(audio_cache.cache_dir()))
+
+    def test_budget_evicts_least_recently_used(self):
+        self.entry("old.mp3", audio_type="a", accessed_seconds_ago=300)
+        self.entry("mid.mp3", audio_type="b", accessed_seconds_ago=200)
+        self.entry("new.mp3", audio_type="c", accessed_seconds_ago=100)
+
+        self.assertEqual(audio_cache.enforce_budget(limit=250), (1, 100))
+        self.assertEqual(self.on_disk(), ["mid.mp3", "new.mp3"])
+        self.assertEqual(audio_cache.enforce_budget(limit=250), (0, 0))
+
+    def test_sweep_removes_orphans_and_adopts_valid_files(self):
+        unpaid = Order.objects.create(tour=self.order.tour, pax=1)
+        self.entry("valid.mp3")
+        self.entry("expired.mp3", order=unpaid)
+        self.entry("superseded.mp3", audio_type="at-location", job=False)
+        AudioRenderJob.objects.create(
+            order=self.order, day_activity=self.day_activity, audio_type="x",
+            status=AudioRenderJob.Status.DONE, output_name="unindexed.mp3",
+        )
+        self.write("unindexed.mp3")
+        self.write("stray.mp3")
+        self.write(audio_cache.TEMP_PREFIX + "old.mp3", age_seconds=audio_cache.TEMP_MAX_AGE + 60)
+        self.write(audio_cache.TEMP_PREFIX + "new.mp3")
+
+        result = audio_cache.sweep_orphans()
+
+        self.assertEqual(
+            {k: v for k, v in result.items() if v},
+            {"expired": 1, "superseded": 1, "untracked": 1, "adopted": 1, "temp": 1},
+        )
+        self.assertEqual(
+            self.on_disk(), [audio_cache.TEMP_PREFIX + "new.mp3", "unindexed.mp3", "valid.mp3"],
+        )
+        self.assertEqual(
+            sorted(AudioCacheEntry.objects.values_list("file_name", flat=True)),
+            ["unindexed.mp3", "valid.mp3"],
+        )
+
+    def test_hits_are_throttled_and_skip_seeks(self):
+        path = os.path.join(audio_cache.cache_dir(), "a.mp3")
+        entry = self.entry("a.mp3", accessed_seconds_ago=audio_cache.TOUCH_INTERVAL + 1)
+
+        with self.assertNumQueries(0):
+            audio_cache.record_hit(path, initial=False)
+        audio_cache.record_hit(path)
+        audio_cache.record_hit(path)
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.hits, 1)
+        self.assertLess(timezone.now() - entry.last_accessed_at, timedelta(seconds=5))
+
+    def test_initial_request_detection(self):
+        self.assertTrue(is_initial_request(None))
+        self.assertTrue(is_initial_request("bytes=0-"))
+        self.assertFalse(is_initial_request("bytes=1000-"))
+        self.assertFalse(is_initial_request("bytes=-500"))
+
+    def test_sweep_runs_once_per_interval(self):
+        self.write("stray.mp3")
+        self.assertEqual(audio_cache.run_sweep()["untracked"], 1)
+        self.assertIsNone(audio_cache.run_sweep())
+
+
+@override_settings(MEDIA_OFFLOAD="")
+class RangedFileResponseTests(SimpleTestCase):
+    ETAG = '"a-test"'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.data = bytes(range(256)) * 8  # 2048 bayt
+        fd, cls.path = tempfile.mkstemp(suffix=".mp3")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(cls.data)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+        super().tearDownClass()
+
+    def get(self, **headers):
+        request = RequestFactory().get("/audio/", headers=headers)
+        return ranged_file_response(request, self.path, "audio/mpeg", etag=self.ETAG)
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_parse_range(self):
+        size = 2048
+        self.assertEqual(parse_range("bytes=-500", size), (1548, 2047))
+        self.assertEqual(parse_range("bytes=-5000", size), (0, 2047))
+        self.assertEqual(parse_range("bytes=100-", size), (100, 2047))
+        self.assertEqual(parse_range("bytes=100-99999", size), (100, 2047))
+        self.assertEqual(parse_range("bytes=2048-", size), "unsatisfiable")
+        self.assertEqual(parse_range("bytes=-0", size), "unsatisfiable")
+        self.assertEqual(parse_range("bytes=10-5", size), "unsatisfiable")
+        self.assertIsNone(parse_range("bytes=0-1,5-9", size))
+        self.assertIsNone(parse_range("items=0-1", size))
+        self.assertIsNone(parse_range("bytes=-", size))
+
+    def test_full_response(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Length"], "2048")
+        self.assertEqual(response["ETag"], self.ETAG)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_suffix_range(self):
+        response = self.get(Range="bytes=-500")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1548-2047/2048")
+        self.assertEqual(response["Content-Length"], "500")
+        self.assertEqual(self.body(response), self.data[-500:])
+
+    def test_open_ended_range(self):
+        response = self.get(Range="bytes=1000-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 1000-2047/2048")
+        self.assertEqual(self.body(response), self.data[1000:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(Range="bytes=4096-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */2048")
+
+    def test_multi_range_falls_back_to_full_file(self):
+        response = self.get(Range="bytes=0-99,200-299")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+
+    def test_if_range_with_stale_etag_returns_full_file(self):
+        response = self.get(Range="bytes=0-99", **{"If-Range": '"a-old"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Range", response)
+        self.assertEqual(self.body(response), self.data)
+
+        response = self.get(Range="bytes=0-99", **{"If-Range": self.ETAG})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.data[:100])
+
+    def test_if_none_match(self):
+        response = self.get(**{"If-None-Match": f'W/"x", {self.ETAG}'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.ETAG)
+
+
+@override_settings(
+    LOCATION_MIN_INTERVAL=5, LOCATION_MIN_DISTANCE_M=15, LOCATION_HEARTBEAT=60,
+    LOCATION_FLUSH_INTERVAL=60, TRACK_FLUSH_INTERVAL=60,
+)
+class LocationThrottleTests(TestCase):
+    """Kısma durumu TRACKING_CACHE_ALIAS'ta; LocMem ile process başınadır."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tour = Tour.objects.create(title="Roma")
+        cls.order = Order.objects.create(tour=tour, pax=1, is_paid=True)
+
+    def setUp(self):
+        tracking._cache().clear()
+
+    def tearDown(self):
+        tracking.buffer.flush()
+        track_history.buffer.flush()
+
+    def fix(self, lat, lon=12.4964):
+        return tracking.LocationFix(
+            code=self.order.tracking_code, order_id=self.order.pk, name="Ali",
+            latitude=lat, longitude=lon,
+        )
+
+    def age_last_fix(self, seconds):
+        key = f"tracking:last:{self.order.tracking_code}"
+        ts, lat, lon = tracking._cache().get(key)
+        tracking._cache().set(key, (ts - seconds, lat, lon))
+
+    def stored_latitude(self):
+        return LiveLocation.objects.get(session_id=self.order.tracking_code).latitude
+
+    def test_first_fix_is_written_immediately(self):
+        result = tracking.ingest_location(self.fix(41.9028))
+        self.assertTrue(result.accepted and result.first_location)
+        self.assertEqual(self.stored_latitude(), 41.9028)
+
+    def test_fixes_inside_interval_are_dropped(self):
+        tracking.ingest_location(self.fix(41.9028))
+        # ~110 m ama 5 sn dolmadı
+        self.assertFalse(tracking.ingest_location(self.fix(41.9038)).accepted)
+
+    def test_small_moves_are_dropped_until_heartbeat(self):
+        tracking.ingest_location(self.fix(41.9028))
+        self.age_last_fix(10)
+        # ~5 m
+        self.assertFalse(tracking.ingest_location(self.fix(41.90285)).accepted)
+
+        self.age_last_fix(61)
+        self.assertTrue(tracking.ingest_location(self.fix(41.90285)).accepted)
+
+    def test_accepted_fixes_are_coalesced_until_flush(self):
+        tracking.ingest_location(self.fix(41.9028))
+        for step in (1, 2):
+            self.age_last_fix(10)
+            result = tracking.ingest_location(self.fix(41.9028 + 0.001 * step))
+            self.assertTrue(result.accepted)
+            self.assertFalse(result.first_location)
+
+        self.assertEqual(self.stored_latitude(), 41.9028)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(tracking.buffer.flush(), 1)
+        self.assertEqual(self.stored_latitude(), 41.9048)
+
+
+class TrackingSessionCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(title="Roma")
+        cls.other_tour = Tour.objects.create(title="Floransa")
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order = Order.objects.create(tour=self.tour, pax=2, tracking_enabled=True)
+        tracking._cache().clear()
+        self.code = self.order.tracking_code
+
+    def resolve(self, code=None):
+        return tracking.resolve_tracking_session(code or self.code)
+
+    def change(self, **fields):
+        order = Order.objects.get(pk=self.order.pk)
+        for name, value in fields.items():
+            setattr(order, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+    def test_session_is_cached(self):
+        self.resolve()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve().order_id, self.order.pk)
+
+    def test_payment_invalidates_session(self):
+        self.assertFalse(self.resolve().is_paid)
+        self.change(is_paid=True)
+        self.assertTrue(self.resolve().is_paid)
+
+    def test_tour_change_invalidates_session(self):
+        self.assertEqual(self.resolve().tour_title, "Roma")
+        self.change(tour=self.other_tour)
+        session = self.resolve()
+        self.assertEqual((session.tour_id, session.tour_title), (self.other_tour.pk, "Floransa"))
+
+    def test_code_change_invalidates_old_code(self):
+        self.resolve()
+        self.change(tracking_code="NEWCODE123")
+        self.assertIsNone(self.resolve())
+        self.assertEqual(self.resolve("NEWCODE123").order_id, self.order.pk)
+
+    def test_disabling_tracking_invalidates_session(self):
+        self.resolve()
+        self.change(tracking_enabled=False)
+        self.assertIsNone(self.resolve())
+
+
+@override_settings(LIVE_MAP_CURSOR_LAG=10, QUERY_BUDGET_STRICT=True)
+class LiveLocationFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("ops", "ops@example.com", "x")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.now = timezone.now()
+
+    def locate(self, code, seconds_ago):
+        LiveLocation.objects.create(session_id=code, name=code, latitude=41.0, longitude=29.0)
+        LiveLocation.objects.filter(session_id=code).update(
+            updated_at=self.now - timedelta(seconds=seconds_ago),
+        )
+
+    def poll(self, since=None, **params):
+        if since:
+            params["since"] = since
+        payload = self.client.get(reverse("live_locations_api"), params).json()
+        return [row[0] for row in payload["rows"]], payload["cursor"], payload["more"]
+
+    def test_cursor_pages_through_settled_rows(self):
+        for i, code in enumerate("ABCDE"):
+            self.locate(code, 100 - i)
+
+        cursor, pages = None, []
+        while True:
+            codes, cursor, more = self.poll(cursor, limit=2)
+            pages.append(codes)
+            if not more:
+                break
+
+        self.assertEqual(pages, [["A", "B"], ["C", "D"], ["E"]])
+        self.assertEqual(self.poll(cursor)[0], [])
+
+    def test_cursor_stays_behind_recent_rows(self):
+        self.locate("A", 60)
+        self.locate("B", 2)
+        codes, cursor, more = self.poll()
+        self.assertEqual(codes, ["A", "B"])
+        self.assertFalse(more)
+
+        # B'den önce damgalanıp sonra commit edilen flush
+        self.locate("C", 4)
+        codes, cursor, _ = self.poll(cursor)
+        self.assertEqual(codes, ["C", "B"])
+
+        # Satırlar oturunca imleç geçer
+        self.now -= timedelta(seconds=30)
+        LiveLocation.objects.exclude(session_id="A").update(updated_at=self.now)
+        codes, cursor, _ = self.poll(cursor)
+        self.assertEqual(codes, ["B", "C"])
+        self.assertEqual(self.poll(cursor)[0], [])
+
+    def test_page_of_only_recent_rows_does_not_loop(self):
+        for code in "ABC":
+            self.locate(code, 1)
+        codes, cursor, more = self.poll(limit=2)
+        self.assertEqual(codes, ["A", "B"])
+        self.assertIsNone(cursor)
+        self.assertFalse(more)
+
+
+@override_settings(EVENTS_ORIGIN="https://events.nomaya.co")
+class EventsServiceTests(TestCase):
+    """SSE ayrı ASGI servisinde; WSGI uygulaması akış açmaz."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("ops", "ops@example.com", "x")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_pages_open_streams_on_events_origin(self):
+        response = self.client.get(reverse("live_map"))
+        self.assertContains(response, '"https://events.nomaya.co/api/events/live-map/"')
+
+    def test_wsgi_refuses_streams_with_cors_for_trusted_origin(self):
+        response = self.client.get(
+            reverse("live_map_events"), headers={"Origin": "https://nomaya.co"},
+        )
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response["Access-Control-Allow-Origin"], "https://nomaya.co")
+        self.assertEqual(response["Access-Control-Allow-Credentials"], "true")
+
+        response = self.client.get(
+            reverse("live_map_events"), headers={"Origin": "https://evil.example"},
+        )
+        self.assertFalse(response.has_header("Access-Control-Allow-Origin"))
+
+
+class PostgresBrokerConninfoTests(SimpleTestCase):
+    def test_listener_uses_database_options(self):
+        from psycopg.conninfo import conninfo_to_dict
+
+        db = {
+            "NAME": "nomaya", "USER": "app", "PASSWORD": "s3cret", "HOST": "db.internal", "PORT": 5432,
+            "OPTIONS": {"sslmode": "require", "connect_timeout": 5, "server_side_binding": True},
+        }
+        with mock.patch.dict(settings.DATABASES, {"default": db}):
+            conninfo = conninfo_to_dict(events.PostgresBroker()._conninfo())
+        self.assertEqual(conninfo, {
+            "dbname": "nomaya", "user": "app", "password": "s3cret", "host": "db.internal",
+            "port": "5432", "sslmode": "require", "connect_timeout": "5",
+        })
+
+
+class TrackHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tour = Tour.objects.create(title="Roma")
+        cls.order = Order.objects.create(tour=tour, pax=1)
+
+    def point(self, ts, lat, lon=29.0):
+        return [ts, lat, lon, 5.0]
+
+    def local_ts(self, day, hour, minute=0):
+        moment = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+        return (moment + timedelta(hours=hour, minutes=minute)).timestamp()
+
+    def chunk(self, day, points, simplified=False):
+        return LocationTrackChunk.objects.create(
+            order=self.order, day=day, points=points, point_count=len(points),
+            started_at=timezone.now(), ended_at=timezone.now(), simplified=simplified,
+        )
+
+    def test_points_are_split_by_local_day(self):
+        day = timezone.localdate() - timedelta(days=1)
+        points = [self.point(self.local_ts(day, 23, 58), 41.0), self.point(self.local_ts(day, 24, 1), 41.001)]
+
+        self.assertEqual(track_history.write_points({self.order.pk: points}), 2)
+        self.assertEqual(
+            list(LocationTrackChunk.objects.order_by("day").values_list("day", "point_count")),
+            [(day, 1), (day + timedelta(days=1), 1)],
+        )
+
+    def test_douglas_peucker_drops_collinear_points_only(self):
+        # Kuzeye düz çizgi (~11 m aralık), ortada ~80 m doğuya sapma
+        line = [self.point(i, 41.0 + i * 0.0001) for i in range(10)]
+        self.assertEqual(track_history.douglas_peucker(line, 10), [line[0], line[-1]])
+
+        # Sapma ve ona dönüş noktaları kalır
+        line[5] = self.point(5, 41.0005, 29.001)
+        self.assertEqual(
+            track_history.douglas_peucker(line, 10), [line[i] for i in (0, 4, 5, 6, 9)],
+        )
+        self.assertEqual(track_history.douglas_peucker(line[:2], 10), line[:2])
+
+    def test_simplify_merges_old_days_into_one_chunk(self):
+        old = timezone.localdate() - timedelta(days=5)
+        today = timezone.localdate()
+        line = [self.point(i, 41.0 + i * 0.0001) for i in range(10)]
+        self.chunk(old, line[5:])
+        self.chunk(old, line[:5])
+        self.chunk(today, line)
+
+        self.assertEqual(track_history.simplify_days(older_than_days=2, epsilon_m=10), (1, 10, 2))
+        merged = LocationTrackChunk.objects.get(day=old)
+        self.assertTrue(merged.simplified)
+        self.assertEqual(merged.points, [line[0], line[-1]])
+        self.assertEqual(LocationTrackChunk.objects.get(day=today).point_count, 10)
+
+        # Sadeleştirilmiş gün tekrar işlenmez
+        self.assertEqual(track_history.simplify_days(older_than_days=2, epsilon_m=10), (0, 0, 0))
+
+    def test_prune_deletes_days_before_retention(self):
+        today = timezone.localdate()
+        for days in (11, 10, 9):
+            self.chunk(today - timedelta(days=days), [self.point(0, 41.0)])
+
+        self.assertEqual(track_history.prune(retention_days=10), 1)
+        self.assertEqual(
+            sorted(LocationTrackChunk.objects.values_list("day", flat=True)),
+            [today - timedelta(days=10), today - timedelta(days=9)],
+        )
+
+
+class LocationLogPruneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tour = Tour.objects.create(title="Roma")
+        cls.order = Order.objects.create(tour=tour, pax=1)
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def log(self, days_ago):
+        row = ActivityProgressLocationLog.objects.create(
+            order=self.order, tracking_code="ABC123", action=ActivityProgressLocationLog.Action.COMPLETED,
+        )
+        ActivityProgressLocationLog.objects.filter(pk=row.pk).update(
+            created_at=self.now - timedelta(days=days_ago),
+        )
+        return row.pk
+
+    def remaining(self):
+        return sorted(ActivityProgressLocationLog.objects.values_list("pk", flat=True))
+
+    def test_prune_deletes_rows_before_cutoff_in_batches(self):
+        old = [self.log(days) for days in (40, 35, 32, 31)]
+        kept = [self.log(days) for days in (29, 1)]
+
+        with mock.patch.object(time, "sleep") as sleep:
+            deleted = ActivityProgressLocationLog.prune(
+                self.now - timedelta(days=30), batch_size=2, pause=0.5,
+            )
+        self.assertEqual(deleted, len(old))
+        self.assertEqual(self.remaining(), kept)
+        # Tam dolu iki parça, ardından boş sorguyla biter
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(ActivityProgressLocationLog.prune(self.now, batch_size=2), len(kept))
+
+    def test_cap_cutoff_keeps_newest_rows(self):
+        self.assertIsNone(ActivityProgressLocationLog.cap_cutoff(3))
+        pks = [self.log(days) for days in (5, 4, 3, 2, 1)]
+
+        cutoff = ActivityProgressLocationLog.cap_cutoff(3)
+        self.assertEqual(cutoff, ActivityProgressLocationLog.objects.get(pk=pks[2]).created_at)
+        self.assertEqual(ActivityProgressLocationLog.prune(cutoff), 2)
+        self.assertEqual(self.remaining(), sorted(pks[2:]))
+        self.assertIsNone(ActivityProgressLocationLog.cap_cutoff(10))
+
+    @override_settings(LOCATION_LOG_RETENTION_DAYS=30)
+    def test_command_applies_retention_then_cap(self):
+        for days in (45, 31):
+            self.log(days)
+        kept = [self.log(days) for days in (4, 3, 2, 1)][1:]
+
+        out = io.StringIO()
+        call_command("prune_location_logs", "--max-rows", "3", "--batch-size", "1", stdout=out)
+        self.assertEqual(self.remaining(), sorted(kept))
+        self.assertIn("silinen: 3", out.getvalue())
+
+        # Sınırın altında ikinci çalıştırma bir şey silmez
+        call_command("prune_location_logs", "--max-rows", "3", stdout=io.StringIO())
+        self.assertEqual(self.remaining(), sorted(kept))
+
+
+class LocationBufferExitTests(SimpleTestCase):
+    def test_every_buffer_flushes_at_exit(self):
+        with mock.patch.object(atexit, "register") as register:
+            buffer = track_history.TrackBuffer()
+        register.assert_called_once_with(buffer.flush)
+
+
+class MilesLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "x")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "x")
+
+        country = Country.objects.create(name="Italy")
+        city = City.objects.create(name="Rome", country=country)
+        cls.tour = Tour.objects.create(title="Roma")
+        day = Day.objects.create(city=city, day_number=1, title="Gün 1")
+        TourDay.objects.create(tour=cls.tour, day=day, order=1)
+        activity = Activity.objects.create(title="Kolezyum", city=city, miles_reward=25)
+        cls.day_activity = DayActivity.objects.create(day=day, activity=activity, order=1)
+
+    def setUp(self):
+        self.order = Order.objects.create(tour=self.tour, pax=1, email="alice@example.com")
+        self.progress = ActivityProgress.objects.create(
+            order=self.order, day_activity=self.day_activity,
+        )
+
+    def set_status(self, status):
+        self.progress.status = status
+        self.progress.save()
+
+    def totals(self):
+        self.order.refresh_from_db()
+        miles = dict(UserProfile.objects.values_list("user__username", "miles"))
+        return self.order.earned_miles, miles.get("alice"), miles.get("bob")
+
+    def entries(self):
+        return list(
+            MilesLedgerEntry.objects.order_by("id")
+            .values_list("kind", "amount", "profile__user__username")
+        )
+
+    def test_earn_reverse_and_earn_again(self):
+        Status = ActivityProgress.Status
+        self.set_status(Status.COMPLETED)
+        self.assertEqual(self.totals(), (25, 25, None))
+
+        self.set_status(Status.PENDING)
+        self.assertEqual(self.totals(), (0, 0, None))
+
+        self.set_status(Status.COMPLETED)
+        self.assertEqual(self.totals(), (25, 25, None))
+        self.assertEqual(self.entries(), [
+            ("earn", 25, "alice"), ("reverse", -25, "alice"), ("earn", 25, "alice"),
+        ])
+
+    def test_reversal_goes_to_the_earning_profile(self):
+        self.set_status(ActivityProgress.Status.COMPLETED)
+        Order.objects.filter(pk=self.order.pk).update(email="bob@example.com")
+
+        self.set_status(ActivityProgress.Status.PENDING)
+        self.assertEqual(self.totals(), (0, 0, None))
+        self.assertEqual(self.entries()[-1], ("reverse", -25, "alice"))
+
+    def test_reversal_does_not_go_below_zero(self):
+        self.set_status(ActivityProgress.Status.COMPLETED)
+        # Miller harcanmış
+        UserProfile.objects.filter(user=self.alice).update(miles=10)
+
+        self.set_status(ActivityProgress.Status.PENDING)
+        self.assertEqual(self.totals(), (0, 0, None))
+
+    def test_sync_reads_status_from_the_locked_row(self):
+        stale = ActivityProgress.objects.get(pk=self.progress.pk)
+        self.set_status(ActivityProgress.Status.COMPLETED)
+
+        self.assertEqual(MilesLedger.sync(stale), 0)
+        self.assertEqual(self.totals(), (25, 25, None))
+
+    def test_sync_command_is_idempotent(self):
+        # post_save'siz yazılmış eski veri
+        ActivityProgress.objects.filter(pk=self.progress.pk).update(
+            status=ActivityProgress.Status.COMPLETED,
+        )
+
+        for _ in range(2):
+            call_command("sync_miles_ledger", stdout=io.StringIO())
+
+        self.assertEqual(self.totals(), (25, 25, None))
+        self.assertEqual(self.entries(), [("earn", 25, "alice")])
+
+
+class TravelerUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tour = Tour.objects.create(title="Roma")
+
+    def setUp(self):
+        self.order = Order.objects.create(tour=self.tour, pax=3)
+
+    def form(self, *names):
+        post = QueryDict(mutable=True)
+        for i, name in enumerate(names, 1):
+            first, last = name.split()
+            post[f"traveler[{i}][first_name]"] = first
+            post[f"traveler[{i}][last_name]"] = last
+            post[f"traveler[{i}][dob]"] = "01/02/1990"
+        return post
+
+    def submit(self, *names):
+        rows, errors = parse_travelers(self.form(*names), len(names))
+        self.assertEqual(errors, {})
+        with self.captureOnCommitCallbacks(execute=True):
+            return upsert_travelers(self.order, rows, len(names))
+
+    def travelers(self):
+        return list(self.order.travelers.values_list("index", "first_name"))
+
+    def test_double_submit_updates_in_place(self):
+        self.assertEqual(self.submit("Ali Veli", "Ayşe Kaya"), (2, 0))
+        self.assertEqual(self.submit("Ali Veli", "Ayşe Kaya"), (0, 0))
+        self.assertEqual(self.submit("Ali Veli", "Ayşe Demir"), (0, 1))
+        self.assertEqual(self.travelers(), [(1, "Ali"), (2, "Ayşe")])
+
+    def test_shrinking_the_list_removes_extra_travelers(self):
+        self.submit("Ali Veli", "Ayşe Kaya", "Can Er")
+        self.submit("Ali Veli", "Ayşe Kaya")
+        self.assertEqual(self.travelers(), [(1, "Ali"), (2, "Ayşe")])
+
+    def test_dob_is_the_only_required_field(self):
+        post = self.form("Ali Veli")
+        post["traveler[1][last_name]"] = ""
+        rows, errors = parse_travelers(post, 1)
+        self.assertEqual((len(rows), errors), (1, {}))
+
+        # Yarım gönderilmiş satır 500 değil, boş soyadı
+        del post["traveler[1][last_name]"]
+        rows, errors = parse_travelers(post, 1)
+        self.assertEqual((rows[0].last_name, errors), ("", {}))
+
+        post["traveler[1][dob]"] = "1990-02-01"
+        self.assertEqual(parse_travelers(post, 1)[1], {1: {"dob": "DoB must be DD/MM/YYYY"}})
+
+    def test_save_appends_when_index_is_missing(self):
+        self.submit("Ali Veli")
+        for first in ("Ayşe", "Can"):
+            Traveler.objects.create(order=self.order, first_name=first, last_name="X")
+        self.assertEqual(self.travelers(), [(1, "Ali"), (2, "Ayşe"), (3, "Can")])
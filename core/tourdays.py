@@ -0,0 +1,118 @@
+"""
+Tur günlerinin (TourDay) toplu sıralanması.
+
+TourDay her kaydedildiğinde/silindiğinde _tourday_changed turun öğe
+sayılarını baştan hesaplar; inline'da 20 günlük bir turu yeniden sıralamak
+satır başına bu hesabı tekrarlatır. reorder_tour_days yeni sırayı ve
+"Day X: ..." başlıklarını tek bulk_update ile yazar; inline kaydı
+suspend_tourday_signals içinde yapılır ve ardından tour_days_changed ile
+tur başına tek bir yeniden hesaplama tetiklenir.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import OuterRef
+
+from .catalog import count_subquery
+from .models import DayActivity, DayFlight, DayHotel, Tour, TourDay
+
+_state = threading.local()
+
+
+@contextmanager
+def suspend_tourday_signals():
+    """Blok içinde TourDay post_save/post_delete receiver'ları çalışmaz."""
+    depth = getattr(_state, "depth", 0)
+    _state.depth = depth + 1
+    try:
+        yield
+    finally:
+        _state.depth = depth
+
+
+def tourday_signals_suspended():
+    return getattr(_state, "depth", 0) > 0
+
+
+def _items_count(model):
+    # Aynı gün turda iki kez geçse de satırı bir kez say (Tour.days gibi)
+    return count_subquery(
+        model.objects.filter(day__tourday__tour_id=OuterRef("pk")),
+        "day__tourday__tour_id",
+        distinct=True,
+    )
+
+
+def recompute_item_counts(tour_ids):
+    """Tour.recompute_item_counts'un toplu karşılığı: tek UPDATE."""
+    tour_ids = set(tour_ids)
+    if not tour_ids:
+        return 0
+    return Tour.objects.filter(pk__in=tour_ids).update(
+        flights_count=_items_count(DayFlight),
+        hotels_count=_items_count(DayHotel),
+        activities_count=_items_count(DayActivity),
+    )
+
+
+def tour_days_changed(tour_ids):
+    """TourDay receiver'larının tur başına tek seferlik karşılığı."""
+    from . import catalog, itinerary, pricing
+
+    tour_ids = {tid for tid in tour_ids if tid}
+    recompute_item_counts(tour_ids)
+    pricing.mark_tours_dirty(tour_ids)
+    catalog.mark_tours_dirty(tour_ids)
+    itinerary.mark_stale("tours", tour_ids)
+
+
+def day_title(tour_day, position):
+    """Mevcut başlığın "Day X:" önekini position ile yeniler."""
+    title = (tour_day.title or "").strip()
+    if ":" in title:
+        base = title.split(":", 1)[1].strip()
+    elif title:
+        base = title
+    else:
+        day = tour_day.day
+        base = day.title or (day.city.name if day.city_id else "Program")
+    return f"Day {position}: {base}"
+
+
+def reorder_tour_days(tour, tour_day_ids=None):
+    """
+    Turun günlerini tour_day_ids sırasına (verilmezse mevcut order, id
+    sırasına) göre 1..n numaralar ve başlıkları yeniler. Listede olmayan
+    günler mevcut sıralarıyla sona eklenir. Dönüş: güncellenen satır sayısı.
+    """
+    with transaction.atomic():
+        # Aynı tur için eşzamanlı sıralamalar sırayla çalışsın
+        list(
+            Tour.objects.select_for_update().filter(pk=tour.pk)
+            .order_by().values_list("pk", flat=True)
+        )
+
+        tour_days = list(
+            TourDay.objects
+            .filter(tour_id=tour.pk)
+            .select_related("day__city")
+            .order_by("order", "id")
+        )
+        if tour_day_ids is not None:
+            rank = {int(pk): i for i, pk in enumerate(tour_day_ids)}
+            tour_days.sort(key=lambda td: rank.get(td.pk, len(rank)))
+
+        changed = []
+        for position, tour_day in enumerate(tour_days, start=1):
+            title = day_title(tour_day, position)
+            if tour_day.order != position or tour_day.title != title:
+                tour_day.order = position
+                tour_day.title = title
+                changed.append(tour_day)
+
+        if changed:
+            TourDay.objects.bulk_update(changed, ["order", "title"])
+        tour_days_changed([tour.pk])
+
+    return len(changed)
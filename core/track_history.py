@@ -0,0 +1,208 @@
+"""
+Konum geçmişi (LocationTrackChunk).
+
+Kabul edilen her nokta (tracking.ingest_location) order + yerel gün bazında
+parçalara yazılır. Noktalar process içinde TRACK_FLUSH_INTERVAL saniye
+biriktirilir ve order başına tek satır olarak bulk_create edilir; tablo nokta
+sayısıyla değil order x dakika ile büyür.
+
+- simplify_days: TRACK_SIMPLIFY_AFTER_DAYS günden eski order-günlerin
+  parçaları Douglas–Peucker ile tek parçaya indirilir.
+- prune: TRACK_RETENTION_DAYS günden eski parçalar gün indeksiyle tek
+  DELETE'te silinir.
+- day_path: admin tekrar oynatma için tek order-günün noktaları; sadece
+  (order, day) indeksini okur.
+"""
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LocationTrackChunk
+from .tracking import EARTH_RADIUS_M, LocationBuffer
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _as_datetime(epoch):
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+# ------------- YAZMA -------------
+
+class TrackBuffer(LocationBuffer):
+    """Order başına noktaları sırayla biriktirir."""
+
+    interval_setting = ("TRACK_FLUSH_INTERVAL", 60.0)
+
+    def _put(self, pending, fix):
+        accuracy = round(fix.accuracy, 1) if fix.accuracy is not None else None
+        pending.setdefault(fix.order_id, []).append(
+            [round(time.time(), 1), round(fix.latitude, 6), round(fix.longitude, 6), accuracy]
+        )
+
+    def _write(self, pending):
+        write_points(pending)
+
+
+def write_points(points_by_order):
+    """{order_id: [[ts, lat, lon, acc], ...]} -> yerel gün başına bir parça."""
+    chunks = []
+    for order_id, points in points_by_order.items():
+        by_day = {}
+        for point in points:
+            day = timezone.localdate(_as_datetime(point[0]))
+            by_day.setdefault(day, []).append(point)
+
+        for day, day_points in by_day.items():
+            chunks.append(LocationTrackChunk(
+                order_id=order_id,
+                day=day,
+                started_at=_as_datetime(day_points[0][0]),
+                ended_at=_as_datetime(day_points[-1][0]),
+                point_count=len(day_points),
+                points=day_points,
+            ))
+
+    LocationTrackChunk.objects.bulk_create(chunks)
+    return len(chunks)
+
+
+buffer = TrackBuffer()
+
+
+def record_fix(fix):
+    buffer.add(fix)
+
+
+# ------------- SADELEŞTİRME -------------
+
+def _segment_distance(p, a, b):
+    """Düzlemde p noktasının [a, b] doğru parçasına uzaklığı."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def douglas_peucker(points, epsilon_m):
+    """
+    [[ts, lat, lon, acc], ...] rotasını epsilon_m metre toleransla sadeleştirir.
+    Bir gün birkaç km içinde kaldığı için eşdikdörtgen izdüşüm yeterli.
+    """
+    if len(points) < 3:
+        return list(points)
+
+    lat0 = math.radians(sum(p[1] for p in points) / len(points))
+    xy = [
+        (math.radians(p[2]) * EARTH_RADIUS_M * math.cos(lat0), math.radians(p[1]) * EARTH_RADIUS_M)
+        for p in points
+    ]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        farthest, index = 0.0, None
+        for i in range(start + 1, end):
+            distance = _segment_distance(xy[i], xy[start], xy[end])
+            if distance > farthest:
+                farthest, index = distance, i
+        if index is not None and farthest > epsilon_m:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_order_day(order_id, day, epsilon_m):
+    """Order-günün parçalarını tek sadeleştirilmiş parçaya indirir. Dönüş: (önce, sonra)."""
+    with transaction.atomic():
+        chunks = list(
+            LocationTrackChunk.objects
+            .select_for_update()
+            .filter(order_id=order_id, day=day)
+            .order_by("started_at", "id")
+        )
+        if not chunks:
+            return 0, 0
+
+        points = sorted((p for chunk in chunks for p in chunk.points), key=lambda p: p[0])
+        simplified = douglas_peucker(points, epsilon_m)
+
+        LocationTrackChunk.objects.filter(pk__in=[c.pk for c in chunks]).delete()
+        if simplified:
+            LocationTrackChunk.objects.create(
+                order_id=order_id,
+                day=day,
+                started_at=_as_datetime(simplified[0][0]),
+                ended_at=_as_datetime(simplified[-1][0]),
+                point_count=len(simplified),
+                points=simplified,
+                simplified=True,
+            )
+    return len(points), len(simplified)
+
+
+def simplify_days(older_than_days=None, epsilon_m=None, limit=500):
+    """Eski order-günleri sadeleştirir. Dönüş: (order-gün, nokta önce, nokta sonra)."""
+    older_than_days = older_than_days if older_than_days is not None else _setting("TRACK_SIMPLIFY_AFTER_DAYS", 2)
+    epsilon_m = epsilon_m if epsilon_m is not None else _setting("TRACK_SIMPLIFY_EPSILON_M", 10)
+    cutoff = timezone.localdate() - timedelta(days=older_than_days)
+
+    groups = list(
+        LocationTrackChunk.objects
+        .filter(day__lt=cutoff, simplified=False)
+        .order_by()
+        .values_list("order_id", "day")
+        .distinct()[:limit]
+    )
+
+    before = after = 0
+    for order_id, day in groups:
+        b, a = simplify_order_day(order_id, day, epsilon_m)
+        before += b
+        after += a
+    return len(groups), before, after
+
+
+# ------------- BUDAMA -------------
+
+def prune(retention_days=None):
+    """Saklama süresinden eski parçaları tek DELETE ile siler. Dönüş: silinen parça."""
+    retention_days = retention_days if retention_days is not None else _setting("TRACK_RETENTION_DAYS", 180)
+    cutoff = timezone.localdate() - timedelta(days=retention_days)
+    deleted, _ = LocationTrackChunk.objects.filter(day__lt=cutoff).delete()
+    return deleted
+
+
+# ------------- TEKRAR OYNATMA -------------
+
+def track_days(order_id):
+    return list(
+        LocationTrackChunk.objects
+        .filter(order_id=order_id)
+        .order_by("-day")
+        .values_list("day", flat=True)
+        .distinct()
+    )
+
+
+def day_path(order_id, day):
+    """Order-günün noktaları zaman sırasıyla: [[ts, lat, lon, acc], ...]"""
+    chunks = (
+        LocationTrackChunk.objects
+        .filter(order_id=order_id, day=day)
+        .order_by("started_at", "id")
+        .values_list("points", flat=True)
+    )
+    return sorted((p for points in chunks for p in points), key=lambda p: p[0])
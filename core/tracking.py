@@ -0,0 +1,422 @@
+"""
+Canlı konum alımı (update_location).
+
+watchPosition saniyede birkaç kez konum gönderebilir. Her isteği doğrudan
+LiveLocation'a yazmak yerine:
+
+- tracking code başına son kabul edilen nokta Django cache'inde tutulur;
+  LOCATION_MIN_INTERVAL saniyeden sık ya da LOCATION_MIN_DISTANCE_M metreden
+  az hareket eden noktalar atlanır (LOCATION_HEARTBEAT saniyede bir yine de
+  kabul edilir),
+- kabul edilen noktalar process içi tamponda birikir; tampon
+  LOCATION_FLUSH_INTERVAL saniyede bir tek bulk upsert ile LiveLocation'a,
+  tek UPDATE ile Order.tracking_last_seen'e yazılır.
+
+Bir kodun ilk noktası beklemeden yazılır (tur başladı mesajı buna bağlı).
+
+Kısma durumu TRACKING_CACHE_ALIAS cache'indedir. Varsayılan LocMem
+process'e özeldir: birden fazla worker varken kısma ve birleştirme worker
+başına yapılır, aynı cihazın istekleri farklı worker'lara düşerse kabul
+edilen nokta sayısı worker sayısıyla çarpılabilir. Order başına kısma için
+alias paylaşımlı bir backend'e (Redis vb.) yönlendirilmelidir; tampon her
+durumda process içidir.
+
+Tracker API'leri (verify, konum, bugünkü plan, itinerary, ses) kodu her
+istekte Order'a sormak yerine resolve_tracking_session ile çözer: doğrulama
+için gereken alanlar TRACKING_SESSION_TTL saniye cache'lenir, Order
+kaydedilince silinir.
+
+Canlı harita (live_locations_api) tüm tabloyu değil, imleçten (since) sonra
+güncellenen, tazelik penceresi ve bbox içindeki satırları dizi olarak alır.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from . import events
+from .batching import CommitBatch
+from .models import LiveLocation, Order
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting("TRACKING_CACHE_ALIAS", "default")]
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """İki nokta arası haversine mesafesi (metre)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+@dataclass(frozen=True)
+class LocationFix:
+    code: str
+    order_id: int
+    name: str
+    latitude: float
+    longitude: float
+    accuracy: float = None
+    user_agent: str = ""
+    ip_address: str = None
+
+
+@dataclass(frozen=True)
+class IngestResult:
+    accepted: bool
+    first_location: bool = False
+
+
+# ------------- OTURUM -------------
+
+@dataclass(frozen=True)
+class TrackingSession:
+    """Tracking code'un doğrulanmış özeti; Order'ın yerine cache'lenir."""
+    code: str
+    order_id: int
+    tour_id: int
+    tour_title: str
+    email: str
+    pax: int
+    is_paid: bool
+    start_date: date
+    end_date: date
+    expires_at: datetime
+    tracking_started_at: datetime
+    hide_flights: bool
+    hide_transfers: bool
+    hide_hotels: bool
+
+    def is_expired(self, now=None):
+        if self.expires_at is None:
+            return False
+        return (now or timezone.now()) > self.expires_at
+
+    def get_order(self):
+        """Yazma / mesaj gereken yollar için Order'ın kendisi."""
+        return Order.objects.select_related("tour").get(pk=self.order_id)
+
+
+SESSION_FIELDS = {
+    "order_id": "id",
+    "tour_id": "tour_id",
+    "tour_title": "tour__title",
+    "email": "email",
+    "pax": "pax",
+    "is_paid": "is_paid",
+    "start_date": "start_date",
+    "end_date": "end_date",
+    "expires_at": "tracking_code_expires_at",
+    "tracking_started_at": "tracking_started_at",
+    "hide_flights": "hide_flights",
+    "hide_transfers": "hide_transfers",
+    "hide_hotels": "hide_hotels",
+}
+
+
+def _session_key(code):
+    return f"tracking:session:{code}"
+
+
+def resolve_tracking_session(code):
+    """
+    tracking_enabled order'ı koda göre çözer; yoksa None. is_paid ve süre
+    kontrolü her endpoint'in kendi yanıtını koruması için çağırana bırakılır.
+    """
+    code = str(code or "").strip().upper()
+    if not code:
+        return None
+
+    cache = _cache()
+    session = cache.get(_session_key(code))
+    if session is not None:
+        return session
+
+    row = (
+        Order.objects
+        .filter(tracking_code=code, tracking_enabled=True)
+        .values(*SESSION_FIELDS.values())
+        .first()
+    )
+    if row is None:
+        return None
+
+    session = TrackingSession(
+        code=code,
+        **{attr: row[field] for attr, field in SESSION_FIELDS.items()},
+    )
+    cache.set(_session_key(code), session, _setting("TRACKING_SESSION_TTL", 30))
+    return session
+
+
+def _drop_sessions(codes):
+    _cache().delete_many([_session_key(code) for code in codes])
+
+
+_session_batch = CommitBatch(_drop_sessions, "codes")
+
+
+def forget_session(code):
+    """
+    Order kaydedilince çağrılır. Hemen silinir; commit'ten önce başka bir
+    isteğin eski veriyi tekrar cache'lemesine karşı commit sonrası bir kez daha.
+    Kodu değişen order için receiver eski kodu da ayrıca düşürür.
+    """
+    if not code:
+        return
+    _drop_sessions([code])
+    _session_batch.add("codes", [code])
+
+
+# ------------- TAMPON -------------
+
+class LocationBuffer:
+    """
+    Kod başına en son kabul edilen noktayı tutar, zamanlayıcıyla toplu yazar.
+    Her örnek process kapanırken kalanı yazar.
+    """
+
+    interval_setting = ("LOCATION_FLUSH_INTERVAL", 2.0)
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def _put(self, pending, fix):
+        pending[fix.code] = fix
+
+    def _write(self, pending):
+        write_fixes(pending.values())
+
+    def add(self, fix):
+        with self._lock:
+            self._put(self._pending, fix)
+            if self._timer is None:
+                self._timer = threading.Timer(
+                    _setting(*self.interval_setting), self._flush_in_thread,
+                )
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("live location flush failed")
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending:
+            self._write(pending)
+        return len(pending)
+
+
+def write_fixes(fixes):
+    """Noktaları tek upsert ile LiveLocation'a, son görülmeyi tek UPDATE ile Order'a yazar."""
+    fixes = list(fixes)
+    # updated_at yazma anıdır; canlı harita imleci (since) buna dayanır
+    now = timezone.now()
+
+    LiveLocation.objects.bulk_create(
+        [
+            LiveLocation(
+                session_id=fix.code,
+                name=fix.name,
+                latitude=fix.latitude,
+                longitude=fix.longitude,
+                accuracy=fix.accuracy,
+                user_agent=fix.user_agent,
+                ip_address=fix.ip_address,
+                updated_at=now,
+            )
+            for fix in fixes
+        ],
+        update_conflicts=True,
+        unique_fields=["session_id"],
+        update_fields=[
+            "name", "latitude", "longitude", "accuracy",
+            "user_agent", "ip_address", "updated_at",
+        ],
+    )
+    Order.objects.filter(pk__in={fix.order_id for fix in fixes}).update(tracking_last_seen=now)
+
+    rows = [
+        compact_row(fix.code, fix.name, fix.latitude, fix.longitude, fix.accuracy, now)
+        for fix in fixes
+    ]
+    for start in range(0, len(rows), EVENT_CHUNK):
+        events.publish_on_commit(
+            events.LOCATIONS, "location",
+            {"fields": FEED_FIELDS, "rows": rows[start:start + EVENT_CHUNK]},
+        )
+
+
+buffer = LocationBuffer()
+
+
+# ------------- ALIM -------------
+
+def _should_accept(last, fix, now_ts):
+    if last is None:
+        return True
+    last_ts, last_lat, last_lon = last
+    elapsed = now_ts - last_ts
+
+    if elapsed >= _setting("LOCATION_HEARTBEAT", 60):
+        return True
+    if elapsed < _setting("LOCATION_MIN_INTERVAL", 5):
+        return False
+    moved = distance_m(last_lat, last_lon, fix.latitude, fix.longitude)
+    return moved >= _setting("LOCATION_MIN_DISTANCE_M", 15)
+
+
+def ingest_location(fix):
+    """
+    Noktayı eşiklere göre kabul eder ya da atlar. Kabul edilen nokta tampona
+    girer; kodun ilk noktasıysa hemen yazılır.
+    """
+    cache = _cache()
+    state_key = f"tracking:last:{fix.code}"
+    now_ts = time.time()
+
+    if not _should_accept(cache.get(state_key), fix, now_ts):
+        return IngestResult(accepted=False)
+
+    cache.set(state_key, (now_ts, fix.latitude, fix.longitude), _setting("LOCATION_HEARTBEAT", 60) * 10)
+
+    seen_key = f"tracking:seen:{fix.code}"
+    first_location = False
+    if not cache.get(seen_key):
+        first_location = not LiveLocation.objects.filter(session_id=fix.code).exists()
+        cache.set(seen_key, True, None)
+
+    if first_location:
+        write_fixes([fix])
+    else:
+        buffer.add(fix)
+
+    from .track_history import record_fix
+    record_fix(fix)
+
+    return IngestResult(accepted=True, first_location=first_location)
+
+
+# ------------- CANLI HARİTA -------------
+
+FEED_FIELDS = ("session_id", "name", "latitude", "longitude", "accuracy", "updated_at")
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# SSE olayı başına satır; pg_notify payload sınırının altında kalır
+EVENT_CHUNK = 50
+
+
+def compact_row(session_id, name, latitude, longitude, accuracy, updated_at):
+    """FEED_FIELDS sırasında dizi; updated_at epoch saniyesi."""
+    return [
+        session_id or "Unknown",
+        name,
+        round(latitude, 6),
+        round(longitude, 6),
+        round(accuracy, 1) if accuracy is not None else None,
+        int(updated_at.timestamp()),
+    ]
+
+
+def to_cursor(updated_at, pk):
+    """
+    "<updated_at mikro saniye>-<id>" imleci. Aynı flush'ta yazılan satırların
+    updated_at'i aynı olduğundan sıra id ile tamamlanır.
+    """
+    return f"{(updated_at - EPOCH) // timedelta(microseconds=1)}-{pk}"
+
+
+def parse_cursor(value):
+    """İmleci (updated_at, id) olarak çözer. Hatalıysa ValueError."""
+    micros, pk = value.split("-")
+    return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+
+
+def parse_bbox(value):
+    """'minLon,minLat,maxLon,maxLat' -> 4'lü tuple. Hatalıysa ValueError."""
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def feed_queryset(since=None, max_age=None, bbox=None):
+    qs = LiveLocation.objects.all()
+    if max_age:
+        qs = qs.filter(updated_at__gte=timezone.now() - timedelta(seconds=max_age))
+    if since is not None:
+        updated_at, pk = since
+        qs = qs.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        qs = qs.filter(
+            longitude__gte=min_lon, longitude__lte=max_lon,
+            latitude__gte=min_lat, latitude__lte=max_lat,
+        )
+    return qs
+
+
+def feed_version(qs):
+    """ETag için (son güncelleme, en büyük id, satır sayısı); satırlar okunmaz."""
+    agg = qs.aggregate(latest=Max("updated_at"), last_id=Max("id"), count=Count("id"))
+    return agg["latest"], agg["last_id"], agg["count"]
+
+
+def settled_horizon():
+    """
+    updated_at commit'ten önce damgalanır; çakışan iki flush'tan erken
+    damgalananı sonra commit edebilir. Bu andan eski satırların hepsi
+    commit edilmiş sayılır. Sorgudan önce alınmalı.
+    """
+    return timezone.now() - timedelta(seconds=_setting("LIVE_MAP_CURSOR_LAG", 10))
+
+
+def feed_rows(qs, limit, settled_before=None):
+    """
+    updated_at sırasıyla en fazla limit satır. Dönüş: (rows, cursor, more).
+
+    İmleç settled_before'dan yeni satırların üstüne çıkmaz: o satırlar sonraki
+    istekte yeniden döner, istemci session_id ile tekilleştirir. Sayfada
+    oturmuş satır yoksa cursor None (istemci eskisini korur) ve more False.
+    """
+    rows = list(qs.order_by("updated_at", "id").values_list("id", *FEED_FIELDS)[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    settled = [
+        row for row in rows
+        if settled_before is None or row[-1] <= settled_before
+    ]
+    cursor = to_cursor(settled[-1][-1], settled[-1][0]) if settled else None
+    return [compact_row(*row[1:]) for row in rows], cursor, more and bool(settled)
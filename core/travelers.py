@@ -0,0 +1,125 @@
+"""
+Rezervasyon 2. adımı: yolcu bilgilerinin toplu kaydı.
+
+parse_travelers POST'u tek geçişte traveler[i][alan] satırlarına ayırır ve
+tüm satırları yazmadan önce doğrular; hatalar satır bazında döner.
+upsert_travelers satırları (order, index) anahtarıyla tek transaction'da
+bulk_create / bulk_update eder. Form iki kez gönderilse de aynı index'teki
+yolcu güncellenir, kopya oluşmaz; yolcu sayısı azaldıysa fazlası silinir.
+"""
+import re
+from dataclasses import dataclass, fields as dataclass_fields
+from datetime import date, datetime
+from typing import Optional
+
+from django.db import transaction
+
+from .models import Order, Traveler
+
+TRAVELER_KEY = re.compile(r"^traveler\[(\d+)\]\[(\w+)\]$")
+DDMMYYYY = re.compile(r"^(0[1-9]|[12][0-9]|3[01])/(0[1-9]|1[0-2])/[0-9]{4}$")
+
+
+@dataclass(frozen=True)
+class TravelerRow:
+    index: int
+    title: str
+    first_name: str
+    last_name: str
+    passport_no: str
+    phone: str
+    dob: Optional[date]
+
+
+WRITE_FIELDS = [f.name for f in dataclass_fields(TravelerRow) if f.name != "index"]
+
+
+def parse_travelers(post, count):
+    """
+    POST -> ([TravelerRow], {index: {alan: mesaj}}).
+    Formda olmayan index'ler atlanır; hata varsa hiçbir satır yazılmamalı.
+    """
+    raw = {}
+    for key in post:
+        match = TRAVELER_KEY.match(key)
+        if match:
+            index, field = int(match.group(1)), match.group(2)
+            if 1 <= index <= count:
+                raw.setdefault(index, {})[field] = (post.get(key) or "").strip()
+
+    rows, errors = [], {}
+    for index in sorted(raw):
+        data = raw[index]
+        if "first_name" not in data:
+            continue
+
+        row_errors = {}
+        dob = None
+        dob_str = data.get("dob", "")
+        if DDMMYYYY.match(dob_str):
+            try:
+                dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
+            except ValueError:
+                row_errors["dob"] = "DoB must be DD/MM/YYYY"
+        else:
+            row_errors["dob"] = "DoB must be DD/MM/YYYY"
+
+        if row_errors:
+            errors[index] = row_errors
+            continue
+
+        rows.append(TravelerRow(
+            index=index,
+            title=data.get("title", "")[:10],
+            first_name=data["first_name"][:80],
+            last_name=data.get("last_name", "")[:80],
+            passport_no=data.get("passport_no", "")[:40],
+            phone=data.get("phone", "")[:32],
+            dob=dob,
+        ))
+
+    return rows, errors
+
+
+def upsert_travelers(order, rows, count=None):
+    """
+    Satırları (order, index) ile yazar; count verilirse index'i count'tan
+    büyük yolcular silinir. Dönüş: (oluşturulan, güncellenen).
+    """
+    if not rows and count is None:
+        return 0, 0
+
+    with transaction.atomic():
+        # Aynı order için eşzamanlı gönderimler sırayla çalışsın
+        list(Order.objects.select_for_update().filter(pk=order.pk).values_list("pk", flat=True))
+
+        existing = {
+            traveler.index: traveler
+            for traveler in Traveler.objects.filter(order=order, index__in=[r.index for r in rows])
+        }
+
+        to_create, to_update = [], []
+        for row in rows:
+            values = {name: getattr(row, name) for name in WRITE_FIELDS}
+            traveler = existing.get(row.index)
+            if traveler is None:
+                to_create.append(Traveler(order=order, index=row.index, **values))
+            elif any(getattr(traveler, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(traveler, name, value)
+                to_update.append(traveler)
+
+        # Silme post_delete gönderir (ses girişi orada yenilenir)
+        if count is not None:
+            Traveler.objects.filter(order=order, index__gt=count).delete()
+
+        Traveler.objects.bulk_create(to_create)
+        if to_update:
+            Traveler.objects.bulk_update(to_update, WRITE_FIELDS)
+
+        # bulk işlemler post_save göndermez; kişisel ses girişi yenilensin
+        if to_create or to_update:
+            from .audio import mark_orders_changed
+            mark_orders_changed([order.pk])
+
+    return len(to_create), len(to_update)
@@ -4,7 +4,7 @@ from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
-from . import views
+from . import sse, views
 
 urlpatterns = [
     path("healthz/", views.health_check, name="health_check"),
@@ -56,6 +56,8 @@ urlpatterns = [
     path("api/update-location/", views.update_location, name="update_location"),
     path("live-map/", views.live_map, name="live_map"),
     path("api/live-locations/", views.live_locations_api, name="live_locations_api"),
+    path("api/events/live-map/", sse.live_map_events, name="live_map_events"),
+    path("api/events/<str:code>/", sse.tracker_events, name="tracker_events"),
 
     path(
         "orders/<uuid:public_id>/stripe/",
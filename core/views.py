@@ -63,6 +63,7 @@ from .models import (
     DayTransfer, DayHotel, DayActivity
 )
 from .utils import _parse_dates_param  # eğer ayrı utils'te tanımlıysa
+from .itinerary import get_itinerary, itinerary_query_header
 from django.utils import translation
 from .models import ActivityProgressLocationLog
 import os
@@ -86,129 +87,26 @@ def health_check(request):
     return JsonResponse({"status": "ok"})
 
 import hashlib
-import os
-import random
-import subprocess
-import tempfile
-
-from django.conf import settings
-
-from .models import IntroAudioLibrary
-
-
-def normalize_intro_name(name):
-    """
-    'Alican' -> 'alican'
-    'Alican Yalçın' -> 'alican'
-    '  ALICAN  ' -> 'alican'
-    """
-    normalized = (name or "").strip().lower()
-
-    if not normalized:
-        return ""
-
-    return normalized.split()[0]
-
-
-def get_current_traveler_intro(order):
-    """
-    Her ses isteğinde order'ın güncel ilk traveler kaydını okur.
-
-    Admin panelinden traveler adı değiştirildiğinde,
-    herhangi bir manuel güncelleme olmadan yeni isim kullanılır.
-    """
-    traveler = (
-        order.travelers
-        .exclude(first_name="")
-        .order_by("id")
-        .first()
-    )
-
-    if not traveler:
-        return None
-
-    name = normalize_intro_name(traveler.first_name)
-
-    if not name:
-        return None
-
-    intro_items = list(
-        IntroAudioLibrary.objects.filter(
-            name__iexact=name,
-            is_active=True,
-        )
-        .exclude(audio="")
-        .order_by("id")
-    )
-
-    if not intro_items:
-        return None
-
-    return random.choice(intro_items)
+from django.http import HttpResponseNotModified
+from .audio import resolve_audio_source
+from .catalog import refresh_missing
+from .streaming import etag_matches, is_initial_request, ranged_file_response
+from .middleware import query_budget
+from .progress import ProgressRepository
+from .travelers import parse_travelers, upsert_travelers
+from .tracking import (
+    FEED_FIELDS, feed_queryset, feed_rows, feed_version, parse_bbox, parse_cursor,
+    resolve_tracking_session, settled_horizon,
+)
 
 
-def get_local_audio_path(audio_field):
+def send_telegram_message(message: str, activity_progress=None) -> bool:
     """
-    Local FileSystemStorage kullanılan projelerde FileField yolunu döndürür.
+    Mesajı NotificationOutbox'a yazar; gönderimi process_notifications
+    worker'ı yapar. En az bir alıcı tanımlıysa True döner.
     """
-    if not audio_field:
-        return None
-
-    try:
-        path = audio_field.path
-    except (AttributeError, NotImplementedError, ValueError):
-        return None
-
-    if not path or not os.path.isfile(path):
-        return None
-
-    return path
-
-def send_telegram_message(message: str) -> bool:
-    recipients = [
-        (
-            getattr(settings, "TELEGRAM_BOT_TOKEN", "") or "",
-            getattr(settings, "TELEGRAM_CHAT_ID", "") or "",
-        ),
-        (
-            getattr(settings, "TELEGRAM_BOT_TOKEN_2", "") or "",
-            getattr(settings, "TELEGRAM_CHAT_ID_2", "") or "",
-        ),
-    ]
-
-    at_least_one_sent = False
-
-    for token, chat_id in recipients:
-        if not token or not chat_id:
-            continue
-
-        try:
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-
-            payload = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "HTML",
-                "disable_web_page_preview": True,
-            }
-
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(payload).encode("utf-8"),
-                headers={"Content-Type": "application/json"},
-                method="POST",
-            )
-
-            urllib.request.urlopen(req, timeout=5)
-            at_least_one_sent = True
-
-        except Exception as exc:
-            print(
-                f"Telegram mesajı gönderilemedi. "
-                f"Chat ID: {chat_id}, Hata: {exc}"
-            )
-
-    return at_least_one_sent
+    from .notifications import enqueue_telegram
+    return enqueue_telegram(message, activity_progress=activity_progress)
 
 def tg(v):
     return html.escape(str(v or "-"))
@@ -241,7 +139,6 @@ def order_telegram_text(order, title="🆕 Yeni Order Oluştu"):
 from django.utils import translation
 from django.db.models import Prefetch
 import json
-import urllib.request
 import html
 from django.conf import settings
 from django.db import IntegrityError
@@ -265,34 +162,8 @@ def tour_booking_detail_public(request, public_id):
     except (TypeError, ValueError):
         start_day_number = 1
 
-    # Günler + bağlı kayıtlar
-    tour_days = (
-        TourDay.objects.filter(tour=tour)
-        .select_related("day", "day__city", "day__city__country")
-        .prefetch_related(
-            Prefetch("day__images", queryset=DayImage.objects.order_by("order", "id")),
-            Prefetch("day__dayflight_set", queryset=DayFlight.objects.select_related(
-                "flight", "flight__airline", "flight__origin", "flight__destination"
-            ).order_by("order", "id")),
-            Prefetch("day__daytransfer_set", queryset=DayTransfer.objects.select_related(
-                "transfer", "transfer__airport", "transfer__hotel", "transfer__hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayhotel_set", queryset=DayHotel.objects.select_related(
-                "hotel", "hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayactivity_set", queryset=DayActivity.objects.select_related(
-                "activity"
-            ).order_by("order", "id")),
-        )
-        .order_by("order", "id")
-    )
-
-    # Varlık bayrakları
-    day_ids = list(tour_days.values_list("day_id", flat=True))
-    has_flights    = DayFlight.objects.filter(day_id__in=day_ids).exists()
-    has_transfers  = DayTransfer.objects.filter(day_id__in=day_ids).exists()
-    has_hotels     = DayHotel.objects.filter(day_id__in=day_ids).exists()
-    has_activities = DayActivity.objects.filter(day_id__in=day_ids).exists()
+    # Günler + bağlı kayıtlar (önbellekli, sabit sayıda sorgu)
+    itinerary = get_itinerary(tour)
 
     # Step 2’de yolcu kartları için [1..pax]
     traveler_indices = range(1, (order.pax or 1) + 1)
@@ -300,21 +171,23 @@ def tour_booking_detail_public(request, public_id):
     ctx = {
         "order": order,
         "tour": tour,
-        "tour_days": tour_days,
+        "tour_days": itinerary.days,
+        "itinerary": itinerary,
         "start_day_number": start_day_number,
         "pax": order.pax,
         "per_person": (order.total_price / order.pax) if order.pax else order.total_price,
         "total": order.total_price,
-        "has_flights": has_flights,
-        "has_transfers": has_transfers,
-        "has_hotels": has_hotels,
-        "has_activities": has_activities,
+        "has_flights": itinerary.has_flights,
+        "has_transfers": itinerary.has_transfers,
+        "has_hotels": itinerary.has_hotels,
+        "has_activities": itinerary.has_activities,
         "traveler_indices": traveler_indices,
     }
 
     # Tarih/ay adları Türkçe görünsün
     with translation.override("tr"):
-        return render(request, "tour-booking.html", ctx)
+        response = render(request, "tour-booking.html", ctx)
+    return itinerary_query_header(response, itinerary)
 
 @require_http_methods(["POST"])
 def save_travelers_public(request, public_id):
@@ -324,42 +197,19 @@ def save_travelers_public(request, public_id):
     # start_day korunacak
     start_day = request.GET.get("start_day") or request.POST.get("start_day")
 
-    ddmmyyyy = re.compile(r"^(0[1-9]|[12][0-9]|3[01])/(0[1-9]|1[0-2])/[0-9]{4}$")
-
-    created = []
-    for i in range(1, count + 1):
-        data = request.POST.get(f"traveler[{i}][first_name]")
-        if data is None:
-            continue
-
-        title = (request.POST.get(f"traveler[{i}][title]") or "").strip()
-        first_name = (request.POST.get(f"traveler[{i}][first_name]") or "").strip()
-        last_name  = (request.POST.get(f"traveler[{i}][last_name]") or "").strip()
-        passport   = (request.POST.get(f"traveler[{i}][passport_no]") or "").strip()
-        phone      = (request.POST.get(f"traveler[{i}][phone]") or "").strip()
-        dob_str    = (request.POST.get(f"traveler[{i}][dob]") or "").strip()
+    rows, errors = parse_travelers(request.POST, count)
 
-        if not ddmmyyyy.match(dob_str):
-            messages.error(request, f"Traveler {i}: DoB must be DD/MM/YYYY")
-            q = {"step": "2"}
-            if start_day: q["start_day"] = start_day
-            return redirect(reverse("tour_booking_detail_public", args=[order.public_id]) + "?" + urlencode(q))
+    if errors:
+        for i, row_errors in sorted(errors.items()):
+            for message in row_errors.values():
+                messages.error(request, f"Traveler {i}: {message}")
+        q = {"step": "2"}
+        if start_day: q["start_day"] = start_day
+        return redirect(reverse("tour_booking_detail_public", args=[order.public_id]) + "?" + urlencode(q))
 
-        dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
+    upsert_travelers(order, rows, count)
 
-        traveler = Traveler.objects.create(
-            order=order,
-            title=title,
-            first_name=first_name,
-            last_name=last_name,
-            passport_no=passport,
-            phone=phone,
-            dob=dob,
-        )
-
-        created.append(i)
-
-    messages.success(request, f"{len(created)} traveler saved.")
+    messages.success(request, f"{len(rows)} traveler saved.")
     q = {"step": "3"}
     if start_day: q["start_day"] = start_day
     return redirect(reverse("tour_booking_detail_public", args=[order.public_id]) + "?" + urlencode(q))
@@ -673,6 +523,7 @@ from urllib.parse import urlencode
 from django.core.paginator import Paginator
 from django.utils import translation
 
+@query_budget(10)
 def tour_grid(request):
 
     if not request.user.is_authenticated or not request.user.is_superuser:
@@ -686,11 +537,13 @@ def tour_grid(request):
 
     requested_days = _days_from_dates(dates)
 
+    # Süre, mil, kapak ve otel sayısı TourCatalogEntry'den gelir (core.catalog);
+    # kaydı henüz olmayan turlar burada doldurulur
+    refresh_missing(Tour.objects.filter(is_published=True))
     qs = (
         Tour.objects.filter(is_published=True)
-        # 🔧 DISTINCT otel sayısı: Tour -> TourDay -> Day -> DayHotel -> Hotel
-        .annotate(hotels_count_distinct=Count("tour_days__day__dayhotel__hotel_id", distinct=True))
-        .prefetch_related("photos", "places_covered__country", "tour_types")
+        .select_related("catalog_entry")
+        .prefetch_related("tour_types")
         .order_by("-created_at")
         .distinct()
     )
@@ -714,13 +567,14 @@ def tour_grid(request):
         qs = qs.filter(tour_types__id__in=tour_types)
 
     # --- süreye göre öneri ---
-    tours_list = list(qs)
     if requested_days is not None:
-        tours_list = [t for t in tours_list if (t.total_days or 0) > 0 and t.total_days <= requested_days]
-        tours_list.sort(key=lambda t: (t.total_days or 0), reverse=True)
+        qs = qs.filter(
+            catalog_entry__total_days__gt=0,
+            catalog_entry__total_days__lte=requested_days,
+        ).order_by("-catalog_entry__total_days", "-created_at")
 
     # --- pagination ---
-    paginator = Paginator(tours_list, 12)
+    paginator = Paginator(qs, 12)
     page_obj = paginator.get_page(request.GET.get("page"))
 
     # --- querystring (page hariç) ---
@@ -805,6 +659,7 @@ except locale.Error:
     pass
 
 
+@query_budget(20)
 def tour_detail(request, slug):
     """Tur detay sayfası — başlangıç günü + tarihleri gösterir."""
 
@@ -839,35 +694,15 @@ def tour_detail(request, slug):
     if not tour.allow_hotels:
         hide_hotels = True
 
-    # --- (4) Günler ---
-    tour_days = (
-        TourDay.objects
-        .filter(tour=tour)
-        .select_related("day", "day__city", "day__city__country")
-        .prefetch_related(
-            Prefetch("day__images", queryset=DayImage.objects.order_by("order", "id")),
-            Prefetch("day__dayflight_set", queryset=DayFlight.objects.select_related(
-                "flight", "flight__airline", "flight__origin", "flight__destination"
-            ).order_by("order", "id")),
-            Prefetch("day__daytransfer_set", queryset=DayTransfer.objects.select_related(
-                "transfer", "transfer__airport", "transfer__hotel", "transfer__hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayhotel_set", queryset=DayHotel.objects.select_related(
-                "hotel", "hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayactivity_set", queryset=DayActivity.objects.select_related(
-                "activity"
-            ).order_by("order", "id")),
-        )
-        .order_by("order", "id")
-    )
+    # --- (4) Günler (önbellekli) ---
+    itinerary = get_itinerary(tour)
+    tour_days = itinerary.days
 
-    # --- (5) Günlerin fiyat toplamları ---
-    day_ids = list(tour_days.values_list("day_id", flat=True))
-    flights_total    = DayFlight.objects.filter(day_id__in=day_ids).aggregate(s=Sum("flight__price"))["s"] or Decimal("0.00")
-    transfers_total  = DayTransfer.objects.filter(day_id__in=day_ids).aggregate(s=Sum("transfer__price"))["s"] or Decimal("0.00")
-    hotels_total     = DayHotel.objects.filter(day_id__in=day_ids).aggregate(s=Sum("hotel__price_per_night"))["s"] or Decimal("0.00")
-    activities_total = DayActivity.objects.filter(day_id__in=day_ids).aggregate(s=Sum("activity__price"))["s"] or Decimal("0.00")
+    # --- (5) Günlerin fiyat toplamları (Tour'da saklanan kırılım) ---
+    flights_total    = tour.flights_amount
+    transfers_total  = tour.transfers_amount
+    hotels_total     = tour.hotels_amount
+    activities_total = tour.activities_amount
 
     # --- (6) Kullanıcı girdileri ---
     pax = request.GET.get("pax")
@@ -909,6 +744,7 @@ def tour_detail(request, slug):
     ctx = {
         "tour": tour,
         "tour_days": tour_days,
+        "itinerary": itinerary,
 
         # gün numarası ve tarihler
         "start_day_number": start_day_number,
@@ -934,7 +770,8 @@ def tour_detail(request, slug):
         "allow_transfers": tour.allow_transfers,
     }
     with translation.override("tr"):
-        return render(request, "tour-detail.html", ctx)
+        response = render(request, "tour-detail.html", ctx)
+    return itinerary_query_header(response, itinerary)
 
 
 def book_tour_order(request, slug):
@@ -1069,48 +906,25 @@ def tour_booking_detail(request, order_id):
     except (TypeError, ValueError):
         start_day_number = 1
 
-    tour_days = (
-        TourDay.objects.filter(tour=tour)
-        .select_related("day", "day__city", "day__city__country")
-        .prefetch_related(
-            Prefetch("day__images", queryset=DayImage.objects.order_by("order", "id")),
-            Prefetch("day__dayflight_set", queryset=DayFlight.objects.select_related(
-                "flight", "flight__airline", "flight__origin", "flight__destination"
-            ).order_by("order", "id")),
-            Prefetch("day__daytransfer_set", queryset=DayTransfer.objects.select_related(
-                "transfer", "transfer__airport", "transfer__hotel", "transfer__hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayhotel_set", queryset=DayHotel.objects.select_related(
-                "hotel", "hotel__city"
-            ).order_by("order", "id")),
-            Prefetch("day__dayactivity_set", queryset=DayActivity.objects.select_related(
-                "activity"
-            ).order_by("order", "id")),
-        )
-        .order_by("order", "id")
-    )
-
-    day_ids = list(tour_days.values_list("day_id", flat=True))
-    has_flights = DayFlight.objects.filter(day_id__in=day_ids).exists()
-    has_transfers = DayTransfer.objects.filter(day_id__in=day_ids).exists()
-    has_hotels = DayHotel.objects.filter(day_id__in=day_ids).exists()
-    has_activities = DayActivity.objects.filter(day_id__in=day_ids).exists()
+    itinerary = get_itinerary(tour)
 
     ctx = {
         "order": order,
         "tour": tour,
-        "tour_days": tour_days,
+        "tour_days": itinerary.days,
+        "itinerary": itinerary,
         "start_day_number": start_day_number,
         "pax": order.pax,
         "per_person": order.total_price / order.pax if order.pax else order.total_price,
         "total": order.total_price,
-        "has_flights": has_flights,
-        "has_transfers": has_transfers,
-        "has_hotels": has_hotels,
-        "has_activities": has_activities,
+        "has_flights": itinerary.has_flights,
+        "has_transfers": itinerary.has_transfers,
+        "has_hotels": itinerary.has_hotels,
+        "has_activities": itinerary.has_activities,
     }
     with translation.override("tr"):
-        return render(request, "tour-booking.html", ctx)
+        response = render(request, "tour-booking.html", ctx)
+    return itinerary_query_header(response, itinerary)
 
 @require_http_methods(["POST"])
 def save_travelers(request, order_id):
@@ -1119,41 +933,19 @@ def save_travelers(request, order_id):
 
     start_day = request.GET.get("start_day") or request.POST.get("start_day")
 
-    ddmmyyyy = re.compile(r"^(0[1-9]|[12][0-9]|3[01])/(0[1-9]|1[0-2])/[0-9]{4}$")
-
-    created = []
-    for i in range(1, count + 1):
-        data = request.POST.get(f"traveler[{i}][first_name]")
-        if data is None:
-            continue
-
-        title = (request.POST.get(f"traveler[{i}][title]") or "").strip()
-        first_name = (request.POST.get(f"traveler[{i}][first_name]") or "").strip()
-        last_name  = (request.POST.get(f"traveler[{i}][last_name]") or "").strip()
-        passport   = (request.POST.get(f"traveler[{i}][passport_no]") or "").strip()
-        phone      = (request.POST.get(f"traveler[{i}][phone]") or "").strip()
-        dob_str    = (request.POST.get(f"traveler[{i}][dob]") or "").strip()
+    rows, errors = parse_travelers(request.POST, count)
 
-        if not ddmmyyyy.match(dob_str):
-            messages.error(request, f"Traveler {i}: DoB must be DD/MM/YYYY")
-            q = {"step": "2"}
-            if start_day: q["start_day"] = start_day
-            return redirect(reverse("tour_booking_detail", args=[order.id]) + "?" + urlencode(q))
+    if errors:
+        for i, row_errors in sorted(errors.items()):
+            for message in row_errors.values():
+                messages.error(request, f"Traveler {i}: {message}")
+        q = {"step": "2"}
+        if start_day: q["start_day"] = start_day
+        return redirect(reverse("tour_booking_detail", args=[order.id]) + "?" + urlencode(q))
 
-        dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
+    upsert_travelers(order, rows, count)
 
-        Traveler.objects.create(
-            order=order,
-            title=title,
-            first_name=first_name,
-            last_name=last_name,
-            passport_no=passport,
-            phone=phone,
-            dob=dob,
-        )
-        created.append(i)
-
-    messages.success(request, f"{len(created)} traveler saved.")
+    messages.success(request, f"{len(rows)} traveler saved.")
     q = {"step": "3"}
     if start_day: q["start_day"] = start_day
     return redirect(reverse("tour_booking_detail", args=[order.id]) + "?" + urlencode(q))
@@ -1188,7 +980,7 @@ def nomaya_asistan(request):
     if not request.session.session_key:
         request.session.create()
 
-    return render(request, "core/nomaya_asistan.html")
+    return render(request, "core/nomaya_asistan.html", {"events_origin": settings.EVENTS_ORIGIN})
 
 def geo(request):
     if not request.session.session_key:
@@ -1210,22 +1002,53 @@ def superuser_required(user):
 
 @user_passes_test(superuser_required, login_url="/admin/login/")
 def live_map(request):
-    return render(request, "core/live_map.html")
+    return render(request, "core/live_map.html", {"events_origin": settings.EVENTS_ORIGIN})
 
+@query_budget(6)
 def live_locations_api(request):
-    locations = LiveLocation.objects.all().order_by("-updated_at")
-
-    data = []
-    for loc in locations:
-        data.append({
-            "session_id": loc.session_id or "Unknown",
-            "latitude": loc.latitude,
-            "longitude": loc.longitude,
-            "accuracy": loc.accuracy,
-            "updated_at": loc.updated_at.strftime("%d.%m.%Y %H:%M:%S"),
+    """
+    Canlı harita beslemesi. Parametreler (hepsi isteğe bağlı):
+    since (önceki yanıtın cursor'ı), max_age (saniye), bbox
+    (minLon,minLat,maxLon,maxLat), limit. Satırlar "fields" sırasında dizi
+    olarak döner; değişiklik yoksa If-None-Match ile 304. Son
+    LIVE_MAP_CURSOR_LAG saniyede yazılan satırlar tekrar gelebilir.
+    """
+    if not superuser_required(request.user):
+        return JsonResponse({"success": False, "message": "forbidden"}, status=403)
+
+    params = request.GET
+    try:
+        since = parse_cursor(params["since"]) if params.get("since") else None
+        max_age = int(params.get("max_age") or settings.LIVE_MAP_MAX_AGE)
+        bbox = parse_bbox(params["bbox"]) if params.get("bbox") else None
+        limit = min(max(int(params.get("limit") or 500), 1), 2000)
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "message": "invalid_params"}, status=400)
+
+    settled_before = settled_horizon()
+    qs = feed_queryset(since=since, max_age=max_age, bbox=bbox)
+
+    latest, last_id, count = feed_version(qs)
+    etag = '"ll-{}"'.format(hashlib.sha256(
+        f"{params.get('since')}|{max_age}|{bbox}|{limit}|{latest}|{last_id}|{count}".encode("utf-8")
+    ).hexdigest()[:24])
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+    else:
+        rows, cursor, more = feed_rows(qs, limit, settled_before) if count else ([], None, False)
+        response = JsonResponse({
+            "success": True,
+            "cursor": cursor or params.get("since"),
+            "more": more,
+            "max_age": max_age,
+            "fields": FEED_FIELDS,
+            "rows": rows,
         })
 
-    return JsonResponse(data, safe=False)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 import json
 from django.http import JsonResponse
@@ -1250,36 +1073,34 @@ def verify_tracking_code(request):
     if not code:
         return JsonResponse({"valid": False, "message": "empty_code"}, status=400)
 
-    try:
-        order = Order.objects.select_related("tour").get(
-            tracking_code=code,
-            is_paid=True,
-            tracking_enabled=True,
-        )
-    except Order.DoesNotExist:
+    session = resolve_tracking_session(code)
+
+    if session is None or not session.is_paid:
         return JsonResponse({"valid": False, "message": "invalid_code"}, status=404)
 
-    if timezone.now() > order.tracking_code_expires_at:
+    if session.is_expired():
         return JsonResponse({"valid": False, "message": "expired"}, status=403)
 
     # Seyahat durumu
     today = timezone.localdate()
     trip_status = "ready"
 
-    if not order.start_date:
+    if not session.start_date:
         trip_status = "missing_start_date"
-    elif today < order.start_date:
+    elif today < session.start_date:
         trip_status = "not_started"
-    elif order.end_date and today > order.end_date:
+    elif session.end_date and today > session.end_date:
         trip_status = "finished"
 
-    first_start = not bool(order.tracking_started_at)
+    first_start = not bool(session.tracking_started_at)
 
     if first_start:
+        order = session.get_order()
         order.tracking_started_at = timezone.now()
-
-    order.tracking_last_seen = timezone.now()
-    order.save(update_fields=["tracking_started_at", "tracking_last_seen"])
+        order.tracking_last_seen = timezone.now()
+        order.save(update_fields=["tracking_started_at", "tracking_last_seen"])
+    else:
+        Order.objects.filter(pk=session.order_id).update(tracking_last_seen=timezone.now())
 
     if first_start:
         send_telegram_message(
@@ -1297,13 +1118,13 @@ def verify_tracking_code(request):
     return JsonResponse({
         "valid": True,
         "message": "ok",
-        "order_id": order.id,
-        "tour": order.tour.title,
-        "expires_at": order.tracking_code_expires_at.isoformat(),
+        "order_id": session.order_id,
+        "tour": session.tour_title,
+        "expires_at": session.expires_at.isoformat(),
         "order": {
-            "tracking_code": order.tracking_code,
-            "start_date": str(order.start_date) if order.start_date else None,
-            "end_date": str(order.end_date) if order.end_date else None,
+            "tracking_code": session.code,
+            "start_date": str(session.start_date) if session.start_date else None,
+            "end_date": str(session.end_date) if session.end_date else None,
             "trip_status": trip_status,
         }
     })
@@ -1319,203 +1140,126 @@ def update_location(request):
 
     code = str(data.get("session_id", "")).strip().upper()
 
-    try:
-        order = Order.objects.get(
-            tracking_code=code,
-            is_paid=True,
-            tracking_enabled=True,
-        )
-    except Order.DoesNotExist:
+    session = resolve_tracking_session(code)
+
+    if session is None or not session.is_paid:
         return JsonResponse({"success": False, "message": "invalid_code"}, status=404)
 
-    if timezone.now() > order.tracking_code_expires_at:
+    if session.is_expired():
         return JsonResponse({"success": False, "message": "expired"}, status=403)
 
     today = timezone.localdate()
 
-    if order.start_date and today < order.start_date:
+    if session.start_date and today < session.start_date:
         return JsonResponse({
             "success": False,
             "message": "travel_not_started",
             "detail": "Seyahat günü gelmedi.",
-            "start_date": str(order.start_date),
+            "start_date": str(session.start_date),
             "today": str(today),
         }, status=403)
 
-    if order.end_date and today > order.end_date:
+    if session.end_date and today > session.end_date:
         return JsonResponse({
             "success": False,
             "message": "travel_finished",
             "detail": "Seyahat günü sona erdi.",
-            "end_date": str(order.end_date),
+            "end_date": str(session.end_date),
             "today": str(today),
         }, status=403)
 
-    order.tracking_last_seen = timezone.now()
-    order.save(update_fields=["tracking_last_seen"])
-
-    first_location = not LiveLocation.objects.filter(session_id=code).exists()
-
-    LiveLocation.objects.update_or_create(
-        session_id=code,
-        defaults={
-            "name": order.email or code,
-            "latitude": data.get("latitude"),
-            "longitude": data.get("longitude"),
-            "accuracy": data.get("accuracy"),
-            "user_agent": request.META.get("HTTP_USER_AGENT", ""),
-            "ip_address": request.META.get("HTTP_CF_CONNECTING_IP")
-            or request.META.get("HTTP_TRUE_CLIENT_IP")
-            or request.META.get("REMOTE_ADDR"),
-            "updated_at": timezone.now(),
-        }
-    )
+    try:
+        latitude = float(data.get("latitude"))
+        longitude = float(data.get("longitude"))
+        accuracy = data.get("accuracy")
+        accuracy = float(accuracy) if accuracy is not None else None
+    except (TypeError, ValueError):
+        return JsonResponse({"success": False, "message": "invalid_location"}, status=400)
+
+    # Yazma tamponlanır; eşik altındaki noktalar hiç yazılmaz
+    from .tracking import LocationFix, ingest_location
+    result = ingest_location(LocationFix(
+        code=code,
+        order_id=session.order_id,
+        name=session.email or code,
+        latitude=latitude,
+        longitude=longitude,
+        accuracy=accuracy,
+        user_agent=request.META.get("HTTP_USER_AGENT", ""),
+        ip_address=request.META.get("HTTP_CF_CONNECTING_IP")
+        or request.META.get("HTTP_TRUE_CLIENT_IP")
+        or request.META.get("REMOTE_ADDR"),
+    ))
+    first_location = result.first_location
 
     if first_location:
         from .services import enqueue_tour_started_message_if_needed
-        enqueue_tour_started_message_if_needed(order)
+        enqueue_tour_started_message_if_needed(session.get_order())
 
     return JsonResponse({
         "success": True,
         "first_location": first_location,
+        "accepted": result.accepted,
         "today": str(today),
-        "start_date": str(order.start_date) if order.start_date else None,
-        "end_date": str(order.end_date) if order.end_date else None,
+        "start_date": str(session.start_date) if session.start_date else None,
+        "end_date": str(session.end_date) if session.end_date else None,
     })
 from django.http import JsonResponse
 from django.utils import timezone
 from .models import Order, TourDay
 
 
+@query_budget(11)
 def order_itinerary(request, code):
-    try:
-        order = Order.objects.select_related("tour").get(
-            tracking_code=code.upper(),
-            tracking_enabled=True,
-            tracking_code_expires_at__gte=timezone.now()
-        )
-    except Order.DoesNotExist:
+    session = resolve_tracking_session(code)
+
+    if session is None or session.is_expired():
         return JsonResponse({
             "valid": False,
             "message": "Geçersiz veya süresi dolmuş kod"
         }, status=404)
 
-    tour = order.tour
-
-    tour_days = (
-        TourDay.objects
-        .filter(tour=tour)
-        .select_related("day", "day__city")
-        .order_by("order", "id")
-    )
-
-    days_data = []
-
-    for td in tour_days:
-        day = td.day
-
-        activities = []
-        for da in day.dayactivity_set.select_related("activity").order_by("order"):
-            activity = da.activity
-            activities.append({
-                "title": activity.title,
-                "location": activity.location_text,
-                "points": activity.points or [],
-                "duration_hours": str(activity.duration_hours) if activity.duration_hours else None,
-            })
-
-        hotels = []
-        for dh in day.dayhotel_set.select_related("hotel", "hotel__city").order_by("order"):
-            hotel = dh.hotel
-            hotels.append({
-                "name": hotel.name,
-                "city": hotel.city.name,
-                "star": hotel.star,
-                "type": hotel.hotel_type,
-            })
-
-        flights = []
-        for df in day.dayflight_set.select_related(
-            "flight",
-            "flight__origin",
-            "flight__destination",
-            "flight__airline"
-        ).order_by("order"):
-            flight = df.flight
-            flights.append({
-                "airline": flight.airline.name,
-                "flight_number": flight.flight_number,
-                "origin": flight.origin.iata,
-                "destination": flight.destination.iata,
-                "departure_time": str(flight.departure_time) if flight.departure_time else None,
-                "arrival_time": str(flight.arrival_time) if flight.arrival_time else None,
-            })
-
-        transfers = []
-        for dt in day.daytransfer_set.select_related(
-            "transfer",
-            "transfer__airport",
-            "transfer__hotel"
-        ).order_by("order"):
-            transfer = dt.transfer
-            transfers.append({
-                "direction": transfer.get_direction_display(),
-                "vehicle_type": transfer.vehicle_type,
-                "airport": transfer.airport.iata,
-                "hotel": transfer.hotel.name,
-            })
-
-        days_data.append({
-            "order": td.order,
-            "title": td.title,
-            "city": day.city.name,
-            "day_number": day.day_number,
-            "description": day.description,
-            "bullets": day.bullets or [],
-            "activities": activities,
-            "hotels": hotels if not order.hide_hotels else [],
-            "flights": flights if not order.hide_flights else [],
-            "transfers": transfers if not order.hide_transfers else [],
-        })
+    # itinerary_version güncel okunmalı; tur satırı oturumla cache'lenmez
+    tour = Tour.objects.get(pk=session.tour_id)
+    itinerary = get_itinerary(tour)
 
-    return JsonResponse({
+    response = JsonResponse({
         "valid": True,
         "tour": {
             "title": tour.title,
-            "duration": tour.duration_label,
-            "start_point": tour.start_point,
-            "end_point": tour.end_point,
+            "duration": itinerary.duration_label,
+            "start_point": itinerary.start_point,
+            "end_point": itinerary.end_point,
             "overview": tour.overview,
         },
         "order": {
-            "tracking_code": order.tracking_code,
-            "start_date": str(order.start_date) if order.start_date else None,
-            "end_date": str(order.end_date) if order.end_date else None,
-            "pax": order.pax,
+            "tracking_code": session.code,
+            "start_date": str(session.start_date) if session.start_date else None,
+            "end_date": str(session.end_date) if session.end_date else None,
+            "pax": session.pax,
         },
-        "days": days_data,
+        "days": itinerary.serialize_days(
+            hide_flights=session.hide_flights,
+            hide_transfers=session.hide_transfers,
+            hide_hotels=session.hide_hotels,
+        ),
     })
+    return itinerary_query_header(response, itinerary)
 
 @csrf_exempt
+@query_budget(12)
 def today_plan(request, code):
-    try:
-        order = Order.objects.select_related("tour").get(
-            tracking_code=code.upper(),
-            is_paid=True,
-            tracking_enabled=True,
-            tracking_code_expires_at__gte=timezone.now()
-        )
-    except Order.DoesNotExist:
+    session = resolve_tracking_session(code)
+
+    if session is None or not session.is_paid or session.is_expired():
         return JsonResponse({
             "valid": False,
             "message": "Geçersiz veya süresi dolmuş kod"
         }, status=404)
 
-    tour = order.tour
-
     tour_days = (
         TourDay.objects
-        .filter(tour=tour)
+        .filter(tour_id=session.tour_id)
         .select_related("day", "day__city")
         .order_by("order", "id")
     )
@@ -1529,9 +1273,9 @@ def today_plan(request, code):
     # Bugünün hangi tur günü olduğunu hesapla
     selected_tour_day = None
 
-    if order.start_date:
+    if session.start_date:
         today = timezone.localdate()
-        day_index = (today - order.start_date).days + 1
+        day_index = (today - session.start_date).days + 1
 
         if day_index < 1:
             day_index = 1
@@ -1550,14 +1294,13 @@ def today_plan(request, code):
         .order_by("order", "id")
     )
 
+    day_activities = list(day_activities)
+    progresses = ProgressRepository(session.order_id).for_day_activities(day_activities)
+
     activities = []
 
     for da in day_activities:
-        progress, _ = ActivityProgress.objects.get_or_create(
-            order=order,
-            day_activity=da
-        )
-
+        progress = progresses[da.id]
         activity = da.activity
 
         activities.append({
@@ -1586,12 +1329,12 @@ def today_plan(request, code):
     return JsonResponse({
         "valid": True,
         "tour": {
-            "title": tour.title,
+            "title": session.tour_title,
         },
         "order": {
-            "tracking_code": order.tracking_code,
-            "start_date": str(order.start_date) if order.start_date else None,
-            "end_date": str(order.end_date) if order.end_date else None,
+            "tracking_code": session.code,
+            "start_date": str(session.start_date) if session.start_date else None,
+            "end_date": str(session.end_date) if session.end_date else None,
         },
         "day": {
             "tour_day_order": selected_tour_day.order,
@@ -1604,7 +1347,7 @@ def today_plan(request, code):
     })
 
 
-def telegram_activity_hook(order, day_activity, status):
+def telegram_activity_hook(order, day_activity, status, progress=None):
     if status not in ["completed", "skipped"]:
         return False
 
@@ -1619,7 +1362,8 @@ def telegram_activity_hook(order, day_activity, status):
         f"<b>Aktivite:</b> {tg(day_activity.activity.title if day_activity.activity else '-')}\n"
         f"<b>Gün:</b> {tg(day_activity.day.title if day_activity.day else '-')}\n"
         f"<b>Status:</b> {tg(status)}\n"
-        f"<b>Miles:</b> {tg(day_activity.activity.miles_reward if day_activity.activity else 0)}"
+        f"<b>Miles:</b> {tg(day_activity.activity.miles_reward if day_activity.activity else 0)}",
+        activity_progress=progress,
     )
 
 @csrf_exempt
@@ -1648,14 +1392,9 @@ def update_activity_progress(request):
             "message": "invalid_status"
         }, status=400)
 
-    try:
-        order = Order.objects.get(
-            tracking_code=code,
-            is_paid=True,
-            tracking_enabled=True,
-            tracking_code_expires_at__gte=timezone.now()
-        )
-    except Order.DoesNotExist:
+    session = resolve_tracking_session(code)
+
+    if session is None or not session.is_paid or session.is_expired():
         return JsonResponse({
             "valid": False,
             "message": "Geçersiz veya süresi dolmuş kod"
@@ -1672,7 +1411,7 @@ def update_activity_progress(request):
         }, status=404)
 
     belongs_to_tour = TourDay.objects.filter(
-        tour=order.tour,
+        tour_id=session.tour_id,
         day=day_activity.day
     ).exists()
 
@@ -1682,15 +1421,19 @@ def update_activity_progress(request):
             "message": "Bu aktivite bu tura ait değil"
         }, status=403)
 
-    progress, _ = ActivityProgress.objects.get_or_create(
-        order=order,
-        day_activity=day_activity
-    )
+    order = session.get_order()
 
-    old_status = progress.status
+    # Mil defteri (post_save -> MilesLedger.sync) durumla aynı transaction'da
+    with transaction.atomic():
+        progress, _ = ActivityProgress.objects.get_or_create(
+            order=order,
+            day_activity=day_activity
+        )
 
-    progress.status = status
-    progress.save(update_fields=["status", "updated_at"])
+        old_status = progress.status
+
+        progress.status = status
+        progress.save(update_fields=["status", "updated_at"])
 
     last_location = LiveLocation.objects.filter(
         session_id=order.tracking_code
@@ -1712,13 +1455,9 @@ def update_activity_progress(request):
         or request.META.get("REMOTE_ADDR"),
     )
 
-    ActivityProgressLocationLog.prune_if_needed()
-
     if status in ["completed", "skipped"] and old_status != status:
-        sent = telegram_activity_hook(order, day_activity, status)
-        if sent:
-            progress.telegram_sent = True
-            progress.save(update_fields=["telegram_sent", "updated_at"])
+        # telegram_sent, worker mesajı teslim edince işaretlenir
+        telegram_activity_hook(order, day_activity, status, progress)
 
         if status == "skipped":
             from .services import enqueue_next_activity_after_skip
@@ -1750,6 +1489,7 @@ def update_activity_progress(request):
                 )
 
     earned_miles = day_activity.activity.miles_reward if status == "completed" else 0
+    order.refresh_from_db(fields=["earned_miles"])
 
     return JsonResponse({
         "valid": True,
@@ -1824,14 +1564,12 @@ from django.utils import timezone
 
 
 def secure_audio_stream(request, tracking_code, day_activity_id, audio_type):
-    order = get_object_or_404(
-        Order.objects.select_related("tour"),
-        tracking_code=tracking_code.upper(),
-        is_paid=True,
-        tracking_enabled=True,
-    )
+    session = resolve_tracking_session(tracking_code)
+
+    if session is None or not session.is_paid:
+        raise Http404("Geçersiz tracking code.")
 
-    if timezone.now() > order.tracking_code_expires_at:
+    if session.is_expired():
         return HttpResponseForbidden(
             "Bu ses kaydının süresi dolmuş."
         )
@@ -1845,7 +1583,7 @@ def secure_audio_stream(request, tracking_code, day_activity_id, audio_type):
     )
 
     belongs_to_tour = TourDay.objects.filter(
-        tour=order.tour,
+        tour_id=session.tour_id,
         day=day_activity.day,
     ).exists()
 
@@ -1868,20 +1606,36 @@ def secure_audio_stream(request, tracking_code, day_activity_id, audio_type):
     if not audio_file:
         raise Http404("Aktivite ses kaydı bulunamadı.")
 
-    final_audio = build_combined_audio(
-        order=order,
+    # Hazır değilse render kuyruğa alınır, şimdilik sade aktivite sesi döner
+    # Intro seçimi traveler / custom intro okuduğu için Order burada yüklenir
+    source = resolve_audio_source(
+        order=session.get_order(),
         day_activity=day_activity,
         audio_type=audio_type,
         main_audio_file=audio_file,
+        initial_request=is_initial_request(request.headers.get("Range")),
     )
+    filename = f"nomaya-{audio_type}.mp3"
+
+    if source.path:
+        # Range/206 + ETag; tarayıcı her seferinde ETag ile doğrular
+        response = ranged_file_response(
+            request,
+            source.path,
+            content_type="audio/mpeg",
+            etag=source.etag,
+            filename=filename,
+        )
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
     response = FileResponse(
-        final_audio,
+        source.file_field.open("rb"),
         content_type="audio/mpeg",
     )
 
     response["Content-Disposition"] = (
-        f'inline; filename="nomaya-{audio_type}.mp3"'
+        f'inline; filename="{filename}"'
     )
 
     # Tarayıcı aynı URL'nin eski sesini göstermesin.
@@ -2312,185 +2066,6 @@ def stripe_checkout_order(request, public_id):
 
     return redirect(session.url)
 
-import hashlib
-import os
-import random
-import subprocess
-import tempfile
-
-from django.conf import settings
-from django.core.files import File
-
-
-def build_combined_audio(order, day_activity, audio_type, main_audio_file):
-    """
-    Her çağrıda:
-
-    1. Order'ın güncel ilk traveler adını okur.
-    2. IntroAudioLibrary içinden bu isme ait aktif intro kayıtlarını bulur.
-    3. Intro kayıtlarından birini rastgele seçer.
-    4. Seçilen intro ile ilgili activity sesini birleştirir.
-    5. Tek MP3 olarak döndürür.
-
-    Traveler adı admin panelinden değiştirildiğinde bir sonraki istekte
-    yeni isim otomatik olarak kullanılır.
-    """
-
-    intro_item = get_current_traveler_intro(order)
-
-    # İsim için kütüphanede intro bulunamazsa eski custom intro desteğini koru.
-    if intro_item and intro_item.audio:
-        intro_audio_file = intro_item.audio
-        intro_identity = f"library-{intro_item.id}"
-
-    elif order.custom_intro_audio:
-        intro_audio_file = order.custom_intro_audio
-        intro_identity = "custom"
-
-    else:
-        # Hiç intro yoksa activity sesini tek başına çal.
-        return main_audio_file.open("rb")
-
-    intro_path = get_local_audio_path(intro_audio_file)
-    main_path = get_local_audio_path(main_audio_file)
-
-    if not intro_path or not main_path:
-        return main_audio_file.open("rb")
-
-    combined_dir = os.path.join(
-        settings.MEDIA_ROOT,
-        "orders",
-        "combined_audio",
-    )
-    os.makedirs(combined_dir, exist_ok=True)
-
-    # Intro veya activity dosyası değiştiğinde eski cache kullanılmasın.
-    intro_mtime = int(os.path.getmtime(intro_path))
-    main_mtime = int(os.path.getmtime(main_path))
-
-    cache_source = (
-        f"order={order.id}|"
-        f"intro={intro_identity}|"
-        f"intro_mtime={intro_mtime}|"
-        f"day_activity={day_activity.id}|"
-        f"audio_type={audio_type}|"
-        f"main_mtime={main_mtime}"
-    )
-
-    cache_hash = hashlib.sha256(
-        cache_source.encode("utf-8")
-    ).hexdigest()[:24]
-
-    safe_audio_type = audio_type.replace("/", "-")
-
-    output_filename = (
-        f"order_{order.id}_"
-        f"activity_{day_activity.id}_"
-        f"{safe_audio_type}_"
-        f"{cache_hash}.mp3"
-    )
-
-    output_path = os.path.join(
-        combined_dir,
-        output_filename,
-    )
-
-    # Aynı intro daha önce aynı activity ile birleştirildiyse hazır dosyayı kullan.
-    if os.path.isfile(output_path) and os.path.getsize(output_path) > 0:
-        return open(output_path, "rb")
-
-    file_descriptor, temporary_output_path = tempfile.mkstemp(
-        prefix="nomaya_combined_",
-        suffix=".mp3",
-        dir=combined_dir,
-    )
-    os.close(file_descriptor)
-
-    try:
-        command = [
-            "ffmpeg",
-            "-hide_banner",
-            "-loglevel", "error",
-            "-y",
-
-            "-i", intro_path,
-            "-i", main_path,
-
-            "-filter_complex",
-            (
-                "[0:a]"
-                "aresample=44100,"
-                "aformat=sample_fmts=fltp:channel_layouts=stereo,"
-                "asetpts=N/SR/TB"
-                "[intro];"
-
-                "[1:a]"
-                "aresample=44100,"
-                "aformat=sample_fmts=fltp:channel_layouts=stereo,"
-                "asetpts=N/SR/TB"
-                "[activity];"
-
-                "[intro][activity]"
-                "concat=n=2:v=0:a=1"
-                "[combined]"
-            ),
-
-            "-map", "[combined]",
-            "-vn",
-            "-c:a", "libmp3lame",
-            "-b:a", "192k",
-            "-ar", "44100",
-            "-ac", "2",
-
-            temporary_output_path,
-        ]
-
-        result = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=180,
-            check=False,
-        )
-
-        if result.returncode != 0:
-            raise RuntimeError(
-                result.stderr or "FFmpeg audio birleştirme hatası."
-            )
-
-        if (
-            not os.path.isfile(temporary_output_path)
-            or os.path.getsize(temporary_output_path) == 0
-        ):
-            raise RuntimeError(
-                "Birleştirilmiş ses dosyası oluşturulamadı."
-            )
-
-        os.replace(
-            temporary_output_path,
-            output_path,
-        )
-
-        return open(output_path, "rb")
-
-    except Exception as exc:
-        # Sunucu logunda gerçek nedeni görebilmek için logla.
-        print(
-            f"Nomaya audio merge error "
-            f"order={order.id}, "
-            f"activity={day_activity.id}, "
-            f"type={audio_type}: {exc}"
-        )
-
-        try:
-            if os.path.exists(temporary_output_path):
-                os.remove(temporary_output_path)
-        except OSError:
-            pass
-
-        # Birleştirme bozulursa ana sistem çalışmaya devam etsin.
-        return main_audio_file.open("rb")
 from django.contrib.auth import update_session_auth_hash
 
 @login_required
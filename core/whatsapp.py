@@ -0,0 +1,229 @@
+"""
+WhatsAppMessageQueue teslimatı (WAHA).
+
+process_whatsapp_queue worker'ı kuyruğu şu adımlarla boşaltır:
+
+1. Süresi geçmiş kilitleri (PROCESSING + eski locked_at) PENDING'e geri alır.
+2. Vadesi gelmiş mesajları parti halinde sahiplenir. PostgreSQL'de
+   SELECT ... FOR UPDATE SKIP LOCKED, SQLite'ta locked_at damgalı iyimser
+   UPDATE kullanılır; birden fazla worker aynı mesajı almaz.
+3. Aynı telefona giden mesajların sırası korunur: önünde bekleyen ya da
+   işlenen mesaj olan satır sahiplenilmez, bir partide her telefondan en
+   fazla bir mesaj bulunur.
+4. Mesajlar havuzlu HTTP oturumuyla paralel gönderilir; DB yazımları ana
+   thread'de yapılır.
+5. Geçici hatalar üstel geri çekilmeyle yeniden denenir.
+"""
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import WhatsAppMessageQueue
+from .notifications import build_session
+
+logger = logging.getLogger(__name__)
+
+Status = WhatsAppMessageQueue.Status
+
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+@dataclass
+class SendResult:
+    ok: bool
+    retryable: bool = False
+    response: str = ""
+
+
+class WahaClient:
+    """WAHA uyumlu /api/sendText istemcisi."""
+
+    def __init__(self, base_url=None, api_key=None, session_name=None, pool_size=4, timeout=15):
+        self.base_url = (base_url or getattr(settings, "WAHA_BASE_URL", "")).rstrip("/")
+        self.api_key = api_key if api_key is not None else getattr(settings, "WAHA_API_KEY", "")
+        self.session_name = session_name or getattr(settings, "WAHA_SESSION", "default")
+        self.timeout = timeout
+        self.http = build_session(pool_size=pool_size)
+        if self.api_key:
+            self.http.headers["X-Api-Key"] = self.api_key
+
+    def send_text(self, chat_id, text):
+        try:
+            resp = self.http.post(
+                f"{self.base_url}/api/sendText",
+                json={"session": self.session_name, "chatId": chat_id, "text": text},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            return SendResult(ok=False, retryable=True, response=str(exc))
+
+        body = resp.text[:2000]
+        if 200 <= resp.status_code < 300:
+            return SendResult(ok=True, response=body)
+        # 429 / 5xx geçici; diğer 4xx (geçersiz numara vb.) kalıcı
+        retryable = resp.status_code == 429 or resp.status_code >= 500
+        return SendResult(ok=False, retryable=retryable, response=f"{resp.status_code}: {body}")
+
+
+@dataclass
+class QueueStats:
+    claimed: int = 0
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    recovered: int = 0
+    elapsed: float = 0.0
+    lag_seconds: float = 0.0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+
+class WhatsAppQueueProcessor:
+    def __init__(self, client=None, concurrency=4, batch_size=50, stale_after=300, max_attempts=6):
+        self.client = client or WahaClient(pool_size=concurrency)
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    # --- kilit kurtarma ---
+    def recover_stale(self):
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after)
+        return (
+            WhatsAppMessageQueue.objects
+            .filter(status=Status.PROCESSING, locked_at__lt=cutoff)
+            .update(status=Status.PENDING, locked_at=None)
+        )
+
+    # --- sahiplenme ---
+    def _due(self, now):
+        blocked = WhatsAppMessageQueue.objects.filter(
+            phone=OuterRef("phone"),
+            status__in=[Status.PENDING, Status.PROCESSING],
+            id__lt=OuterRef("id"),
+        )
+        return (
+            WhatsAppMessageQueue.objects
+            .filter(status=Status.PENDING)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .exclude(Exists(blocked))
+            .order_by("id")
+        )
+
+    def claim(self):
+        now = timezone.now()
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                ids = list(
+                    self._due(now)
+                    .select_for_update(skip_locked=True)
+                    .values_list("id", flat=True)[:self.batch_size]
+                )
+                WhatsAppMessageQueue.objects.filter(id__in=ids).update(
+                    status=Status.PROCESSING, locked_at=now,
+                )
+        else:
+            # SQLite: satır kilidi yok. Sadece hâlâ PENDING olan satırlar
+            # güncellenir, geri okuma bu worker'ın damgasıyla yapılır.
+            candidates = list(self._due(now).values_list("id", flat=True)[:self.batch_size])
+            stamp = now + timedelta(microseconds=random.randint(0, 999))
+            WhatsAppMessageQueue.objects.filter(
+                id__in=candidates, status=Status.PENDING,
+            ).update(status=Status.PROCESSING, locked_at=stamp)
+            ids = list(
+                WhatsAppMessageQueue.objects
+                .filter(id__in=candidates, status=Status.PROCESSING, locked_at=stamp)
+                .values_list("id", flat=True)
+            )
+
+        return list(WhatsAppMessageQueue.objects.filter(id__in=ids).order_by("id"))
+
+    # --- gönderim ---
+    def _apply(self, message, result, now):
+        message.locked_at = None
+        message.attempts += 1
+        message.waha_response = result.response
+
+        if result.ok:
+            message.status = Status.SENT
+            message.sent_at = now
+            message.error_message = ""
+        elif result.retryable and message.attempts < self.max_attempts:
+            message.status = Status.PENDING
+            message.next_attempt_at = now + timedelta(seconds=backoff_delay(message.attempts))
+            message.error_message = result.response
+        else:
+            message.status = Status.FAILED
+            message.failed_at = now
+            message.error_message = result.response
+
+    def queue_lag(self):
+        """En eski vadesi gelmiş bekleyen mesajın yaşı (sn)."""
+        now = timezone.now()
+        oldest = (
+            WhatsAppMessageQueue.objects
+            .filter(status=Status.PENDING)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        return (now - oldest).total_seconds() if oldest else 0.0
+
+    def run_once(self):
+        stats = QueueStats()
+        started = time.monotonic()
+
+        stats.recovered = self.recover_stale()
+        stats.lag_seconds = self.queue_lag()
+        messages = self.claim()
+        stats.claimed = len(messages)
+        if not messages:
+            stats.elapsed = time.monotonic() - started
+            return stats
+
+        # Bir partide her telefondan tek mesaj olduğu için paralel gönderim
+        # telefon başına sırayı bozmaz.
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(
+                lambda m: self.client.send_text(m.chat_id, m.message), messages,
+            ))
+
+        now = timezone.now()
+        for message, result in zip(messages, results):
+            self._apply(message, result, now)
+            if message.status == Status.SENT:
+                stats.sent += 1
+            elif message.status == Status.PENDING:
+                stats.retried += 1
+            else:
+                stats.failed += 1
+                stats.errors.append((message.pk, result.response))
+                logger.warning("whatsapp gönderimi başarısız id=%s: %s", message.pk, result.response)
+
+        WhatsAppMessageQueue.objects.bulk_update(messages, [
+            "status", "locked_at", "attempts", "next_attempt_at",
+            "waha_response", "error_message", "sent_at", "failed_at",
+        ])
+
+        stats.elapsed = time.monotonic() - started
+        return stats
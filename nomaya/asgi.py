@@ -3,6 +3,9 @@ ASGI config for nomaya project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Yalnızca SSE servisi (render.yaml: nomaya-events) bunu çalıştırır; uygulama
+nomaya.wsgi ile sunulur.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -10,7 +10,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get("SECRET_KEY", "")
 DEBUG = config("DEBUG", default=False, cast=bool)
 
-ALLOWED_HOSTS = ["nomaya.co", "www.nomaya.co", "nomaya.onrender.com"]
+ALLOWED_HOSTS = [
+    "nomaya.co", "www.nomaya.co", "nomaya.onrender.com",
+    "events.nomaya.co", "nomaya-events.onrender.com",
+]
 
 CSRF_TRUSTED_ORIGINS = [
     "https://nomaya.co",
@@ -18,6 +21,8 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 SECURE_SSL_REDIRECT = True           # Render’da HTTPS aktifse güzel olur
 SESSION_COOKIE_SECURE = True
+# SSE servisi (events.nomaya.co) oturumu okuyabilsin diye örn. ".nomaya.co"
+SESSION_COOKIE_DOMAIN = config("SESSION_COOKIE_DOMAIN", default=None)
 CSRF_COOKIE_SECURE = True
 
 SECURE_HSTS_SECONDS = 31536000
@@ -33,6 +38,11 @@ STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET", default="")
 TELEGRAM_BOT_TOKEN_2 = config("TELEGRAM_BOT_TOKEN_2", default="")
 TELEGRAM_CHAT_ID_2 = config("TELEGRAM_CHAT_ID_2", default="")
 
+# --- WhatsApp (WAHA) ---
+WAHA_BASE_URL = config("WAHA_BASE_URL", default="")
+WAHA_API_KEY = config("WAHA_API_KEY", default="")
+WAHA_SESSION = config("WAHA_SESSION", default="default")
+
 
 # --- Auth yönlendirmeleri ---
 LOGIN_URL = "sign_in"
@@ -54,6 +64,8 @@ MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     # ✅ WhiteNoise tam burada olmalı
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    # SQL sayısı / süre ölçümü; session ve auth sorgularını da kapsar
+    "core.middleware.RequestMetricsMiddleware",
 
     "django.contrib.sessions.middleware.SessionMiddleware",
     # ✅ Türkçe/yerelleştirme için gerekli
@@ -94,6 +106,73 @@ DATABASES = {
     "default": dj_database_url.parse(os.environ["DATABASE_URL"], conn_max_age=600)
 }
 
+# --- Önbellek ---
+# Varsayılan process-içi LocMem; paylaşımlı backend için örn.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://...
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="nomaya"),
+    }
+}
+ITINERARY_CACHE_ALIAS = config("ITINERARY_CACHE_ALIAS", default="default")
+ITINERARY_CACHE_TIMEOUT = config("ITINERARY_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+# Admin inline autocomplete sonuç sayfaları (core.autocomplete)
+AUTOCOMPLETE_CACHE_TIMEOUT = config("AUTOCOMPLETE_CACHE_TIMEOUT", default=300, cast=int)
+
+# --- Canlı takip ---
+# Konum kısma durumu ve tracking oturumu burada tutulur. LocMem ile kısma
+# process başınadır; birden fazla worker'da paylaşımlı bir cache gösterilmeli.
+TRACKING_CACHE_ALIAS = config("TRACKING_CACHE_ALIAS", default="default")
+# Doğrulanmış tracking code özeti bu kadar saniye cache'lenir; Order kaydı siler
+TRACKING_SESSION_TTL = config("TRACKING_SESSION_TTL", default=30, cast=int)
+LOCATION_MIN_INTERVAL = config("LOCATION_MIN_INTERVAL", default=5, cast=float)
+LOCATION_MIN_DISTANCE_M = config("LOCATION_MIN_DISTANCE_M", default=15, cast=float)
+# Hareketsiz cihazdan da bu aralıkla bir nokta kabul edilir
+LOCATION_HEARTBEAT = config("LOCATION_HEARTBEAT", default=60, cast=float)
+LOCATION_FLUSH_INTERVAL = config("LOCATION_FLUSH_INTERVAL", default=2.0, cast=float)
+# Canlı haritada bundan eski (saniye) konumlar gösterilmez
+LIVE_MAP_MAX_AGE = config("LIVE_MAP_MAX_AGE", default=6 * 60 * 60, cast=int)
+# Harita imleci bu kadar saniyeden yeni satırları geçmez; geç commit edilen
+# flush'lar kaçmaz, o satırlar bir sonraki istekte tekrar gelir
+LIVE_MAP_CURSOR_LAG = config("LIVE_MAP_CURSOR_LAG", default=10, cast=float)
+# Konum geçmişi (core.track_history)
+TRACK_FLUSH_INTERVAL = config("TRACK_FLUSH_INTERVAL", default=60.0, cast=float)
+TRACK_SIMPLIFY_AFTER_DAYS = config("TRACK_SIMPLIFY_AFTER_DAYS", default=2, cast=int)
+TRACK_SIMPLIFY_EPSILON_M = config("TRACK_SIMPLIFY_EPSILON_M", default=10, cast=float)
+TRACK_RETENTION_DAYS = config("TRACK_RETENTION_DAYS", default=180, cast=int)
+# Aktivite butonu konum logu (prune_location_logs)
+LOCATION_LOG_RETENTION_DAYS = config("LOCATION_LOG_RETENTION_DAYS", default=90, cast=int)
+# SSE pub/sub: tek worker için process içi, çok worker için pg NOTIFY
+# ("core.events.PostgresBroker")
+EVENTS_BACKEND = config("EVENTS_BACKEND", default="core.events.LocalBroker")
+# SSE ayrı bir ASGI servisinde çalışır (render.yaml: nomaya-events); sayfalar
+# EventSource'u bu origin'e açar. Boşsa aynı origin (tek ASGI process, geliştirme)
+EVENTS_ORIGIN = config("EVENTS_ORIGIN", default="")
+# SSE bağlantısı bu kadar saniye sonra kapanır, tarayıcı yeniden bağlanır
+SSE_MAX_DURATION = config("SSE_MAX_DURATION", default=300, cast=int)
+
+# --- İstek ölçümü (core.middleware.RequestMetricsMiddleware) ---
+SERVER_TIMING = config("SERVER_TIMING", default=True, cast=bool)
+# @query_budget aşılınca hata fırlat (testler override_settings ile açar)
+QUERY_BUDGET_STRICT = config("QUERY_BUDGET_STRICT", default=False, cast=bool)
+REQUEST_LOG_LEVEL = config("REQUEST_LOG_LEVEL", default="INFO")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core.requests": {
+            "handlers": ["console"],
+            "level": REQUEST_LOG_LEVEL,
+            "propagate": False,
+        },
+    },
+}
+
 # --- Static ---
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
@@ -106,6 +185,20 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", "/data/media"))  # uses /data on Render
 
+# --- Kişisel ses render havuzu (core.audio) ---
+# Process başına aynı anda çalışabilecek ffmpeg sayısı
+AUDIO_RENDER_WORKERS = config("AUDIO_RENDER_WORKERS", default=2, cast=int)
+# False ise işler sadece render_audio_queue komutuyla işlenir
+AUDIO_RENDER_IN_PROCESS = config("AUDIO_RENDER_IN_PROCESS", default=True, cast=bool)
+# Birleştirilmiş ses önbelleği için disk bütçesi (bayt); aşılınca LRU silinir
+AUDIO_CACHE_MAX_BYTES = config("AUDIO_CACHE_MAX_BYTES", default=5 * 1024 ** 3, cast=int)
+# Yetim temizliği + bütçe bu aralıkla (saniye) web process'inden çalışır; 0 kapalı
+AUDIO_CACHE_SWEEP_INTERVAL = config("AUDIO_CACHE_SWEEP_INTERVAL", default=6 * 60 * 60, cast=int)
+
+# Korumalı medya baytlarını proxy göndersin: "" (kapalı), "x-accel" (nginx), "x-sendfile"
+MEDIA_OFFLOAD = config("MEDIA_OFFLOAD", default="")
+MEDIA_OFFLOAD_PREFIX = config("MEDIA_OFFLOAD_PREFIX", default="/protected-media/")
+
 
 # Paket statiklerini de bulabilelim (çoğu projede default zaten bunlar)
 STATICFILES_FINDERS = [
@@ -46,7 +46,7 @@ def make(cfg, rows):
             target=made_days[0] if k==0 else made_days[-1]; DayFlight.objects.update_or_create(day=target,flight=fl,defaults={'order':k+1}); target.recompute_price()
     tour.recompute_item_counts(); tour.recompute_price()
     order,_=Order.objects.update_or_create(tour=tour,email=cfg['email'],defaults={'pax':cfg.get('pax',1),'start_date':cfg['start'],'end_date':cfg['end'],'same_room':True,'hide_flights':cfg['flight'],'hide_hotels':cfg['hotel'],'hide_transfers':True,'total_price':Decimal(cfg['try_total']),'is_paid':True,'payment_method':'payment_link'})
-    Traveler.objects.filter(order=order).delete(); [Traveler.objects.create(order=order,first_name=T(f),last_name=T(l),phone=p) for f,l,p in cfg.get('travelers',[(cfg['first'],cfg['last'],cfg['phone'])])]
+    Traveler.objects.filter(order=order).delete(); [Traveler.objects.create(order=order,index=i,first_name=T(f),last_name=T(l),phone=p) for i,(f,l,p) in enumerate(cfg.get('travelers',[(cfg['first'],cfg['last'],cfg['phone'])]),1)]
     print(f'https://nomaya.co/tours/booking/p/{order.public_id}/')
 
 make({'slug':'ozkan-nice-marsilya-8-gun','legacy_slug':'ozkan-nice-marsilya-1-gun','title':'Ozkan icin Nice’ten Marsilya’ya Riviera ve Lezzet Rotasi','start':date(2026,11,14),'end':date(2026,11,21),'overview':'14 Kasim Nice varisi ve 21 Kasim Marsilya donusu arasinda bol yuruyus, sahil kasabalari, tarihi mahalleler ve yerel Provence lezzetleri.','style':'Riviera Kesfi ve Gastronomi','email':'ozkansports@gmail.com','phone':'5423871028','first':'Ozkan','last':'Sports','flight':True,'hotel':False,'try_total':'100.00','flights':[('Istanbul','Turkiye','TR','IST','Nice','France','FR','NCE','OWN-NCE',None,None,180),('Marseille','France','FR','MRS','Istanbul','Turkiye','TR','IST','OWN-MRS',None,None,190)]},[('Nice','France','FR','Nice varisi, Vieux Nice ve Cours Saleya’ya ilk bakis','43.697166','7.276581'),('Nice','France','FR','Promenade des Anglais, Colline du Chateau ve liman','43.695440','7.279680'),('Eze','France','FR','Eze tas sokaklari, egzotik bahce cevresi ve panorama','43.727930','7.361950'),('Monaco','Monaco','MC','Monaco-Ville, liman ve Monte Carlo dis mekan rotasi','43.738418','7.424616'),('Antibes','France','FR','Antibes eski sehir, Provencal pazar ve surlar','43.580615','7.123865'),('Cannes','France','FR','Le Suquet, eski liman ve Croisette yuruyusu','43.551300','7.012750'),('Marseille','France','FR','Vieux-Port, Le Panier ve Notre-Dame manzaralari','43.296482','5.369780'),('Marseille','France','FR','Noailles pazari, Corniche ve Marsilya’dan ayrilis','43.292900','5.374350')])